@@ -1,12 +1,17 @@
 import streamlit as st
 import os
-import json
-import pickle
 import base64
-import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
-from sklearn.feature_extraction.text import TfidfVectorizer
 import time
+from search_core import (DATA_DIR, PDFS_DIR, WIKI_DATA_DIR, STATE_DEFAULTS, load_search_data,
+                         refresh_search_state, run_search)
+from index_versions import resolve_data_dir
+from search_workers import SEARCH_WORKERS, SearchWorkerPool
+from shards import ShardedSearch, available_versions
+from metrics import METRICS_PORT, start_metrics_server
+from query_log import log_query
+from facets import FACET_NAMES
+# The PDF build lives in build.py; re-exported for scripts that call app.preprocess_pdfs()
+from build import extract_pdf_sections, preprocess_pdfs, add_pdfs_to_index
 
 # Minimal page configuration with white background
 st.set_page_config(
@@ -110,21 +115,12 @@ if 'messages' not in st.session_state:
 
 if 'data_loaded' not in st.session_state:
     st.session_state.data_loaded = False
-    st.session_state.tutorial_data = {}
-    st.session_state.section_data = []
-    st.session_state.tfidf_vectorizer = None
-    st.session_state.tfidf_matrix = None
-    st.session_state.loading_timestamp = None
-    # Wiki data
-    st.session_state.wiki_sections = []
-    st.session_state.wiki_vectorizer = None
-    st.session_state.wiki_tfidf_matrix = None
+    # PDF, wiki and optional semantic search data (see search_core.STATE_DEFAULTS)
+    for name, default in STATE_DEFAULTS.items():
+        st.session_state[name] = default()
 
-# Data directories
-DATA_DIR = "processed_data"
-PDFS_DIR = "pdfs"
+# Data directories (PDF and wiki data directories are defined in search_core)
 LOGOS_DIR = "logos"
-WIKI_DATA_DIR = "wiki_data"  # New directory for wiki data
 
 # Function to convert image to base64
 def get_base64_image(image_path):
@@ -135,100 +131,16 @@ def get_base64_image(image_path):
     except:
         return None
 
-# Function to preprocess PDFs and save the data
-def preprocess_pdfs():
-    """Convert PDFs to JSON data and compute TF-IDF matrix"""
-    import PyPDF2
-    import re
-    
-    # Create directories if they don't exist
-    if not os.path.exists(DATA_DIR):
-        os.makedirs(DATA_DIR)
-    
-    if not os.path.exists(PDFS_DIR):
-        os.makedirs(PDFS_DIR)
-        return False
-    
-    pdf_files = [f for f in os.listdir(PDFS_DIR) if f.endswith('.pdf')]
-    
-    if not pdf_files:
-        return False
-    
-    # Process each PDF silently
-    tutorial_data = {}
-    all_sections = []
-    
-    for idx, pdf_file in enumerate(pdf_files):
-        file_path = os.path.join(PDFS_DIR, pdf_file)
-        tutorial_name = pdf_file.replace('.pdf', '')
-        
-        try:
-            with open(file_path, 'rb') as file:
-                reader = PyPDF2.PdfReader(file)
-                text = ""
-                for page_num in range(len(reader.pages)):
-                    text += reader.pages[page_num].extract_text() + "\n"
-                
-                # Save the full text
-                tutorial_data[tutorial_name] = {
-                    "text": text,
-                    "filename": pdf_file,
-                    "pages": len(reader.pages)
-                }
-                
-                # Split into sections (paragraphs)
-                sections = []
-                paragraphs = re.split(r'\n\s*\n', text)
-                
-                for i, para in enumerate(paragraphs):
-                    # Skip very short paragraphs
-                    if len(para.strip().split()) > 5:
-                        section = {
-                            "id": f"{tutorial_name}-{i}",
-                            "tutorial": tutorial_name,
-                            "content": para.strip(),
-                            "index": i
-                        }
-                        sections.append(section)
-                        all_sections.append(section)
-                
-        except Exception as e:
-            pass
-    
-    # Create and save TF-IDF vectorizer
-    section_texts = [section["content"] for section in all_sections]
-    vectorizer = TfidfVectorizer(stop_words='english', max_df=0.85, min_df=2)
-    tfidf_matrix = vectorizer.fit_transform(section_texts)
-    
-    # Save the processed data
-    with open(os.path.join(DATA_DIR, 'tutorial_data.json'), 'w') as f:
-        json.dump(tutorial_data, f)
-    
-    with open(os.path.join(DATA_DIR, 'section_data.json'), 'w') as f:
-        json.dump(all_sections, f)
-    
-    # Save the vectorizer and matrix
-    with open(os.path.join(DATA_DIR, 'tfidf_vectorizer.pkl'), 'wb') as f:
-        pickle.dump(vectorizer, f)
-    
-    with open(os.path.join(DATA_DIR, 'tfidf_matrix.pkl'), 'wb') as f:
-        pickle.dump(tfidf_matrix, f)
-    
-    # Save the timestamp
-    with open(os.path.join(DATA_DIR, 'processed_timestamp.txt'), 'w') as f:
-        f.write(str(time.time()))
-    
-    return True
-
 # Function to check if data needs to be updated
 def check_data_freshness():
     """Check if processed data is up-to-date with PDF files"""
     # Check if processed data exists
-    if not os.path.exists(os.path.join(DATA_DIR, 'processed_timestamp.txt')):
+    timestamp_path = os.path.join(resolve_data_dir(DATA_DIR), 'processed_timestamp.txt')
+    if not os.path.exists(timestamp_path):
         return False
     
     # Get the timestamp of the last processing
-    with open(os.path.join(DATA_DIR, 'processed_timestamp.txt'), 'r') as f:
+    with open(timestamp_path, 'r') as f:
         try:
             last_processed = float(f.read().strip())
         except:
@@ -243,245 +155,37 @@ def check_data_freshness():
     
     return True
 
+# Function to replace the query with a clicked suggestion
+def use_suggestion(suggestion):
+    """Button callback: runs before the text input is created on the next rerun"""
+    st.session_state.query = suggestion
+
 # Function to load preprocessed data
 def load_preprocessed_data():
     """Load the preprocessed data from disk"""
     try:
-        # Load tutorial data
-        with open(os.path.join(DATA_DIR, 'tutorial_data.json'), 'r') as f:
-            st.session_state.tutorial_data = json.load(f)
-        
-        # Load section data
-        with open(os.path.join(DATA_DIR, 'section_data.json'), 'r') as f:
-            st.session_state.section_data = json.load(f)
-        
-        # Load vectorizer
-        with open(os.path.join(DATA_DIR, 'tfidf_vectorizer.pkl'), 'rb') as f:
-            st.session_state.tfidf_vectorizer = pickle.load(f)
-        
-        # Load TF-IDF matrix
-        with open(os.path.join(DATA_DIR, 'tfidf_matrix.pkl'), 'rb') as f:
-            st.session_state.tfidf_matrix = pickle.load(f)
-        
-        # Load timestamp
-        with open(os.path.join(DATA_DIR, 'processed_timestamp.txt'), 'r') as f:
-            st.session_state.loading_timestamp = float(f.read().strip())
-        
-        # Try to load wiki data if it exists
-        try:
-            load_wiki_data()
-        except Exception as e:
-            print(f"Wiki data not loaded: {e}")
-        
-        return True
+        return load_search_data(st.session_state)
     except Exception as e:
+        print(f"Processed data not loaded from {resolve_data_dir(DATA_DIR)}: {e}")
         return False
 
-# Function to load wiki data
-def load_wiki_data():
-    """Load wiki data for searching"""
-    # Check if wiki data exists
-    if not os.path.exists(WIKI_DATA_DIR):
-        return False
-    
-    # Load wiki sections
-    with open(os.path.join(WIKI_DATA_DIR, 'wiki_sections.json'), 'r', encoding='utf-8') as f:
-        st.session_state.wiki_sections = json.load(f)
-    
-    # Load wiki vectorizer
-    with open(os.path.join(WIKI_DATA_DIR, 'wiki_vectorizer.pkl'), 'rb') as f:
-        st.session_state.wiki_vectorizer = pickle.load(f)
-    
-    # Load wiki TF-IDF matrix
-    with open(os.path.join(WIKI_DATA_DIR, 'wiki_tfidf_matrix.pkl'), 'rb') as f:
-        st.session_state.wiki_tfidf_matrix = pickle.load(f)
-    
-    return True
-
-# Function to search for relevant content
-def search_content(query, top_n=5):
-    """Search for relevant content using the TF-IDF matrix"""
-    # Proper check for vectorizer and matrix existence
-    if (st.session_state.tfidf_vectorizer is None) or (st.session_state.tfidf_matrix is None):
-        return []
-    
-    try:
-        # Transform the query using the vectorizer
-        query_vector = st.session_state.tfidf_vectorizer.transform([query])
-        
-        # Calculate similarity scores
-        similarity_scores = cosine_similarity(query_vector, st.session_state.tfidf_matrix).flatten()
-        
-        # Get the top N most relevant sections
-        top_indices = similarity_scores.argsort()[:-top_n-1:-1]
-        
-        results = []
-        for idx in top_indices:
-            if similarity_scores[idx] > 0.0:  # Only include relevant results
-                results.append({
-                    "section": st.session_state.section_data[idx],
-                    "score": float(similarity_scores[idx]),
-                    "type": "pdf"
-                })
-        
-        return results
-    except Exception as e:
-        # Handle any errors during search
-        return []
-
-# Function to search wiki content
-def search_wiki_content(query, top_n=5):
-    """Search for relevant content in the wiki using TF-IDF"""
-    # Check if wiki data is loaded
-    if (st.session_state.wiki_vectorizer is None) or (st.session_state.wiki_tfidf_matrix is None):
-        return []
-    
-    try:
-        # Transform the query using the wiki vectorizer
-        query_vector = st.session_state.wiki_vectorizer.transform([query])
-        
-        # Calculate similarity scores
-        similarity_scores = cosine_similarity(query_vector, st.session_state.wiki_tfidf_matrix).flatten()
-        
-        # Get the top N most relevant sections
-        top_indices = similarity_scores.argsort()[:-top_n-1:-1]
-        
-        results = []
-        for idx in top_indices:
-            if similarity_scores[idx] > 0.0:  # Only include relevant results
-                results.append({
-                    "section": st.session_state.wiki_sections[idx],
-                    "score": float(similarity_scores[idx]),
-                    "type": "wiki"
-                })
-        
-        return results
-    except Exception as e:
-        # Handle any errors during search
-        print(f"Error searching wiki: {e}")
-        return []
-
-# Function to extract keywords from query
-def extract_keywords(query):
-    """Extract important keywords from the query"""
-    # Remove common words and stop words
-    stop_words = {'the', 'a', 'an', 'and', 'or', 'but', 'is', 'are', 'was', 'were', 
-                'in', 'on', 'at', 'to', 'for', 'with', 'by', 'about', 'like', 
-                'from', 'of', 'how', 'what', 'when', 'where', 'why', 'who', 'which'}
-    
-    words = query.lower().split()
-    keywords = [word for word in words if word not in stop_words and len(word) > 2]
-    
-    return keywords
+# Function to get the shared search worker pool (multi-worker deployment mode)
+@st.cache_resource
+def get_worker_pool():
+    """Start the search worker processes once per server process"""
+    return SearchWorkerPool(SEARCH_WORKERS)
 
-# Function to suggest relevant tutorials based on keywords
-def suggest_tutorials(keywords, num_results=3):
-    """Suggest tutorials that might be relevant to the keywords"""
-    tutorial_scores = {}
-    
-    for keyword in keywords:
-        for tutorial_name, data in st.session_state.tutorial_data.items():
-            # Count keyword occurrences in the tutorial
-            count = data["text"].lower().count(keyword.lower())
-            
-            if count > 0:
-                if tutorial_name in tutorial_scores:
-                    tutorial_scores[tutorial_name] += count
-                else:
-                    tutorial_scores[tutorial_name] = count
-    
-    # Sort tutorials by relevance score
-    sorted_tutorials = sorted(tutorial_scores.items(), key=lambda x: x[1], reverse=True)
-    
-    return [name for name, score in sorted_tutorials[:num_results]]
+# Function to get the version-sharded search (used once more than one version is built)
+@st.cache_resource
+def get_sharded_search():
+    """Load every built version shard plus the wiki once per server process"""
+    return ShardedSearch()
 
-# Function to generate a response
-def get_response(query, num_results=3, search_pdfs=True, search_wiki=True):
-    """Generate a response based on the user query with PDF links and wiki links"""
-    # First, search for relevant content in PDFs and wiki based on filters
-    pdf_results = []
-    wiki_results = []
-    
-    if search_pdfs:
-        pdf_results = search_content(query, top_n=max(5, num_results))
-    
-    if search_wiki:
-        wiki_results = search_wiki_content(query, top_n=max(5, num_results))
-    
-    # Base URL for online PDFs
-    s3_base_url = "https://s3.amazonaws.com/gmstutorials-10.8.aquaveo.com/"
-    
-    # Check if we have any results from either source
-    if not pdf_results and not wiki_results:
-        # No direct matches, suggest tutorials based on keywords
-        keywords = extract_keywords(query)
-        suggested_tutorials = []
-        
-        if search_pdfs:
-            suggested_tutorials = suggest_tutorials(keywords, num_results)
-        
-        if suggested_tutorials:
-            response = "I couldn't find specific information about that, but these tutorials might be helpful:\n\n"
-            for tutorial in suggested_tutorials:
-                # Create a PDF link
-                pdf_url = f"{s3_base_url}{tutorial}.pdf"
-                response += f"{tutorial} - [View PDF]({pdf_url})\n\n"
-        else:
-            sources = []
-            if search_pdfs:
-                sources.append("tutorials")
-            if search_wiki:
-                sources.append("wiki pages")
-            
-            source_text = " or ".join(sources)
-            response = f"I'm sorry, I couldn't find any relevant information in the available {source_text}. Could you try rephrasing your question?"
-    else:
-        # Format the search results in categories
-        response = f"Here's what I found for '{query}':\n\n"
-        
-        # PDF RESULTS SECTION
-        if pdf_results:
-            response += "## 📚 Tutorial PDFs\n\n"
-            
-            # Show only up to the requested number of results
-            for i, result in enumerate(pdf_results[:num_results]):
-                section = result["section"]
-                content = section["content"]
-                tutorial_name = section["tutorial"]
-                
-                # Create a PDF link
-                pdf_url = f"{s3_base_url}{tutorial_name}.pdf"
-                
-                # Truncate content if too long
-                if len(content) > 300:
-                    content = content[:300] + "..."
-                
-                response += f"**{tutorial_name}** - [View PDF]({pdf_url})\n\n{content}\n\n---\n\n"
-        
-        # WIKI RESULTS SECTION
-        if wiki_results:
-            response += "## 🌐 GMS Wiki Documentation\n\n"
-            
-            # Show only up to the requested number of results
-            for i, result in enumerate(wiki_results[:num_results]):
-                section = result["section"]
-                title = section.get("title", "Wiki Section")
-                content = section["content"]
-                url = section["url"]
-                parent_title = section.get("parent_title", "")
-                
-                # Format the wiki section title
-                display_title = title
-                if parent_title and parent_title != title:
-                    display_title = f"{parent_title} - {title}"
-                
-                # Truncate content if too long
-                if len(content) > 300:
-                    content = content[:300] + "..."
-                
-                response += f"**{display_title}** - [View Wiki Page]({url})\n\n{content}\n\n---\n\n"
-    
-    return response
+# Function to start the Prometheus-style metrics endpoint
+@st.cache_resource
+def get_metrics_server():
+    """Start the /metrics endpoint once per server process (if enabled)"""
+    return start_metrics_server(METRICS_PORT)
 
 # Main function - ultra simplified with no custom styling
 def main():
@@ -530,6 +234,17 @@ def main():
     st.subheader("Ask about GMS tutorials:")
     user_input = st.text_input("Type your question here:", key="query")
     
+    # Typeahead suggestions from the prefix index (no TF-IDF scoring involved)
+    if user_input and st.session_state.autocomplete is not None:
+        suggestions = st.session_state.autocomplete.suggest(user_input, limit=6)
+        suggestions = [s for s in suggestions if s.lower() != user_input.strip().lower()]
+        if suggestions:
+            st.caption("Suggestions:")
+            suggestion_cols = st.columns(len(suggestions))
+            for col, suggestion in zip(suggestion_cols, suggestions):
+                col.button(suggestion, key=f"suggestion-{suggestion}",
+                           on_click=use_suggestion, args=(suggestion,))
+    
     # Create a row with two columns for number selection and category preference
     col1, col2 = st.columns(2)
     
@@ -551,6 +266,23 @@ def main():
             default=["PDF Tutorials", "Wiki Documentation"]
         )
     
+    # Tutorial family filter (empty = all families)
+    selected_families = st.multiselect(
+        "Limit to tutorial family:",
+        options=FACET_NAMES,
+        default=[]
+    )
+    
+    # GMS version selector, shown once tutorials of several versions have been processed
+    versions = available_versions()
+    selected_versions = None
+    if len(versions) > 1:
+        selected_versions = st.multiselect(
+            "GMS versions:",
+            options=versions,
+            default=versions[:1]
+        )
+    
     # Process the form submission
     if st.button("Search"):
         if user_input:
@@ -561,8 +293,31 @@ def main():
                 search_wiki = "Wiki Documentation" in category_filter
                 
                 # Get response with category filters
-                response = get_response(user_input, num_results=num_results, 
-                                       search_pdfs=search_pdfs, search_wiki=search_wiki)
+                start_time = time.perf_counter()
+                if len(versions) > 1:
+                    # Rebuilt shards are swapped in before the query; the others stay loaded
+                    sharded_search = get_sharded_search()
+                    sharded_search.refresh()
+                    result = sharded_search.run_search(user_input, num_results=num_results,
+                                                       search_pdfs=search_pdfs, search_wiki=search_wiki,
+                                                       versions=selected_versions, families=selected_families)
+                elif SEARCH_WORKERS > 0:
+                    result = get_worker_pool().run_search(user_input, num_results=num_results,
+                                                          search_pdfs=search_pdfs, search_wiki=search_wiki,
+                                                          families=selected_families)
+                else:
+                    # A newly published index version is swapped in before the query
+                    refresh_search_state(st.session_state)
+                    result = run_search(st.session_state, user_input, num_results=num_results, 
+                                        search_pdfs=search_pdfs, search_wiki=search_wiki,
+                                        families=selected_families)
+                response = result["response"]
+                
+                # Record the query for load testing (only when GMS_QUERY_LOG is set)
+                log_query(user_input, num_results, search_pdfs, search_wiki,
+                          (time.perf_counter() - start_time) * 1000, result["result_ids"],
+                          families=selected_families,
+                          versions=selected_versions if len(versions) > 1 else None)
             
             # Display results
             st.subheader("Results:")
@@ -588,4 +343,5 @@ if __name__ == "__main__":
             if load_preprocessed_data():
                 st.session_state.data_loaded = True
     
+    get_metrics_server()
     main()
\ No newline at end of file
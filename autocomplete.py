@@ -0,0 +1,159 @@
+# Search-as-you-type suggestions from a precomputed prefix index
+#
+# At build time the index terms of both corpora, the wiki page and section
+# titles and the tutorial names are collected with a weight (the number of
+# sections they occur in) and stored as one lexicographically sorted key array.
+# A lookup is two binary searches for the prefix range plus a partial sort of
+# that range by weight, so it never touches the TF-IDF matrices.
+
+import os
+import re
+import json
+import bisect
+import numpy as np
+from sklearn.feature_extraction.text import CountVectorizer
+
+AUTOCOMPLETE_FILE = 'autocomplete.json'
+
+# Suggestions returned per keystroke
+AUTOCOMPLETE_LIMIT = 8
+
+# Shortest prefix that is looked up
+AUTOCOMPLETE_MIN_PREFIX = 2
+
+def _title_keys(title):
+    """Lookup keys for a title: the whole title and the title from each later word onwards"""
+    title = title.lower().strip()
+    words = title.split()
+    return [" ".join(words[i:]) for i in range(len(words))] or [title]
+
+def _tutorial_words(name):
+    """Split a tutorial file name such as 'MODFLOW-ConceptualModelApproach1' into words"""
+    name = re.sub(r'[-_]+', ' ', name)
+    return re.sub(r'(?<=[a-z])(?=[A-Z0-9])', ' ', name)
+
+def term_document_frequencies(texts, min_df=2):
+    """Document frequency of every index term (same tokenization and stop words as the vectorizers)"""
+    if not texts:
+        return {}
+    counter = CountVectorizer(stop_words='english', min_df=min_df, binary=True)
+    doc_freq = np.asarray(counter.fit_transform(texts).sum(axis=0)).ravel()
+    return {term: int(doc_freq[column]) for term, column in counter.vocabulary_.items()}
+
+def load_corpus_sections(data_dir="processed_data", wiki_data_dir="wiki_data"):
+    """The processed PDF and wiki sections (either list is empty if not built yet)"""
+    sections, wiki_sections = [], []
+    sections_path = os.path.join(data_dir, 'section_data.json')
+    if os.path.exists(sections_path):
+        with open(sections_path, 'r') as f:
+            sections = json.load(f)
+    wiki_path = os.path.join(wiki_data_dir, 'wiki_sections.json')
+    if os.path.exists(wiki_path):
+        with open(wiki_path, 'r', encoding='utf-8') as f:
+            wiki_sections = json.load(f)
+    return sections, wiki_sections
+
+def build_autocomplete_index(data_dir="processed_data", wiki_data_dir="wiki_data"):
+    """Collect terms and titles from the processed data and save the prefix index"""
+    weights = {}
+
+    def add(display, weight, keys):
+        entry = weights.setdefault(display, [0, set()])
+        entry[0] += weight
+        entry[1].update(keys)
+
+    sections, wiki_sections = load_corpus_sections(data_dir, wiki_data_dir)
+
+    # Tutorials, weighted by their number of sections
+    tutorial_counts = {}
+    for section in sections:
+        tutorial_counts[section["tutorial"]] = tutorial_counts.get(section["tutorial"], 0) + 1
+    for name, count in tutorial_counts.items():
+        add(name, count, _title_keys(_tutorial_words(name)) + [name.lower()])
+
+    # Wiki page and section titles, weighted by the sections under them
+    for section in wiki_sections:
+        for title in (section.get("title"), section.get("parent_title")):
+            if title and title != "Introduction":
+                add(title, 1, _title_keys(title))
+
+    # Index terms weighted by document frequency
+    texts = [section["content"] for section in sections + wiki_sections]
+    for term, doc_freq in term_document_frequencies(texts).items():
+        if not term.isdigit():
+            add(term, doc_freq, [term])
+
+    # One row per (key, display); rows are sorted by key for the binary search
+    displays = sorted(weights)
+    display_ids = {display: i for i, display in enumerate(displays)}
+    rows = sorted((key, display_ids[display]) for display, (_, keys) in weights.items() for key in keys)
+
+    index = {
+        "keys": [key for key, _ in rows],
+        "targets": [target for _, target in rows],
+        "displays": displays,
+        "weights": [weights[display][0] for display in displays],
+    }
+    with open(os.path.join(data_dir, AUTOCOMPLETE_FILE), 'w', encoding='utf-8') as f:
+        json.dump(index, f, separators=(',', ':'))
+    return len(rows)
+
+class AutocompleteIndex:
+    """Sorted-array prefix index loaded from autocomplete.json"""
+
+    def __init__(self, index):
+        self.keys = index["keys"]
+        self.targets = np.array(index["targets"], dtype=np.int32)
+        self.displays = index["displays"]
+        self.weights = np.array(index["weights"], dtype=np.int32)
+        self.target_weights = self.weights[self.targets]
+
+    @classmethod
+    def load(cls, data_dir="processed_data"):
+        with open(os.path.join(data_dir, AUTOCOMPLETE_FILE), 'r', encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def lookup(self, prefix, limit=AUTOCOMPLETE_LIMIT):
+        """The highest-weighted entries whose key starts with the prefix"""
+        prefix = prefix.lower().strip()
+        if len(prefix) < AUTOCOMPLETE_MIN_PREFIX:
+            return []
+
+        lo = bisect.bisect_left(self.keys, prefix)
+        hi = bisect.bisect_left(self.keys, prefix + '\uffff', lo)
+        if lo == hi:
+            return []
+
+        weights = self.target_weights[lo:hi]
+        # Take a few extra rows since one display can be reached through several keys
+        take = min(len(weights), limit * 4)
+        top = np.argpartition(-weights, take - 1)[:take]
+        top = top[np.argsort(-weights[top], kind="stable")]
+
+        suggestions = []
+        for row in top:
+            display = self.displays[self.targets[lo + row]]
+            if display not in suggestions:
+                suggestions.append(display)
+                if len(suggestions) == limit:
+                    break
+        return suggestions
+
+    def suggest(self, text, limit=AUTOCOMPLETE_LIMIT):
+        """Completions for partially typed query text
+
+        Titles are matched against the whole text typed so far. Single terms
+        complete the last word and keep the words before it.
+        """
+        text = text.rstrip()
+        if not text:
+            return []
+
+        suggestions = self.lookup(text, limit)
+        head, _, last_word = text.rpartition(" ")
+        if head:
+            for term in self.lookup(last_word, limit):
+                completion = f"{head} {term}"
+                if completion not in suggestions and len(suggestions) < limit:
+                    suggestions.append(completion)
+        return suggestions
@@ -0,0 +1,258 @@
+# PDF index build, kept free of Streamlit so scripts and shard builds can run it
+#
+# preprocess_pdfs() extracts every PDF, strips page furniture, collapses
+# near-duplicate sections and writes the index files into a new version
+# directory, which is published only if it validates. add_pdfs_to_index()
+# appends new PDFs to a published hashing index without a refit.
+#
+#   python build.py                              # process pdfs/ into processed_data
+#   python build.py add pdfs/new_tutorial.pdf    # append PDFs (hashing index only)
+
+import os
+import sys
+import json
+import pickle
+import time
+from sklearn.feature_extraction.text import TfidfVectorizer
+from hashing_index import (INDEX_MODE, build_hashed_index, save_hashed_index,
+                           hashed_index_exists, append_documents, load_hashed_index)
+from semantic_index import (load_embedding_model, build_semantic_index, semantic_index_exists,
+                            append_semantic_index, remove_semantic_index)
+from search_core import DATA_DIR, PDFS_DIR, WIKI_DATA_DIR
+from index_versions import new_version_dir, derive_version, publish_version, resolve_data_dir
+from autocomplete import build_autocomplete_index
+from spelling import build_spelling_index
+from compressed_index import COMPRESSED_INDEX, save_compressed_index
+from facets import build_facets
+from related import build_related
+from pdf_extract import PDF_BACKEND, extract_pages, resolve_backend
+from dedup import strip_page_furniture, collapse_near_duplicates, shrink_report, print_shrink_report
+
+# Function to extract the text and sections of a single PDF
+def extract_pdf_sections(pdf_file, pdfs_dir=PDFS_DIR, backend=PDF_BACKEND):
+    """Extract the full text and paragraph sections from one PDF"""
+    import re
+    
+    file_path = os.path.join(pdfs_dir, pdf_file)
+    tutorial_name = pdf_file.replace('.pdf', '')
+    
+    pages = extract_pages(file_path, backend)
+    
+    # Drop running headers and footers before splitting into paragraphs
+    raw_text = "".join(page + "\n" for page in pages)
+    pages, furniture_lines = strip_page_furniture(pages)
+    text = "".join(page + "\n" for page in pages)
+    
+    # Very short paragraphs are skipped
+    is_section = lambda para: len(para.strip().split()) > 5
+    
+    tutorial = {
+        "text": text,
+        "filename": pdf_file,
+        "pages": len(pages),
+        "furniture_lines": furniture_lines,
+        "furniture_characters": len(raw_text) - len(text),
+        # Sections the unstripped text would have given, for the shrink report
+        "raw_sections": sum(1 for para in re.split(r'\n\s*\n', raw_text) if is_section(para))
+    }
+    
+    # Split into sections (paragraphs)
+    sections = []
+    paragraphs = re.split(r'\n\s*\n', text)
+    
+    for i, para in enumerate(paragraphs):
+        if is_section(para):
+            sections.append({
+                "id": f"{tutorial_name}-{i}",
+                "tutorial": tutorial_name,
+                "content": para.strip(),
+                "index": i
+            })
+    
+    return tutorial_name, tutorial, sections
+
+# Function to preprocess PDFs and save the data
+def preprocess_pdfs(pdfs_dir=PDFS_DIR, data_dir=DATA_DIR, backend=PDF_BACKEND):
+    """Convert PDFs to JSON data and compute TF-IDF matrix (one version shard per call)
+
+    The output goes to a new version directory under data_dir, which is
+    published only if it validates.
+    """
+    # Create directories if they don't exist
+    if not os.path.exists(data_dir):
+        os.makedirs(data_dir)
+    
+    if not os.path.exists(pdfs_dir):
+        os.makedirs(pdfs_dir)
+        return False
+    
+    pdf_files = [f for f in os.listdir(pdfs_dir) if f.endswith('.pdf')]
+    
+    if not pdf_files:
+        return False
+    
+    # Write into a new version; servers keep reading the published one meanwhile
+    base_dir, data_dir = data_dir, new_version_dir(data_dir)
+    
+    # Process each PDF silently
+    backend = resolve_backend(backend)
+    tutorial_data = {}
+    all_sections = []
+    
+    for pdf_file in pdf_files:
+        try:
+            tutorial_name, tutorial, sections = extract_pdf_sections(pdf_file, pdfs_dir, backend)
+            tutorial_data[tutorial_name] = tutorial
+            all_sections.extend(sections)
+        except Exception as e:
+            pass
+    
+    # Collapse near-identical paragraphs shared between tutorials
+    sections_before = all_sections
+    all_sections = collapse_near_duplicates(all_sections)
+    report = shrink_report(
+        sections_before, all_sections,
+        furniture_lines=sum(t["furniture_lines"] for t in tutorial_data.values()),
+        furniture_characters=sum(t["furniture_characters"] for t in tutorial_data.values()),
+        raw_sections=sum(t["raw_sections"] for t in tutorial_data.values())
+    )
+    print_shrink_report("PDF sections", report)
+    with open(os.path.join(data_dir, 'dedup_report.json'), 'w') as f:
+        json.dump(report, f, indent=2)
+    
+    section_texts = [section["content"] for section in all_sections]
+    
+    # Save the processed data
+    with open(os.path.join(data_dir, 'tutorial_data.json'), 'w') as f:
+        json.dump(tutorial_data, f)
+    
+    with open(os.path.join(data_dir, 'section_data.json'), 'w') as f:
+        json.dump(all_sections, f)
+    
+    # Tutorial-family bitsets for the family filter
+    build_facets(all_sections, data_dir)
+    
+    if INDEX_MODE == "hashing":
+        # Hashed term counts plus document frequencies, no fitted vocabulary
+        index, counts = build_hashed_index(section_texts)
+        save_hashed_index(index, counts, data_dir)
+        tfidf_matrix = index.weight(counts)
+    else:
+        # Create and save TF-IDF vectorizer
+        vectorizer = TfidfVectorizer(stop_words='english', max_df=0.85, min_df=2)
+        tfidf_matrix = vectorizer.fit_transform(section_texts)
+        
+        # Save the vectorizer and matrix
+        with open(os.path.join(data_dir, 'tfidf_vectorizer.pkl'), 'wb') as f:
+            pickle.dump(vectorizer, f)
+        
+        with open(os.path.join(data_dir, 'tfidf_matrix.pkl'), 'wb') as f:
+            pickle.dump(tfidf_matrix, f)
+    
+    # Compressed postings for GMS_COMPRESSED_INDEX=1
+    if COMPRESSED_INDEX:
+        save_compressed_index(tfidf_matrix, data_dir)
+    
+    # Build the dense embedding index if a local model is available
+    model = load_embedding_model()
+    if model is not None:
+        build_semantic_index(model, section_texts, data_dir)
+    
+    # Build the typeahead suggestions, spelling table and related sections from the new data
+    build_autocomplete_index(data_dir, resolve_data_dir(WIKI_DATA_DIR))
+    build_spelling_index(data_dir, resolve_data_dir(WIKI_DATA_DIR))
+    build_related(data_dir, resolve_data_dir(WIKI_DATA_DIR))
+    
+    # Save the timestamp
+    with open(os.path.join(data_dir, 'processed_timestamp.txt'), 'w') as f:
+        f.write(str(time.time()))
+    
+    return publish_version(base_dir, data_dir)
+
+# Function to add new PDFs to an existing hashing index without a refit
+def add_pdfs_to_index(pdf_files):
+    """Append new PDFs to the saved data and hashing index (hashing mode only)"""
+    published_dir = resolve_data_dir(DATA_DIR)
+    # The published data decides, not GMS_INDEX_MODE
+    if not hashed_index_exists(published_dir):
+        return False
+    
+    with open(os.path.join(published_dir, 'tutorial_data.json'), 'r') as f:
+        tutorial_data = json.load(f)
+    
+    with open(os.path.join(published_dir, 'section_data.json'), 'r') as f:
+        all_sections = json.load(f)
+    
+    backend = resolve_backend(PDF_BACKEND)
+    new_sections = []
+    for pdf_file in pdf_files:
+        try:
+            tutorial_name, tutorial, sections = extract_pdf_sections(pdf_file, PDFS_DIR, backend)
+        except Exception as e:
+            continue
+        if tutorial_name in tutorial_data:
+            continue
+        tutorial_data[tutorial_name] = tutorial
+        new_sections.extend(sections)
+    
+    if not new_sections:
+        return False
+    
+    # The update is applied to a copy of the published version, then published itself
+    data_dir = derive_version(DATA_DIR)
+    
+    # Rows are appended in the same order as the section list
+    append_documents(data_dir, '', [section["content"] for section in new_sections])
+    all_sections.extend(new_sections)
+    if COMPRESSED_INDEX:
+        save_compressed_index(load_hashed_index(data_dir)[1], data_dir)
+    
+    # The embeddings need a row per section too
+    if semantic_index_exists(data_dir):
+        model = load_embedding_model()
+        if model is not None:
+            append_semantic_index(model, [section["content"] for section in new_sections], data_dir)
+        else:
+            print("No embedding model to embed the new sections; semantic search is off until "
+                  "python semantic_index.py rebuilds the embeddings")
+            remove_semantic_index(data_dir)
+    
+    with open(os.path.join(data_dir, 'tutorial_data.json'), 'w') as f:
+        json.dump(tutorial_data, f)
+    
+    with open(os.path.join(data_dir, 'section_data.json'), 'w') as f:
+        json.dump(all_sections, f)
+    
+    build_facets(all_sections, data_dir)
+    build_autocomplete_index(data_dir, resolve_data_dir(WIKI_DATA_DIR))
+    build_spelling_index(data_dir, resolve_data_dir(WIKI_DATA_DIR))
+    build_related(data_dir, resolve_data_dir(WIKI_DATA_DIR))
+    
+    with open(os.path.join(data_dir, 'processed_timestamp.txt'), 'w') as f:
+        f.write(str(time.time()))
+    
+    return publish_version(DATA_DIR, data_dir)
+
+def main():
+    if len(sys.argv) >= 3 and sys.argv[1] == "add":
+        # The PDFs are read from pdfs/, so paths elsewhere are rejected
+        pdf_files = []
+        for path in sys.argv[2:]:
+            if not os.path.exists(os.path.join(PDFS_DIR, os.path.basename(path))):
+                print(f"{path} is not in {PDFS_DIR}/; copy it there first")
+                return
+            pdf_files.append(os.path.basename(path))
+        if not hashed_index_exists(resolve_data_dir(DATA_DIR)):
+            print(f"The published index in {DATA_DIR} is not a hashing index; rebuild it with "
+                  f"GMS_INDEX_MODE=hashing python build.py")
+            return
+        if not add_pdfs_to_index(pdf_files):
+            print("No new PDFs were added")
+    elif len(sys.argv) == 1:
+        if not preprocess_pdfs():
+            print(f"No PDFs were processed from {PDFS_DIR}")
+    else:
+        print("Usage: python build.py [add <pdf> ...]")
+
+if __name__ == "__main__":
+    main()
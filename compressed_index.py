@@ -0,0 +1,238 @@
+# Compressed term-major postings for the tutorial and wiki search indexes
+#
+# The float64 CSR matrices store 12 bytes per non-zero (8 for the weight, 4 for
+# the column) plus a row pointer per document, and every worker holds a copy.
+# Here the same weights are stored per term instead of per document:
+#   - doc ids of each posting list are delta-encoded and variable-byte packed
+#     (7 bits per byte, high bit set on the last byte of a value)
+#   - weights are float16, or 8-bit with one float32 scale per term
+#   - term ids and offsets are 32-bit
+# Scoring decodes only the posting lists of the query terms and accumulates
+# term-at-a-time into a score array, so it never touches the rest of the index.
+#
+#   GMS_COMPRESSED_INDEX=1 streamlit run app.py
+#   python compressed_index.py [processed_data|wiki_data]   # build + report
+
+import os
+import sys
+import time
+import json
+import numpy as np
+import scipy.sparse as sp
+from index_versions import resolve_data_dir, derive_version, publish_version
+
+# Search the compressed postings instead of the CSR matrix when they have been built
+COMPRESSED_INDEX = os.environ.get("GMS_COMPRESSED_INDEX", "0") == "1"
+
+# Weight encoding: "uint8" (per-term scale) or "float16"
+COMPRESSED_WEIGHTS = os.environ.get("GMS_COMPRESSED_WEIGHTS", "uint8")
+
+def varbyte_encode(values):
+    """Variable-byte encode non-negative integers (little-endian 7-bit groups)"""
+    values = np.asarray(values, dtype=np.uint64)
+    if len(values) == 0:
+        return np.zeros(0, dtype=np.uint8)
+    nbytes = np.ones(len(values), dtype=np.int64)
+    rest = values >> np.uint64(7)
+    while rest.any():
+        nbytes += rest > 0
+        rest >>= np.uint64(7)
+    starts = np.concatenate(([0], np.cumsum(nbytes)[:-1]))
+    encoded = np.zeros(int(nbytes.sum()), dtype=np.uint8)
+    for k in range(int(nbytes.max())):
+        mask = nbytes > k
+        encoded[starts[mask] + k] = (values[mask] >> np.uint64(7 * k)) & np.uint64(0x7F)
+    encoded[starts + nbytes - 1] |= 0x80
+    return encoded
+
+def varbyte_decode(encoded):
+    """Decode a byte array written by varbyte_encode"""
+    encoded = np.asarray(encoded, dtype=np.uint8)
+    if len(encoded) == 0:
+        return np.zeros(0, dtype=np.int64)
+    ends = np.flatnonzero(encoded & 0x80)
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    # Position of every byte inside its value gives its shift
+    group = np.repeat(np.arange(len(ends)), ends - starts + 1)
+    shift = 7 * (np.arange(len(encoded)) - starts[group])
+    parts = (encoded & 0x7F).astype(np.int64) << shift
+    return np.add.reduceat(parts, starts)
+
+class CompressedPostings:
+    """Term-major, delta/varbyte-compressed copy of an L2-normalized document matrix"""
+
+    def __init__(self, n_docs, term_ids, byte_offsets, postings, posting_offsets, weights, scales=None):
+        self.n_docs = int(n_docs)
+        self.term_ids = term_ids
+        self.byte_offsets = byte_offsets
+        self.postings = postings
+        self.posting_offsets = posting_offsets
+        self.weights = weights
+        self.scales = scales
+        self.shape = (self.n_docs, int(term_ids[-1]) + 1 if len(term_ids) else 0)
+
+    @classmethod
+    def from_matrix(cls, matrix, weights=COMPRESSED_WEIGHTS):
+        """Compress a documents x terms CSR matrix"""
+        csc = sp.csc_matrix(matrix)
+        csc.sort_indices()
+        counts = np.diff(csc.indptr)
+        term_ids = np.flatnonzero(counts).astype(np.int32)
+
+        # Deltas restart at every term, so each posting list decodes on its own
+        deltas = np.diff(csc.indices, prepend=0).astype(np.int64)
+        deltas[csc.indptr[:-1][counts > 0]] = csc.indices[csc.indptr[:-1][counts > 0]]
+        encoded = varbyte_encode(deltas)
+        value_ends = np.flatnonzero(encoded & 0x80) + 1
+        byte_offsets = np.concatenate(([0], value_ends[csc.indptr[1:][counts > 0] - 1])).astype(np.uint32)
+        posting_offsets = np.concatenate(([0], np.cumsum(counts[counts > 0]))).astype(np.uint32)
+
+        data = csc.data.astype(np.float32)
+        scales = None
+        if weights == "float16":
+            quantized = data.astype(np.float16)
+        else:
+            # One scale per term: its largest weight maps to 255
+            term_max = np.maximum.reduceat(data, posting_offsets[:-1].astype(np.int64)) if len(data) else data
+            scales = (term_max / 255.0).astype(np.float32)
+            per_posting = np.repeat(scales, np.diff(posting_offsets).astype(np.int64))
+            quantized = np.clip(np.rint(data / np.where(per_posting > 0, per_posting, 1)), 0, 255).astype(np.uint8)
+        return cls(csc.shape[0], term_ids, byte_offsets, encoded, posting_offsets, quantized, scales)
+
+    def nbytes(self):
+        """Memory held by the arrays"""
+        arrays = [self.term_ids, self.byte_offsets, self.postings, self.posting_offsets, self.weights]
+        if self.scales is not None:
+            arrays.append(self.scales)
+        return sum(array.nbytes for array in arrays)
+
+    def postings_of(self, term):
+        """Doc ids and dequantized weights of one term (empty if it has no postings)"""
+        slot = np.searchsorted(self.term_ids, term)
+        if slot >= len(self.term_ids) or self.term_ids[slot] != term:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        doc_ids = np.cumsum(varbyte_decode(self.postings[self.byte_offsets[slot]:self.byte_offsets[slot + 1]]))
+        weights = self.weights[self.posting_offsets[slot]:self.posting_offsets[slot + 1]].astype(np.float32)
+        if self.scales is not None:
+            weights *= self.scales[slot]
+        return doc_ids, weights
+
+    def score(self, query_vector):
+        """Dot product of one sparse query row with every document, term at a time"""
+        query_vector = sp.csr_matrix(query_vector)
+        scores = np.zeros(self.n_docs, dtype=np.float32)
+        for term, query_weight in zip(query_vector.indices, query_vector.data):
+            doc_ids, weights = self.postings_of(term)
+            # Doc ids are unique within a posting list, so fancy-index add is exact
+            scores[doc_ids] += query_weight * weights
+        return scores
+
+    def save(self, path):
+        """Save the compressed arrays (no pickling involved)"""
+        arrays = dict(n_docs=self.n_docs, term_ids=self.term_ids, byte_offsets=self.byte_offsets,
+                      postings=self.postings, posting_offsets=self.posting_offsets, weights=self.weights)
+        if self.scales is not None:
+            arrays["scales"] = self.scales
+        np.savez(path, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        """Load postings saved with save()"""
+        with np.load(path, allow_pickle=False) as state:
+            return cls(int(state['n_docs']), state['term_ids'], state['byte_offsets'], state['postings'],
+                       state['posting_offsets'], state['weights'],
+                       state['scales'] if 'scales' in state.files else None)
+
+def compressed_index_path(directory, prefix=''):
+    return os.path.join(directory, f'{prefix}compressed_index.npz')
+
+def compressed_index_exists(directory, prefix=''):
+    """Check whether compressed postings have been saved in the directory"""
+    return os.path.exists(compressed_index_path(directory, prefix))
+
+def save_compressed_index(matrix, directory, prefix='', weights=COMPRESSED_WEIGHTS):
+    """Compress a document matrix and save it next to the other index files"""
+    postings = CompressedPostings.from_matrix(matrix, weights)
+    postings.save(compressed_index_path(directory, prefix))
+    return postings
+
+def load_compressed_index(directory, prefix=''):
+    return CompressedPostings.load(compressed_index_path(directory, prefix))
+
+def _csr_nbytes(matrix):
+    return matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes
+
+def _ranking(scores, top_k):
+    """Top-k doc ids with ties broken by doc id, so equal scores rank the same way in both indexes"""
+    top = np.argsort(-scores, kind="stable")[:top_k]
+    return [int(d) for d in top if scores[d] > 0.0]
+
+def compression_report(matrix, queries, vectorizer, top_k=10):
+    """Memory per document and ranking drift of each weight encoding against the float64 matrix"""
+    matrix = sp.csr_matrix(matrix)
+    query_matrix = vectorizer.transform(queries)
+    start = time.perf_counter()
+    exact_scores = np.vstack([(matrix @ query_matrix[i].T).toarray().ravel() for i in range(len(queries))])
+    exact_us = (time.perf_counter() - start) / max(1, len(queries)) * 1e6
+
+    report = [{"encoding": f"csr {matrix.dtype}", "bytes": _csr_nbytes(matrix), "overlap_at_k": 1.0,
+               "top1_agreement": 1.0, "max_score_error": 0.0, "query_us": exact_us}]
+    for weights in ("float16", "uint8"):
+        postings = CompressedPostings.from_matrix(matrix, weights)
+        overlaps, same_first, max_error, elapsed = [], 0, 0.0, 0.0
+        for i, exact in enumerate(exact_scores):
+            start = time.perf_counter()
+            approx = postings.score(query_matrix[i])
+            elapsed += time.perf_counter() - start
+            exact_top = _ranking(exact, top_k)
+            if not exact_top:
+                continue
+            approx_top = _ranking(approx, top_k)
+            overlaps.append(len(set(exact_top) & set(approx_top)) / len(exact_top))
+            same_first += bool(approx_top) and approx_top[0] == exact_top[0]
+            max_error = max(max_error, float(np.abs(approx - exact).max()))
+        report.append({
+            "encoding": f"postings {weights}",
+            "bytes": postings.nbytes(),
+            "overlap_at_k": float(np.mean(overlaps)) if overlaps else 0.0,
+            "top1_agreement": same_first / max(1, len(overlaps)),
+            "max_score_error": max_error,
+            "query_us": elapsed / max(1, len(queries)) * 1e6,
+        })
+    return report
+
+def main():
+    # Usage: python compressed_index.py [processed_data|wiki_data]
+    from search_core import load_index_files
+    from load_test import SAMPLE_QUERIES
+
+    base_dir = sys.argv[1] if len(sys.argv) > 1 else "processed_data"
+    directory = resolve_data_dir(base_dir)
+    is_wiki = os.path.exists(os.path.join(directory, 'wiki_sections.json'))
+    prefix = 'wiki_' if is_wiki else ''
+    vectorizer, matrix = load_index_files(directory, prefix)
+    if isinstance(matrix, CompressedPostings):
+        print("The report compares against the uncompressed matrix; run it without GMS_COMPRESSED_INDEX=1")
+        return
+    with open(os.path.join(directory, 'wiki_sections.json' if is_wiki else 'section_data.json'), 'r', encoding='utf-8') as f:
+        sections = json.load(f)
+
+    # Sample questions plus the opening words of an evenly spaced sample of the sections
+    step = max(1, len(sections) // 200)
+    queries = SAMPLE_QUERIES + [" ".join(s['content'].split()[:8]) for s in sections[::step]]
+
+    n_docs = matrix.shape[0]
+    print(f"Compression report for {n_docs} documents in {directory} ({len(queries)} queries, top-10)")
+    print(f"{'encoding':>18} {'size':>9} {'B/doc':>7} {'overlap@k':>10} {'top1':>7} {'max err':>8} {'us/query':>9}")
+    for row in compression_report(matrix, queries, vectorizer):
+        print(f"{row['encoding']:>18} {row['bytes'] / 1024:>7.1f}KB {row['bytes'] / n_docs:>7.0f} "
+              f"{row['overlap_at_k']:>10.3f} {row['top1_agreement']:>7.2%} {row['max_score_error']:>8.4f} {row['query_us']:>9.0f}")
+
+    # Saved into a copy of the published version, which is then published itself
+    version_dir = derive_version(base_dir)
+    save_compressed_index(matrix, version_dir, prefix)
+    print(f"Saved {compressed_index_path(version_dir, prefix)} ({COMPRESSED_WEIGHTS} weights)")
+    publish_version(base_dir, version_dir, 'wiki' if is_wiki else 'pdf')
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+# Boilerplate and near-duplicate removal for the index build
+#
+# Three things bloat the section lists today:
+#   - running headers/footers repeated on every PDF page
+#     ("GMS Tutorials  Annotation Tools / Page 1 of 7 © Aquaveo 2024 / GMS 10.8 Tutorial")
+#   - near-identical paragraphs shared by many tutorials (prerequisites, "getting started")
+#   - wiki page records whose text is repeated by that page's own section records
+# Page furniture is found per PDF by counting the lines at the top and bottom of
+# each page across pages; numbered steps and headings in the body never qualify.
+# Near-duplicate sections are found with MinHash signatures and LSH banding and
+# collapsed into one canonical section that lists the ids it replaced.
+
+import re
+import zlib
+import numpy as np
+
+# A line is page furniture when it is among the first or last FURNITURE_EDGE_LINES
+# non-blank lines of at least this share of a PDF's pages (and of at least
+# FURNITURE_MIN_PAGES pages)
+FURNITURE_PAGE_SHARE = 0.8
+FURNITURE_MIN_PAGES = 3
+FURNITURE_EDGE_LINES = 3
+
+# Footer fragments removed wherever they occur; PDF extraction often glues the
+# footer to the first line of the page body, so only the match is cut out
+FURNITURE_PATTERNS = [
+    re.compile(r'Page \d+ of \d+'),
+    re.compile(r'©\s*Aquaveo \d{4}'),
+]
+
+# Footer fragments that can also end a body sentence ("... see the GMS 10.8
+# Tutorial"), so they are only cut from the edge lines of a page
+FURNITURE_EDGE_PATTERNS = [
+    re.compile(r'GMS \d+\.\s?\d+ Tutorial\s*$'),
+]
+
+# MinHash signature length and LSH banding (16 bands x 8 rows ~ 0.7 Jaccard threshold)
+MINHASH_PERMUTATIONS = 128
+LSH_BANDS = 16
+
+# Estimated Jaccard similarity above which two sections count as duplicates
+DUPLICATE_THRESHOLD = 0.8
+
+# Word shingle length
+SHINGLE_SIZE = 5
+
+# A wiki page record is dropped when its sections cover this share of its words
+PAGE_COVERAGE_THRESHOLD = 0.8
+
+_MERSENNE_PRIME = (1 << 31) - 1
+
+def _normalize_line(line):
+    """Lowercase and collapse whitespace; digits are kept, so step and section numbers stay distinct"""
+    return re.sub(r'\s+', ' ', line).strip().lower()
+
+def _edge_lines(lines, count=FURNITURE_EDGE_LINES):
+    """Positions of the first and last `count` non-blank lines of a page"""
+    filled = [i for i, line in enumerate(lines) if line.strip()]
+    return set(filled[:count]) | set(filled[-count:])
+
+def find_page_furniture(pages):
+    """Normalized lines that repeat at the top or bottom of the pages of one PDF"""
+    min_pages = max(FURNITURE_MIN_PAGES, int(len(pages) * FURNITURE_PAGE_SHARE))
+    if len(pages) < min_pages:
+        return set()
+    page_counts = {}
+    for page in pages:
+        lines = page.splitlines()
+        for line in {_normalize_line(lines[i]) for i in _edge_lines(lines)}:
+            if line:
+                page_counts[line] = page_counts.get(line, 0) + 1
+    return {line for line, count in page_counts.items() if count >= min_pages}
+
+def strip_page_furniture(pages):
+    """Remove repeated headers/footers from each page; returns the pages and lines removed"""
+    furniture = find_page_furniture(pages)
+    cleaned = []
+    removed = 0
+    for page in pages:
+        kept = []
+        lines = page.splitlines()
+        edges = _edge_lines(lines)
+        for position, line in enumerate(lines):
+            if position in edges and _normalize_line(line) in furniture:
+                removed += 1
+                continue
+            stripped = line
+            for pattern in FURNITURE_PATTERNS + (FURNITURE_EDGE_PATTERNS if position in edges else []):
+                stripped = pattern.sub('', stripped)
+            if stripped != line:
+                removed += 1
+                if not stripped.strip():
+                    continue
+            kept.append(stripped)
+        cleaned.append("\n".join(kept))
+    return cleaned, removed
+
+def _shingles(text):
+    """Hashes of the word shingles of a text"""
+    words = re.findall(r'\w+', text.lower())
+    if len(words) < SHINGLE_SIZE:
+        grams = [" ".join(words)]
+    else:
+        grams = [" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)]
+    return np.array([zlib.crc32(g.encode('utf-8')) for g in set(grams)], dtype=np.uint64)
+
+def minhash_signatures(texts, permutations=MINHASH_PERMUTATIONS, seed=1):
+    """MinHash signature matrix (texts x permutations) using (a*x + b) mod p hash functions"""
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, _MERSENNE_PRIME, size=permutations, dtype=np.uint64)
+    b = rng.integers(0, _MERSENNE_PRIME, size=permutations, dtype=np.uint64)
+    signatures = np.empty((len(texts), permutations), dtype=np.uint32)
+    for i, text in enumerate(texts):
+        shingles = _shingles(text) % _MERSENNE_PRIME
+        # Products stay below 2**62, so uint64 arithmetic cannot overflow
+        hashed = (np.outer(shingles, a) + b) % _MERSENNE_PRIME
+        signatures[i] = hashed.min(axis=0)
+    return signatures
+
+def find_duplicate_groups(texts, threshold=DUPLICATE_THRESHOLD, bands=LSH_BANDS):
+    """Groups (lists of indices) of near-duplicate texts, each led by its longest text
+
+    Every other member's estimated Jaccard similarity with the first one is at
+    least the threshold, so a chain of texts that are each similar to the next
+    is not merged into one group.
+    """
+    if len(texts) < 2:
+        return []
+    signatures = minhash_signatures(texts)
+    rows = signatures.shape[1] // bands
+
+    # Union-find over candidate pairs that share at least one LSH band
+    parent = list(range(len(texts)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for band in range(bands):
+        buckets = {}
+        for i, key in enumerate(map(bytes, signatures[:, band * rows:(band + 1) * rows])):
+            buckets.setdefault(key, []).append(i)
+        for members in buckets.values():
+            for other in members[1:]:
+                first, second = find(members[0]), find(other)
+                if first != second and np.mean(signatures[members[0]] == signatures[other]) >= threshold:
+                    parent[second] = first
+
+    components = {}
+    for i in range(len(texts)):
+        components.setdefault(find(i), []).append(i)
+
+    # Split each connected component around its longest texts
+    groups = []
+    for members in components.values():
+        while len(members) > 1:
+            canonical = max(members, key=lambda i: len(texts[i]))
+            similar = np.mean(signatures[members] == signatures[canonical], axis=1) >= threshold
+            group = [canonical] + [i for i, keep in zip(members, similar) if keep and i != canonical]
+            if len(group) > 1:
+                groups.append(group)
+            members = [i for i, keep in zip(members, similar) if not keep]
+    return groups
+
+def source_label(section):
+    """Tutorial name or wiki page title a section comes from"""
+    return section.get("tutorial") or section.get("parent_title") or section.get("title") or ""
+
+def collapse_near_duplicates(sections):
+    """Keep one canonical section per near-duplicate group
+
+    The canonical section (the longest text) is a new record that lists the ids
+    it replaced in 'duplicates', the tutorials or wiki pages they came from in
+    'duplicate_labels' and, for wiki sections, their URLs in 'duplicate_urls', so
+    results and facets still cover those sources. The input list and its
+    sections are left unchanged.
+    """
+    groups = find_duplicate_groups([section["content"] for section in sections])
+    merged = {}
+    dropped = set()
+    for canonical, *others in groups:
+        record = {**sections[canonical],
+                  "duplicates": [sections[i]["id"] for i in others],
+                  "duplicate_labels": [source_label(sections[i]) for i in others]}
+        if all("url" in sections[i] for i in others):
+            record["duplicate_urls"] = [sections[i]["url"] for i in others]
+        merged[canonical] = record
+        dropped.update(others)
+    return [merged.get(i, section) for i, section in enumerate(sections) if i not in dropped]
+
+def drop_covered_page_records(wiki_sections, threshold=PAGE_COVERAGE_THRESHOLD):
+    """Drop wiki whole-page records whose words are mostly repeated in the page's section records"""
+    section_words = {}
+    for section in wiki_sections:
+        if section.get("type") == "section":
+            words = section_words.setdefault(section.get("parent_title"), set())
+            words.update(re.findall(r'\w+', section["content"].lower()))
+
+    kept = []
+    for section in wiki_sections:
+        if section.get("type") == "page" and section["title"] in section_words:
+            page_words = set(re.findall(r'\w+', section["content"].lower()))
+            if page_words and len(page_words & section_words[section["title"]]) / len(page_words) >= threshold:
+                continue
+        kept.append(section)
+    return kept
+
+def shrink_report(before, after, furniture_lines=0, furniture_characters=0, raw_sections=None):
+    """Summary of how much the build shrank the section list
+
+    `before` is the section list before near-duplicates were collapsed. Text
+    removed earlier as page furniture is added back into the "before" size, and
+    raw_sections is the section count the text gave before furniture removal.
+    """
+    chars_before = sum(len(section["content"]) for section in before) + furniture_characters
+    chars_after = sum(len(section["content"]) for section in after)
+    sections_before = len(before) if raw_sections is None else raw_sections
+    return {
+        "sections_before": sections_before,
+        "sections_after_furniture": len(before),
+        "sections_after": len(after),
+        "characters_before": chars_before,
+        "characters_after": chars_after,
+        "furniture_lines_removed": furniture_lines,
+        "section_reduction": 1 - len(after) / max(1, sections_before),
+        "character_reduction": 1 - chars_after / max(1, chars_before),
+    }
+
+def print_shrink_report(name, report):
+    # Sections left after furniture removal, when it changed the count
+    middle = (f"{report['sections_after_furniture']} -> "
+              if report['sections_after_furniture'] != report['sections_before'] else "")
+    print(f"{name}: {report['sections_before']} -> {middle}{report['sections_after']} sections "
+          f"({report['section_reduction']:.1%} fewer), "
+          f"{report['characters_before']:,} -> {report['characters_after']:,} characters "
+          f"({report['character_reduction']:.1%} smaller), "
+          f"{report['furniture_lines_removed']} header/footer lines removed")
@@ -0,0 +1,132 @@
+# Tutorial-family facets for filtered search
+#
+# Every PDF section and wiki section is assigned to the family of its tutorial
+# file name or wiki page title, and to the families of the near-duplicates it
+# replaced at build time. At build time each family is
+# stored as a packed bitset over the rows of the index ({prefix}facets.npz).
+# A filtered query ORs the selected bitsets into a row mask and applies it to
+# the score array before the top-k is taken, so a narrow filter still returns
+# a full page of results. Facet counts are popcounts of each bitset ANDed with
+# the rows that matched the query.
+#
+#   python facets.py     # build the facets for the data that is already processed
+
+import os
+import re
+import sys
+import json
+import numpy as np
+from index_versions import resolve_data_dir, derive_version, publish_version
+
+# Families in display order; the first pattern that matches a name wins
+FACETS = [
+    ("MODFLOW-USG", re.compile(r'modflow[-_ ]?usg', re.I)),
+    ("MODFLOW", re.compile(r'modflow', re.I)),
+    ("FEMWATER", re.compile(r'femwater', re.I)),
+    ("SEAWAT", re.compile(r'seawat', re.I)),
+    ("MT3DMS", re.compile(r'mt3dms', re.I)),
+    ("Geostatistics", re.compile(r'geostatistic|kriging|t-progs', re.I)),
+    ("Stratigraphy", re.compile(r'stratigraph|borehole|horizon', re.I)),
+]
+
+FACET_NAMES = [name for name, _ in FACETS]
+
+# Set bits per byte value, for popcounts over packed bitsets
+_POPCOUNT = np.array([bin(value).count("1") for value in range(256)], dtype=np.int64)
+
+def family_of(name):
+    """Family of a tutorial file name or wiki page title (None if it has none)"""
+    for family, pattern in FACETS:
+        if pattern.search(name or ""):
+            return family
+    return None
+
+def section_label(section):
+    """The name a section's family is derived from"""
+    return section.get("tutorial") or section.get("parent_title") or section.get("title") or ""
+
+def section_labels(section):
+    """Names of every source a section stands for, including the near-duplicates it replaced"""
+    return [section_label(section)] + list(section.get("duplicate_labels") or [])
+
+class FacetIndex:
+    """One packed bitset per family over the rows of an index"""
+
+    def __init__(self, names, bitsets, n_docs):
+        self.names = list(names)
+        self.bitsets = bitsets
+        self.n_docs = int(n_docs)
+
+    @classmethod
+    def from_labels(cls, labels):
+        """Bitsets from one name, or a list of names (a row can be in several families), per row"""
+        families = [{family_of(name) for name in ([label] if isinstance(label, str) else label)}
+                    for label in labels]
+        bitsets = np.vstack([np.packbits([name in row for row in families]) for name in FACET_NAMES]) \
+            if labels else np.zeros((len(FACET_NAMES), 0), dtype=np.uint8)
+        return cls(FACET_NAMES, bitsets, len(labels))
+
+    def mask(self, families):
+        """Boolean row mask of the union of the given families (None = no filter)"""
+        if not families:
+            return None
+        rows = [self.names.index(family) for family in families if family in self.names]
+        combined = np.bitwise_or.reduce(self.bitsets[rows], axis=0) if rows else np.zeros_like(self.bitsets[0])
+        return np.unpackbits(combined, count=self.n_docs).astype(bool)
+
+    def counts(self, matches):
+        """Number of matching rows in each family, for a boolean row array"""
+        packed = np.packbits(matches)
+        return {name: int(_POPCOUNT[np.bitwise_and(bitset, packed)].sum())
+                for name, bitset in zip(self.names, self.bitsets)}
+
+    def save(self, path):
+        np.savez(path, names=np.array(self.names, dtype=str), bitsets=self.bitsets, n_docs=self.n_docs)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as state:
+            return cls(state['names'].tolist(), state['bitsets'], int(state['n_docs']))
+
+def facets_path(directory, prefix=''):
+    return os.path.join(directory, f'{prefix}facets.npz')
+
+def build_facets(sections, directory, prefix=''):
+    """Compute and save the family bitsets for a list of sections"""
+    index = FacetIndex.from_labels([section_labels(section) for section in sections])
+    index.save(facets_path(directory, prefix))
+    return index
+
+def load_facets(directory, n_docs, prefix=''):
+    """Load the family bitsets of an index, or None if missing or built for other rows"""
+    path = facets_path(directory, prefix)
+    if not os.path.exists(path):
+        return None
+    index = FacetIndex.load(path)
+    if index.n_docs != n_docs:
+        print(f"Ignoring {path}: built for {index.n_docs} rows, index has {n_docs}")
+        return None
+    return index
+
+def main():
+    # Usage: python facets.py [processed_data] [wiki_data]
+    targets = [("processed_data", "section_data.json", "", "pdf"), ("wiki_data", "wiki_sections.json", "wiki_", "wiki")]
+    if len(sys.argv) > 1:
+        targets = [(sys.argv[1],) + targets[0][1:]]
+        if len(sys.argv) > 2:
+            targets.append((sys.argv[2], "wiki_sections.json", "wiki_", "wiki"))
+    for base_dir, filename, prefix, kind in targets:
+        path = os.path.join(resolve_data_dir(base_dir), filename)
+        if not os.path.exists(path):
+            continue
+        with open(path, 'r', encoding='utf-8') as f:
+            sections = json.load(f)
+        # Built into a copy of the published version, which is then published itself
+        version_dir = derive_version(base_dir)
+        index = build_facets(sections, version_dir, prefix)
+        counts = index.counts(np.ones(index.n_docs, dtype=bool))
+        print(f"{facets_path(version_dir, prefix)}: " + ", ".join(f"{name} {count}" for name, count in counts.items()))
+        publish_version(base_dir, version_dir, kind)
+
+if __name__ == "__main__":
+    main()
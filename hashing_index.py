@@ -0,0 +1,223 @@
+# Feature-hashing index mode for the tutorial and wiki search indexes
+#
+# Instead of fitting a TfidfVectorizer vocabulary on the whole corpus, terms are
+# hashed into a fixed number of buckets and document frequencies are kept as a
+# separate count array. New documents can be appended without a refit and the
+# state on disk is two small .npz files rather than a pickled vocabulary.
+
+import os
+import sys
+import json
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfVectorizer
+from sklearn.preprocessing import normalize
+
+# Index mode used by preprocess_pdfs() and process_wiki_data(): "tfidf" or "hashing"
+INDEX_MODE = os.environ.get("GMS_INDEX_MODE", "tfidf")
+
+# Number of hash buckets; the vocabularies today are ~5k-10k terms, so collisions stay under 1%
+HASH_N_FEATURES = 2 ** 20
+
+# Same document-frequency pruning as the TfidfVectorizer used elsewhere
+MIN_DF = 2
+MAX_DF = 0.85
+
+class HashingIndex:
+    """Hashing vectorizer plus separately maintained document-frequency counts"""
+
+    def __init__(self, n_features=HASH_N_FEATURES, min_df=MIN_DF, max_df=MAX_DF):
+        self.n_features = n_features
+        self.min_df = min_df
+        self.max_df = max_df
+        self.n_docs = 0
+        self.doc_freq = np.zeros(n_features, dtype=np.int32)
+        self._idf = None
+        self._hasher = HashingVectorizer(
+            n_features=n_features,
+            stop_words='english',
+            alternate_sign=False,
+            norm=None
+        )
+
+    def add_documents(self, texts):
+        """Hash new documents, update document frequencies and return their raw term counts"""
+        counts = self._hasher.transform(texts).tocsr()
+        counts.sum_duplicates()
+        self.doc_freq += np.bincount(counts.indices, minlength=self.n_features).astype(np.int32)
+        self.n_docs += counts.shape[0]
+        self._idf = None
+        return counts
+
+    @property
+    def idf(self):
+        """Smoothed IDF per bucket, zeroed for buckets outside the min_df/max_df range"""
+        if self._idf is None:
+            df = self.doc_freq.astype(np.float64)
+            idf = np.log((1 + self.n_docs) / (1 + df)) + 1
+            idf[(df < self.min_df) | (df > self.max_df * self.n_docs)] = 0.0
+            self._idf = idf
+        return self._idf
+
+    def weight(self, counts):
+        """Apply the current IDF weights to raw term counts and L2-normalize each row"""
+        weighted = counts @ sp.diags(self.idf)
+        weighted.eliminate_zeros()
+        return normalize(weighted, norm='l2', copy=False)
+
+    def transform(self, texts):
+        """Vectorize texts (e.g. a query) the same way TfidfVectorizer.transform would"""
+        return self.weight(self._hasher.transform(texts))
+
+    def bucket_of(self, terms):
+        """Return the hash bucket for each term"""
+        hashed = self._hasher.transform(terms).tocsr()
+        return [int(hashed.indices[hashed.indptr[i]]) if hashed.indptr[i + 1] > hashed.indptr[i] else -1
+                for i in range(len(terms))]
+
+    def save(self, path):
+        """Save the index state (parameters and non-zero document frequencies)"""
+        nonzero = np.flatnonzero(self.doc_freq)
+        np.savez(
+            path,
+            n_features=self.n_features,
+            min_df=self.min_df,
+            max_df=self.max_df,
+            n_docs=self.n_docs,
+            df_indices=nonzero.astype(np.int32),
+            df_counts=self.doc_freq[nonzero]
+        )
+
+    @classmethod
+    def load(cls, path):
+        """Load an index state saved with save()"""
+        with np.load(path, allow_pickle=False) as state:
+            index = cls(int(state['n_features']), int(state['min_df']), float(state['max_df']))
+            index.n_docs = int(state['n_docs'])
+            index.doc_freq[state['df_indices']] = state['df_counts']
+        return index
+
+def _state_path(directory, prefix):
+    return os.path.join(directory, f'{prefix}hash_state.npz')
+
+def _counts_path(directory, prefix):
+    return os.path.join(directory, f'{prefix}hash_counts.npz')
+
+def hashed_index_exists(directory, prefix=''):
+    """Check whether a hashing index has been saved in the directory"""
+    return os.path.exists(_state_path(directory, prefix)) and os.path.exists(_counts_path(directory, prefix))
+
+def index_mode(directory, prefix=''):
+    """Index mode of a built directory, from the files present: "hashing" or "tfidf"
+
+    Builds choose the mode with GMS_INDEX_MODE; readers detect it, so a server
+    does not need the same setting as the build that produced its data.
+    """
+    return "hashing" if hashed_index_exists(directory, prefix) else "tfidf"
+
+def build_hashed_index(texts):
+    """Build a hashing index over the texts and return it with the raw term counts"""
+    index = HashingIndex()
+    counts = index.add_documents(texts)
+    return index, counts
+
+def save_hashed_index(index, counts, directory, prefix=''):
+    """Save the index state and raw term counts (no pickling involved)"""
+    index.save(_state_path(directory, prefix))
+    sp.save_npz(_counts_path(directory, prefix), counts.astype(np.float32).tocsr())
+
+def load_hashed_index(directory, prefix=''):
+    """Load a hashing index and return it with the IDF-weighted document matrix"""
+    index = HashingIndex.load(_state_path(directory, prefix))
+    counts = sp.load_npz(_counts_path(directory, prefix)).tocsr()
+    return index, index.weight(counts)
+
+def append_documents(directory, prefix, texts):
+    """Add documents to a saved hashing index without refitting; returns the updated index"""
+    index = HashingIndex.load(_state_path(directory, prefix))
+    counts = sp.load_npz(_counts_path(directory, prefix)).tocsr()
+    new_counts = index.add_documents(texts)
+    save_hashed_index(index, sp.vstack([counts, new_counts]), directory, prefix)
+    return index
+
+def _top_k(query_matrix, doc_matrix, top_k):
+    """Indices of the top-k documents for each query row (rows with no match are empty)"""
+    scores = (query_matrix @ doc_matrix.T).toarray()
+    results = []
+    for row in scores:
+        top = row.argsort()[:-top_k-1:-1]
+        results.append([int(i) for i in top if row[i] > 0.0])
+    return results
+
+def collision_report(texts, queries=None, top_k=10, n_features_options=None):
+    """Compare hashing indexes of several sizes against the exact TF-IDF vocabulary
+
+    For each bucket count this reports how many vocabulary terms share a bucket with
+    another term, and how closely the hashed top-k rankings match the exact ones
+    (mean overlap@k and the fraction of queries whose top result is unchanged).
+    """
+    if n_features_options is None:
+        n_features_options = [2 ** 12, 2 ** 14, 2 ** 16, 2 ** 18, HASH_N_FEATURES]
+
+    if queries is None:
+        # Use the opening words of an evenly spaced sample of the documents
+        step = max(1, len(texts) // 200)
+        queries = [" ".join(text.split()[:12]) for text in texts[::step]]
+
+    exact = TfidfVectorizer(stop_words='english', max_df=MAX_DF, min_df=MIN_DF)
+    exact_matrix = exact.fit_transform(texts)
+    exact_top = _top_k(exact.transform(queries), exact_matrix, top_k)
+    vocabulary = list(exact.vocabulary_.keys())
+
+    report = []
+    for n_features in n_features_options:
+        index = HashingIndex(n_features=n_features)
+        matrix = index.weight(index.add_documents(texts))
+        hashed_top = _top_k(index.transform(queries), matrix, top_k)
+
+        buckets = np.array([b for b in index.bucket_of(vocabulary) if b >= 0])
+        bucket_sizes = np.bincount(buckets, minlength=n_features)
+        colliding_terms = int(bucket_sizes[bucket_sizes > 1].sum())
+
+        overlaps = []
+        same_first = 0
+        for exact_ids, hashed_ids in zip(exact_top, hashed_top):
+            if not exact_ids:
+                continue
+            overlaps.append(len(set(exact_ids) & set(hashed_ids)) / len(exact_ids))
+            if hashed_ids and hashed_ids[0] == exact_ids[0]:
+                same_first += 1
+
+        report.append({
+            "n_features": n_features,
+            "vocabulary_terms": len(vocabulary),
+            "colliding_terms": colliding_terms,
+            "collision_rate": colliding_terms / max(1, len(vocabulary)),
+            "queries": len(overlaps),
+            "mean_overlap_at_k": float(np.mean(overlaps)) if overlaps else 0.0,
+            "top1_agreement": same_first / max(1, len(overlaps)),
+            "state_bytes": int(np.count_nonzero(index.doc_freq) * 8)
+        })
+
+    return report
+
+def main():
+    # Usage: python hashing_index.py [processed_data|wiki_data]
+    # index_versions imports this module; imported here to avoid the cycle
+    from index_versions import resolve_data_dir
+    directory = resolve_data_dir(sys.argv[1] if len(sys.argv) > 1 else "processed_data")
+    filename = 'wiki_sections.json' if os.path.exists(os.path.join(directory, 'wiki_sections.json')) else 'section_data.json'
+
+    with open(os.path.join(directory, filename), 'r', encoding='utf-8') as f:
+        sections = json.load(f)
+
+    texts = [section['content'] for section in sections]
+    print(f"Collision report for {len(texts)} sections in {directory}/{filename} (top-10)")
+    print(f"{'buckets':>10} {'terms':>7} {'colliding':>10} {'rate':>7} {'overlap@k':>10} {'top1':>6} {'state':>9}")
+    for row in collision_report(texts):
+        print(f"{row['n_features']:>10} {row['vocabulary_terms']:>7} {row['colliding_terms']:>10} "
+              f"{row['collision_rate']:>7.2%} {row['mean_overlap_at_k']:>10.3f} {row['top1_agreement']:>6.2%} "
+              f"{row['state_bytes'] / 1024:>7.1f}KB")
+
+if __name__ == "__main__":
+    main()
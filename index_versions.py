@@ -0,0 +1,217 @@
+# Versioned index directories with validated, atomic publishing
+#
+# A build never writes into the directory that servers read. Each build goes to
+# a fresh version directory, and a pointer file names the published one:
+#
+#   processed_data/current_version.txt      -> 20261019-031502-4711
+#   processed_data/versions/20261019-031502-4711/section_data.json ...
+#
+# Publishing a build:
+#   1. write manifest.json (sha256 and size of every file, section count)
+#   2. validate: checksums match, the section count matches the matrix rows and
+#      the facet bitsets, and smoke queries built from the text of a few
+#      sections find those sections
+#   3. replace the pointer file with os.replace (atomic on POSIX and Windows)
+#   4. delete all but the newest KEEP_VERSIONS versions
+# Readers resolve the pointer when they load, so they only ever see complete,
+# validated versions. A directory without a pointer file (the data shipped in
+# the repository) is read in place. Servers compare the resolved directory with
+# the one they loaded and swap to the new version between requests.
+
+import os
+import json
+import time
+import shutil
+import hashlib
+import itertools
+from hashing_index import index_mode
+from section_store import build_data_stores
+
+# Pointer file naming the published version of a data directory
+POINTER_FILE = 'current_version.txt'
+VERSIONS_DIR = 'versions'
+MANIFEST_FILE = 'manifest.json'
+
+# Published versions kept on disk, so servers still on an older one can finish with it
+KEEP_VERSIONS = int(os.environ.get("GMS_KEEP_VERSIONS", "3"))
+
+# Numbers the builds of this process, for unique version ids
+_build_numbers = itertools.count(1)
+
+# Section file of each kind of data directory
+SECTION_FILES = {"pdf": "section_data.json", "wiki": "wiki_sections.json"}
+
+def current_version(base_dir):
+    """Published version id of a data directory (None if it has no pointer file)"""
+    try:
+        with open(os.path.join(base_dir, POINTER_FILE), 'r') as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+def resolve_data_dir(base_dir):
+    """The directory holding the published data: the current version, or base_dir itself"""
+    version = current_version(base_dir)
+    if version is not None:
+        version_dir = os.path.join(base_dir, VERSIONS_DIR, version)
+        if os.path.isdir(version_dir):
+            return version_dir
+    return base_dir
+
+def new_version_dir(base_dir):
+    """Create an empty, unpublished version directory for a build
+
+    The id is the time, the process id and a per-process build number, so
+    several builds in one process (or one second) never share a directory.
+    """
+    while True:
+        version = time.strftime('%Y%m%d-%H%M%S') + f'-{os.getpid()}-{next(_build_numbers):03d}'
+        path = os.path.join(base_dir, VERSIONS_DIR, version)
+        try:
+            os.makedirs(path)
+            return path
+        except FileExistsError:
+            # Left by an earlier process with the same id
+            continue
+
+def derive_version(base_dir):
+    """New version directory that starts as a copy of the published data (for incremental updates)
+
+    Files are copied rather than hard-linked, because the build rewrites some of
+    them in place and the published version must not change underneath its readers.
+    """
+    source = resolve_data_dir(base_dir)
+    target = new_version_dir(base_dir)
+    for name in os.listdir(source):
+        path = os.path.join(source, name)
+        # Manifests, memory-mapped exports and column stores are rewritten when the copy is published
+        if (not os.path.isfile(path) or name in (POINTER_FILE, MANIFEST_FILE)
+                or '_matrix_' in name or '_store_' in name):
+            continue
+        shutil.copy2(path, os.path.join(target, name))
+    return target
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def write_manifest(version_dir, kind="pdf"):
+    """Record the checksum and size of every file, the section count and index mode in manifest.json"""
+    with open(os.path.join(version_dir, SECTION_FILES[kind]), 'r', encoding='utf-8') as f:
+        rows = len(json.load(f))
+    files = {}
+    for name in sorted(os.listdir(version_dir)):
+        path = os.path.join(version_dir, name)
+        if os.path.isfile(path) and name != MANIFEST_FILE:
+            files[name] = {"sha256": _sha256(path), "bytes": os.path.getsize(path)}
+    manifest = {"version": os.path.basename(version_dir), "kind": kind, "created": time.time(),
+                "rows": rows, "index_mode": index_mode(version_dir, 'wiki_' if kind == "wiki" else ''),
+                "files": files}
+    with open(os.path.join(version_dir, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+def validate_version(version_dir, kind="pdf"):
+    """Check a built version before it is published; returns the loaded state and a list of problems"""
+    # The search core imports this module; imported here to avoid the cycle
+    from search_core import SearchState, load_search_data, load_wiki_data, search_content, search_wiki_content
+    from semantic_index import embedding_rows
+
+    try:
+        with open(os.path.join(version_dir, MANIFEST_FILE), 'r') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        return None, [f"manifest not readable: {e}"]
+
+    problems = []
+    for name, entry in manifest["files"].items():
+        path = os.path.join(version_dir, name)
+        if not os.path.exists(path):
+            problems.append(f"{name} is missing")
+        elif os.path.getsize(path) != entry["bytes"] or _sha256(path) != entry["sha256"]:
+            problems.append(f"{name} does not match its checksum")
+    if problems:
+        return None, problems
+
+    state = SearchState()
+    try:
+        if kind == "wiki":
+            load_wiki_data(state, wiki_data_dir=version_dir)
+            sections, matrix, facets = state.wiki_sections, state.wiki_tfidf_matrix, state.wiki_facets
+            search = search_wiki_content
+        else:
+            load_search_data(state, data_dir=version_dir, wiki_data_dir=None)
+            sections, matrix, facets = state.section_data, state.tfidf_matrix, state.facets
+            search = search_content
+    except Exception as e:
+        return None, [f"index does not load: {e}"]
+
+    # Every row-aligned structure must have one row per section
+    counts = {"manifest": manifest["rows"], "sections": len(sections),
+              "matrix rows": matrix.shape[0] if matrix is not None else 0,
+              "facet rows": facets.n_docs if facets is not None else len(sections)}
+    # Embeddings are checked on disk; the state only loads them when the model is installed
+    embeddings = embedding_rows(version_dir, 'wiki_' if kind == "wiki" else '')
+    if embeddings is not None:
+        counts["embedding rows"] = embeddings
+    if len(set(counts.values())) > 1:
+        problems.append("row counts differ: " + ", ".join(f"{name} {count}" for name, count in counts.items()))
+    if not sections:
+        problems.append("no sections")
+    if problems:
+        return state, problems
+
+    # Smoke queries: the text of the first, middle and last section must find that section
+    for position in sorted({0, len(sections) // 2, len(sections) - 1}):
+        probe = sections[position]
+        results = search(state, probe["content"], top_n=10)
+        if not any(result["section"]["id"] == probe["id"] for result in results):
+            problems.append(f"smoke query for section {probe['id']} did not find it ({len(results)} results)")
+    return state, problems
+
+def publish_version(base_dir, version_dir, kind="pdf"):
+    """Validate a built version and make it the current one; returns False if it was rejected"""
+    # Exported here so the memory-mapped copies are ready before any worker maps them
+    from search_core import export_search_matrices
+
+    # Built here so servers never have to write into a published version
+    build_data_stores(version_dir)
+    write_manifest(version_dir, kind)
+    state, problems = validate_version(version_dir, kind)
+    if problems:
+        print(f"Not publishing {version_dir}:")
+        for problem in problems:
+            print(f"  - {problem}")
+        os.replace(version_dir, version_dir + '.failed')
+        return False
+    export_search_matrices(state)
+    del state
+
+    # The pointer is replaced in one rename, so readers see either the old or the new version
+    pointer = os.path.join(base_dir, POINTER_FILE)
+    with open(pointer + '.tmp', 'w') as f:
+        f.write(os.path.basename(version_dir))
+    os.replace(pointer + '.tmp', pointer)
+    print(f"Published {version_dir}")
+
+    prune_versions(base_dir)
+    return True
+
+def prune_versions(base_dir, keep=KEEP_VERSIONS):
+    """Delete all but the newest `keep` versions (never the current one) and failed builds"""
+    versions_dir = os.path.join(base_dir, VERSIONS_DIR)
+    if not os.path.isdir(versions_dir):
+        return []
+    current = current_version(base_dir)
+    published = sorted(name for name in os.listdir(versions_dir)
+                       if os.path.exists(os.path.join(versions_dir, name, MANIFEST_FILE)) and not name.endswith('.failed'))
+    # Unfinished builds have no manifest yet; leave them to their builder
+    failed = [name for name in os.listdir(versions_dir) if name.endswith('.failed')]
+    removed = [name for name in published[:-keep] if name != current] + failed
+    for name in removed:
+        # Servers still on a removed version keep their open files (and memory maps) on POSIX
+        shutil.rmtree(os.path.join(versions_dir, name), ignore_errors=True)
+    return removed
@@ -0,0 +1,152 @@
+# Ingestion benchmark for the PDF extraction backends
+#
+# For every installed backend (see pdf_extract.py) this runs the full PDF build
+# into a scratch directory and reports:
+#   - pages/sec of the text extraction alone, and the peak RSS of the process
+#     doing it (each backend is extracted in a fresh process, so the peaks are
+#     comparable)
+#   - vocabulary size: distinct tokens in the extracted text, and the terms that
+#     made it into the index. Broken words ("the se tools", "GMS 10. 8") add
+#     fragments to the first number without adding anything useful
+#   - recall@k on a labelled set of questions: the share of the tutorials known
+#     to answer a question that show up among its top-k sections
+#
+#   python ingest_benchmark.py                  # every installed backend
+#   python ingest_benchmark.py pypdf2 pymupdf
+
+import os
+import re
+import sys
+import time
+import shutil
+import resource
+import tempfile
+import multiprocessing
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from compressed_index import CompressedPostings
+from pdf_extract import BACKENDS, available_backends, extract_pages
+from search_core import PDFS_DIR, SearchState, load_search_data, search_content
+
+# Questions and the tutorials that answer them
+BENCHMARK_QUERIES = [
+    ("define a pumping well with the MNW2 package",
+     ["MODFLOW-MNW2Package", "MODFLOW-MNW2NonVerticalandPumpCapacity"]),
+    ("MODFLOW conceptual model approach",
+     ["MODFLOW-ConceptualModelApproach1", "MODFLOW-ConceptualModelApproach2",
+      "MODFLOW-ConceptualModelApproach3", "MODFLOW-ConceptualModelApproach4"]),
+    ("interpolate layer elevations to the MODFLOW grid", ["MODFLOW-InterpolatingLayerData"]),
+    ("generate MODFLOW layer data from solids", ["MODFLOW-GeneratingDataFromSolids"]),
+    ("boreholes and cross sections", ["StratigraphyModeling-BoreholesAndCrossSections"]),
+    ("transient calibration with observation wells",
+     ["MODFLOW-TransientCalibration", "MODFLOW-TransientCalibrationPumpTest"]),
+    ("MT3DMS heat transport", ["MT3DMS-HeatTransport"]),
+    ("PEST pilot points", ["MODFLOW-PestPilotPoints", "MODFLOW-PestPilotPointsAdvanced"]),
+    ("SEAWAT viscosity and pressure effects", ["SEAWAT-ViscosityAndPressureEffects"]),
+    ("recharge package", ["MODFLOW-Recharge"]),
+    ("FEMWATER flow model", ["FEMWATER-FlowModel"]),
+    ("zone budget", ["MODFLOW-ZONEBUDGET", "MODFLOW6-ZONEBUDGET"]),
+    ("streamflow routing package", ["MODFLOW-SFR2Package", "MODFLOW6-SFR"]),
+    ("lake package", ["MODFLOW-LAKPackage"]),
+    ("kriging scatter points in 2D", ["Geostatistics-2D"]),
+    ("transition probability geostatistics", ["T-PROGS"]),
+    ("seepage through an earth dam", ["SEEP2D-EarthDam"]),
+    ("sheet pile seepage", ["SEEP2D-SheetPile"]),
+    ("local grid refinement", ["MODFLOW-LGR", "MODFLOW-LGR_Dual"]),
+    ("BTEX degradation", ["RT3D-BTEXDegradationWithMultipleElectronAcceptors", "SEAM3D-BTEX"]),
+    ("quadtree grid for MODFLOW-USG", ["MODFLOW-USG-Quadtree"]),
+    ("connected linear network wells",
+     ["MODFLOW-USG-CLNProcess", "MODFLOW-USG-CLNObservations", "MODFLOW-USG-ShapefileToCLN"]),
+    ("MODPATH particle tracking", ["MODPATH"]),
+    ("import lidar data", ["Lidar", "Lidar_with_Multiple_Files"]),
+    ("coordinate system projections", ["Projections"]),
+    ("land subsidence package", ["MODFLOW-SUBPackage"]),
+    ("null space Monte Carlo",
+     ["MODFLOW-StochasticModeling-NullSpaceMonteCarloI", "MODFLOW-StochasticModeling-NullSpaceMonteCarloII"]),
+    ("horizons and solids", ["StratigraphyModeling-HorizonsAndSolids"]),
+]
+
+# Sections looked at per question
+RECALL_K = 10
+
+def _peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def _time_extraction(backend, pdfs_dir):
+    """Runs in a fresh process: extract every PDF, return pages, seconds, peak RSS and distinct tokens"""
+    pdf_files = sorted(f for f in os.listdir(pdfs_dir) if f.endswith('.pdf'))
+    tokens = set()
+    pages = 0
+    start = time.perf_counter()
+    for pdf_file in pdf_files:
+        page_texts = extract_pages(os.path.join(pdfs_dir, pdf_file), backend)
+        pages += len(page_texts)
+        for text in page_texts:
+            tokens.update(re.findall(r'\w+', text.lower()))
+    elapsed = time.perf_counter() - start
+    return {"pdfs": len(pdf_files), "pages": pages, "seconds": elapsed,
+            "peak_rss_mb": _peak_rss_mb(), "distinct_tokens": len(tokens)}
+
+def _section_tutorials(section):
+    """Tutorials a result stands for, including the near-duplicates it replaced"""
+    tutorials = {section["tutorial"]}
+    tutorials.update(duplicate.rsplit('-', 1)[0] for duplicate in section.get("duplicates", []))
+    return tutorials
+
+def search_recall(state, queries=BENCHMARK_QUERIES, k=RECALL_K):
+    """Mean share of each question's tutorials found among its top-k sections"""
+    recalls = []
+    for query, expected in queries:
+        found = set()
+        for result in search_content(state, query, top_n=k):
+            found |= _section_tutorials(result["section"])
+        recalls.append(len(found & set(expected)) / len(expected))
+    return sum(recalls) / len(recalls)
+
+def benchmark_backend(backend, pdfs_dir=PDFS_DIR):
+    """Extraction speed and memory, vocabulary size and search recall of one backend"""
+    # A fresh interpreter per backend, so the RSS peak is that backend's alone
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+        row = executor.submit(_time_extraction, backend, pdfs_dir).result()
+    row["backend"] = backend
+    row["pages_per_sec"] = row["pages"] / max(row["seconds"], 1e-9)
+
+    # The PDF build is imported here so extraction never needs it
+    from build import preprocess_pdfs
+    data_dir = tempfile.mkdtemp(prefix=f"gms_ingest_{backend}_")
+    try:
+        preprocess_pdfs(pdfs_dir, data_dir, backend)
+        state = SearchState()
+        load_search_data(state, data_dir=data_dir, wiki_data_dir=None)
+        row["sections"] = len(state.section_data)
+        # Columns with at least one posting: the indexed vocabulary, in either index mode
+        matrix = state.tfidf_matrix
+        terms = matrix.term_ids if isinstance(matrix, CompressedPostings) else np.unique(matrix.indices)
+        row["index_terms"] = len(terms)
+        row["recall"] = search_recall(state)
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+    return row
+
+def main():
+    backends = sys.argv[1:] or available_backends()
+    unknown = [backend for backend in backends if backend not in BACKENDS]
+    if unknown:
+        print(f"Unknown backend(s) {', '.join(unknown)}; expected some of {', '.join(BACKENDS)}")
+        return
+    missing = [backend for backend in backends if backend not in available_backends()]
+    if missing:
+        print(f"Skipping backends that are not installed: {', '.join(missing)}")
+    backends = [backend for backend in backends if backend not in missing]
+
+    rows = [benchmark_backend(backend) for backend in backends]
+    print(f"\nIngestion of {PDFS_DIR}/ ({len(BENCHMARK_QUERIES)} benchmark questions, recall@{RECALL_K})")
+    print(f"{'backend':>9} {'pages':>6} {'pages/s':>8} {'peak MB':>8} {'tokens':>7} {'terms':>7} {'sections':>9} {'recall':>7}")
+    for row in rows:
+        print(f"{row['backend']:>9} {row['pages']:>6} {row['pages_per_sec']:>8.1f} {row['peak_rss_mb']:>8.0f} "
+              f"{row['distinct_tokens']:>7} {row['index_terms']:>7} {row['sections']:>9} {row['recall']:>7.1%}")
+
+if __name__ == "__main__":
+    main()
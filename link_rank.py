@@ -0,0 +1,156 @@
+# Link-graph authority of wiki pages as a ranking signal
+#
+# The crawler records the /wiki/GMS: links of every page. At build time they
+# form a sparse page x page adjacency matrix and PageRank is computed over it
+# by power iteration (one sparse matrix-vector product per step). Each wiki
+# section inherits the score of its page as a prior in [0, 1]:
+#   - the PageRank percentile, so one very central page doesn't flatten the rest
+#   - damped by the page's out-degree, so index pages that link to everything
+#     (the User Manual contents) don't get boosted for every query they match
+# The prior becomes a per-section score multiplier, 1 + LINK_RANK_WEIGHT * prior,
+# saved as wiki_link_rank.npz. The page links it was computed from are saved
+# with it (wiki_links.json), so it can be rebuilt from the version alone. Search multiplies the wiki scores by it, which
+# costs one vector product per query; nothing about the graph is computed then.
+#
+#   python link_rank.py      # rebuild for the wiki data that is already processed
+
+import os
+import sys
+import json
+from urllib.parse import unquote, urldefrag
+import numpy as np
+import scipy.sparse as sp
+from scipy.stats import rankdata
+from index_versions import resolve_data_dir, derive_version, publish_version
+
+# Strength of the authority prior (0 turns it off)
+LINK_RANK_WEIGHT = float(os.environ.get("GMS_LINK_RANK_WEIGHT", "0.2"))
+
+# Out-degree at which a page's prior is halved
+HUB_LINKS = int(os.environ.get("GMS_HUB_LINKS", "50"))
+
+# PageRank damping factor and convergence settings
+DAMPING = 0.85
+MAX_ITERATIONS = 100
+TOLERANCE = 1e-10
+
+LINK_RANK_FILE = 'wiki_link_rank.npz'
+LINKS_FILE = 'wiki_links.json'
+
+def page_key(url):
+    """Canonical page of a URL: no fragment, percent-decoding and underscores normalized"""
+    return unquote(urldefrag(url)[0]).replace(' ', '_').rstrip('/')
+
+def link_graph(pages):
+    """Page keys and the 0/1 adjacency matrix of links between crawled pages"""
+    keys = [page_key(page['url']) for page in pages]
+    node_of = {key: node for node, key in enumerate(keys)}
+    rows, cols = [], []
+    for node, page in enumerate(pages):
+        targets = {node_of.get(page_key(link)) for link in page.get('links', [])}
+        targets.discard(None)
+        targets.discard(node)
+        rows.extend([node] * len(targets))
+        cols.extend(targets)
+    adjacency = sp.csr_matrix((np.ones(len(rows), dtype=np.float64), (rows, cols)), shape=(len(keys), len(keys)))
+    return keys, adjacency
+
+def pagerank(adjacency, damping=DAMPING, max_iterations=MAX_ITERATIONS, tolerance=TOLERANCE):
+    """PageRank vector of a link matrix by power iteration; returns the ranks and iterations used"""
+    n = adjacency.shape[0]
+    if n == 0:
+        return np.zeros(0), 0
+    out_degree = np.asarray(adjacency.sum(axis=1)).ravel()
+    inverse_degree = np.divide(1.0, out_degree, out=np.zeros(n), where=out_degree > 0)
+    # Column-stochastic transition matrix, so one step is a single sparse product
+    transition = (sp.diags(inverse_degree) @ adjacency).T.tocsr()
+    dangling = out_degree == 0
+
+    rank = np.full(n, 1.0 / n)
+    for iteration in range(1, max_iterations + 1):
+        # Pages without out-links spread their rank evenly over all pages
+        updated = damping * (transition @ rank + rank[dangling].sum() / n) + (1.0 - damping) / n
+        change = np.abs(updated - rank).sum()
+        rank = updated
+        if change < tolerance:
+            break
+    return rank, iteration
+
+def page_priors(adjacency, rank):
+    """Authority prior per page: PageRank percentile, damped by out-degree"""
+    n = len(rank)
+    if n < 2:
+        return np.zeros(n)
+    # Ties share their average rank
+    percentile = (rankdata(rank) - 1.0) / (n - 1)
+    out_degree = np.asarray(adjacency.sum(axis=1)).ravel()
+    return percentile / (1.0 + out_degree / HUB_LINKS)
+
+def build_link_rank(pages, wiki_sections, directory, weight=LINK_RANK_WEIGHT):
+    """Compute the per-section authority prior and score multiplier and save them"""
+    keys, adjacency = link_graph(pages)
+    rank, iterations = pagerank(adjacency)
+    priors = page_priors(adjacency, rank)
+    node_of = {key: node for node, key in enumerate(keys)}
+
+    # Sections inherit their page's prior; sections of pages not in the crawl get none
+    nodes = np.array([node_of.get(page_key(section['url']), -1) for section in wiki_sections], dtype=np.int64)
+    section_priors = np.zeros(len(wiki_sections))
+    found = nodes >= 0
+    section_priors[found] = priors[nodes[found]]
+    boost = (1.0 + weight * section_priors).astype(np.float32)
+    with open(os.path.join(directory, LINKS_FILE), 'w', encoding='utf-8') as f:
+        json.dump([{"url": page['url'], "links": page.get('links', [])} for page in pages], f)
+    np.savez(os.path.join(directory, LINK_RANK_FILE), pagerank=rank, page_keys=np.array(keys, dtype=str),
+             section_prior=section_priors.astype(np.float32), boost=boost)
+    print(f"Link graph: {len(keys)} pages, {adjacency.nnz} links, PageRank converged in {iterations} iterations")
+    return boost
+
+def load_link_rank(directory, n_sections):
+    """Per-section score multipliers, or None if missing or built for other sections"""
+    path = os.path.join(directory, LINK_RANK_FILE)
+    if not os.path.exists(path):
+        return None
+    with np.load(path, allow_pickle=False) as state:
+        boost = state['boost']
+    if len(boost) != n_sections:
+        print(f"Ignoring {path}: built for {len(boost)} sections, index has {n_sections}")
+        return None
+    return boost
+
+def load_page_links(directory):
+    """Pages (url and links) a wiki version was built from, or None if it has no record of them"""
+    # Data processed before the links were saved with the version only has the crawl output
+    for filename in (LINKS_FILE, 'wiki_data.json'):
+        path = os.path.join(directory, filename)
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+    return None
+
+def main():
+    # Usage: python link_rank.py [wiki_data]
+    base_dir = sys.argv[1] if len(sys.argv) > 1 else "wiki_data"
+    directory = resolve_data_dir(base_dir)
+    pages = load_page_links(directory)
+    if pages is None:
+        print(f"No {LINKS_FILE} in {directory}; process the wiki data again to record the page links")
+        sys.exit(1)
+    with open(os.path.join(directory, 'wiki_sections.json'), 'r', encoding='utf-8') as f:
+        wiki_sections = json.load(f)
+    # Built into a copy of the published version, which is then published itself
+    version_dir = derive_version(base_dir)
+    build_link_rank(pages, wiki_sections, version_dir)
+
+    keys, adjacency = link_graph(pages)
+    rank, _ = pagerank(adjacency)
+    priors = page_priors(adjacency, rank)
+    out_degree = np.asarray(adjacency.sum(axis=1)).ravel().astype(int)
+    in_degree = np.asarray(adjacency.sum(axis=0)).ravel().astype(int)
+    print(f"{'PageRank':>9} {'prior':>6} {'in':>5} {'out':>5}  page")
+    for node in np.argsort(-rank)[:15]:
+        print(f"{rank[node]:>9.4f} {priors[node]:>6.2f} {in_degree[node]:>5} {out_degree[node]:>5}  {keys[node]}")
+    publish_version(base_dir, version_dir, 'wiki')
+
+if __name__ == "__main__":
+    main()
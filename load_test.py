@@ -0,0 +1,95 @@
+# Load test for the multi-worker search mode
+#
+# Runs the same query mix in-process and through SearchWorkerPool with an
+# increasing number of workers and reports throughput and latency for each.
+#
+#   python load_test.py                 # 1, 2, 4, ... up to the CPU count
+#   python load_test.py 1 2 4 8         # explicit worker counts
+
+import os
+import sys
+import time
+import random
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from search_core import SearchState, load_search_data, get_response
+from search_workers import SearchWorkerPool
+
+# Typical questions from our users
+SAMPLE_QUERIES = [
+    "how do I define a pumping well",
+    "MODFLOW conceptual model approach",
+    "import scatter points from a text file",
+    "interpolate layer elevations",
+    "create a 3D grid from solids",
+    "stratigraphy modeling with boreholes",
+    "transient calibration with observation wells",
+    "MT3DMS transport simulation",
+    "PEST pilot points",
+    "SEAWAT density dependent flow",
+    "recharge package",
+    "map coverage to MODFLOW",
+    "FEMWATER flow model",
+    "zone budget",
+    "river boundary conditions",
+]
+
+QUERY_COUNT = 400
+
+def build_query_mix(state, count=QUERY_COUNT, seed=0):
+    """Sample questions plus the opening words of random sections"""
+    rng = random.Random(seed)
+    queries = list(SAMPLE_QUERIES)
+    for section in rng.sample(state.section_data, min(len(state.section_data), count)):
+        queries.append(" ".join(section["content"].split()[:8]))
+    rng.shuffle(queries)
+    return queries[:count]
+
+def run_load(search, queries, concurrency):
+    """Issue the queries from `concurrency` client threads; returns throughput and latencies"""
+    def timed(query):
+        start = time.perf_counter()
+        search(query)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as clients:
+        latencies = list(clients.map(timed, queries))
+    elapsed = time.perf_counter() - start
+
+    latencies = np.array(latencies) * 1000
+    return {
+        "qps": len(queries) / elapsed,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+    }
+
+def main():
+    cpu_count = os.cpu_count() or 1
+    if len(sys.argv) > 1:
+        worker_counts = [int(arg) for arg in sys.argv[1:]]
+    else:
+        worker_counts = [n for n in (1, 2, 4, 8, 16, 32) if n <= cpu_count]
+
+    state = SearchState()
+    load_search_data(state)
+    queries = build_query_mix(state)
+
+    print(f"{len(queries)} queries, {cpu_count} CPUs")
+    print(f"{'mode':<14} {'clients':>8} {'qps':>8} {'p50 ms':>8} {'p95 ms':>8} {'speedup':>8}")
+
+    baseline = run_load(lambda q: get_response(state, q), queries, concurrency=max(worker_counts) * 2)
+    print(f"{'in-process':<14} {max(worker_counts) * 2:>8} {baseline['qps']:>8.1f} "
+          f"{baseline['p50_ms']:>8.1f} {baseline['p95_ms']:>8.1f} {1.0:>8.2f}")
+
+    for n_workers in worker_counts:
+        pool = SearchWorkerPool(n_workers)
+        try:
+            result = run_load(pool.get_response, queries, concurrency=n_workers * 2)
+        finally:
+            pool.shutdown()
+        print(f"{f'{n_workers} workers':<14} {n_workers * 2:>8} {result['qps']:>8.1f} "
+              f"{result['p50_ms']:>8.1f} {result['p95_ms']:>8.1f} {result['qps'] / baseline['qps']:>8.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+# Request-level performance metrics for the search core
+#
+# Stage timings, counters and histograms are kept in a small in-process
+# registry and exposed either as a Prometheus text endpoint or as one JSON line
+# per request in a log file. Everything is off unless GMS_METRICS=1; when off,
+# span() returns a shared no-op context manager and inc()/observe() return
+# immediately, so the instrumentation costs a function call per stage.
+#
+#   GMS_METRICS=1 GMS_METRICS_PORT=9108 streamlit run app.py
+#   curl http://localhost:9108/metrics
+#
+# The endpoint listens on 127.0.0.1 unless GMS_METRICS_HOST says otherwise
+# (e.g. 0.0.0.0 for a scraper on another host).
+
+import os
+import json
+import time
+import uuid
+import bisect
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+METRICS_ENABLED = os.environ.get("GMS_METRICS", "0") == "1"
+
+# Port for the Prometheus text endpoint (0 = no endpoint)
+METRICS_PORT = int(os.environ.get("GMS_METRICS_PORT", "0"))
+
+# Address the endpoint binds to (loopback only by default)
+METRICS_HOST = os.environ.get("GMS_METRICS_HOST", "127.0.0.1")
+
+# JSON-lines file receiving one record per request with its stage spans ("" = off)
+METRICS_LOG = os.environ.get("GMS_METRICS_LOG", "")
+
+# Histogram buckets (upper bounds) for latencies in seconds and for result counts
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20)
+
+# Help text for every metric name that is exported
+METRIC_HELP = {
+    "gms_requests_total": ("counter", "Search requests handled"),
+    "gms_fallbacks_total": ("counter", "Requests with no direct match, by fallback taken"),
+    "gms_errors_total": ("counter", "Errors raised inside a search stage"),
+    "gms_spelling_corrections_total": ("counter", "Queries searched with corrected spelling"),
+    "gms_spelling_suggestions_total": ("counter", "Spelling corrections offered but not searched"),
+    "gms_partial_results_total": ("counter", "Responses cut short by the request time budget"),
+    "gms_budget_cuts_total": ("counter", "Search stages stopped early by the time budget, by stage"),
+    "gms_early_terminations_total": ("counter", "Scorings stopped once the top results were settled"),
+    "gms_query_terms_dropped_total": ("counter", "Query terms dropped from long queries"),
+    "gms_request_seconds": ("histogram", "End-to-end get_response() latency"),
+    "gms_stage_seconds": ("histogram", "Latency of each search stage"),
+    "gms_results": ("histogram", "Number of results returned per source"),
+}
+
+class _NullSpan:
+    """Context manager used for spans while metrics are disabled"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_NULL_SPAN = _NullSpan()
+
+class _Span:
+    """Times one stage and records it in the registry and the current request trace"""
+
+    def __init__(self, registry, stage):
+        self.registry = registry
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.start
+        self.registry.observe("gms_stage_seconds", elapsed, LATENCY_BUCKETS, stage=self.stage)
+        if exc_type is not None:
+            self.registry.inc("gms_errors_total", stage=self.stage)
+        trace = getattr(self.registry._local, "trace", None)
+        if trace is not None:
+            trace["spans"].append({"stage": self.stage, **getattr(self.registry._local, "span_fields", {}),
+                                   "ms": round(elapsed * 1000, 3),
+                                   "error": exc_type.__name__ if exc_type else None})
+        return False
+
+class _RequestTrace:
+    """Collects the spans of one request and writes them to the log sink"""
+
+    def __init__(self, registry, **fields):
+        self.registry = registry
+        self.fields = fields
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        self.registry._local.trace = {"request": uuid.uuid4().hex[:12], "ts": time.time(),
+                                      **self.fields, "spans": []}
+        return self.registry._local.trace
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.start
+        trace = self.registry._local.trace
+        self.registry._local.trace = None
+        self.registry.inc("gms_requests_total")
+        self.registry.observe("gms_request_seconds", elapsed, LATENCY_BUCKETS)
+        trace["ms"] = round(elapsed * 1000, 3)
+        self.registry.write_log(trace)
+        return False
+
+class Metrics:
+    """Thread-safe registry of counters and histograms"""
+
+    def __init__(self, enabled=METRICS_ENABLED, log_path=METRICS_LOG):
+        self.enabled = enabled
+        self.log_path = log_path
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._counters = {}
+        self._histograms = {}
+
+    def inc(self, name, value=1, **labels):
+        """Increase a counter"""
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        """Add an observation to a histogram"""
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = {"buckets": buckets, "counts": [0] * (len(buckets) + 1),
+                                                     "sum": 0.0, "count": 0}
+            histogram["counts"][bisect.bisect_left(buckets, value)] += 1
+            histogram["sum"] += value
+            histogram["count"] += 1
+
+    def span(self, stage):
+        """Context manager timing one stage of a request"""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, stage)
+
+    def request(self, **fields):
+        """Context manager wrapping a whole request; its spans are logged together"""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _RequestTrace(self, **fields)
+
+    def traced(self, function, **fields):
+        """Wrap a function handed to another thread so its spans join the current request trace
+
+        The fields (e.g. shard="10.7") are added to each of those spans.
+        """
+        trace = getattr(self._local, "trace", None)
+        if not self.enabled or trace is None:
+            return function
+
+        def run(*args, **kwargs):
+            local = self._local
+            outer = getattr(local, "trace", None), getattr(local, "span_fields", {})
+            local.trace, local.span_fields = trace, fields
+            try:
+                return function(*args, **kwargs)
+            finally:
+                local.trace, local.span_fields = outer
+        return run
+
+    def write_log(self, record):
+        """Append one JSON record to the log sink, if configured"""
+        if not self.log_path:
+            return
+        line = json.dumps(record, separators=(',', ':'))
+        with self._lock:
+            with open(self.log_path, 'a', encoding='utf-8') as f:
+                f.write(line + "\n")
+
+    def snapshot(self, reset=False):
+        """Copy of the current values (optionally resetting them), e.g. to ship between processes"""
+        with self._lock:
+            snapshot = {
+                "counters": list(self._counters.items()),
+                "histograms": [(key, {**h, "counts": list(h["counts"])}) for key, h in self._histograms.items()]
+            }
+            if reset:
+                self._counters.clear()
+                self._histograms.clear()
+        return snapshot
+
+    def merge(self, snapshot):
+        """Add the values of a snapshot taken in another process"""
+        if not self.enabled or not snapshot:
+            return
+        with self._lock:
+            for key, value in snapshot["counters"]:
+                self._counters[key] = self._counters.get(key, 0) + value
+            for key, other in snapshot["histograms"]:
+                histogram = self._histograms.get(key)
+                if histogram is None:
+                    self._histograms[key] = {**other, "counts": list(other["counts"])}
+                    continue
+                histogram["counts"] = [a + b for a, b in zip(histogram["counts"], other["counts"])]
+                histogram["sum"] += other["sum"]
+                histogram["count"] += other["count"]
+
+    def render_prometheus(self):
+        """Render all metrics in the Prometheus text exposition format"""
+        snapshot = self.snapshot()
+        lines = []
+        described = set()
+
+        def describe(name):
+            if name not in described and name in METRIC_HELP:
+                kind, text = METRIC_HELP[name]
+                lines.append(f"# HELP {name} {text}")
+                lines.append(f"# TYPE {name} {kind}")
+                described.add(name)
+
+        def label_text(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+        for (name, labels), value in sorted(snapshot["counters"]):
+            describe(name)
+            lines.append(f"{name}{label_text(labels)} {value}")
+
+        for (name, labels), histogram in sorted(snapshot["histograms"], key=lambda item: item[0]):
+            describe(name)
+            cumulative = 0
+            for bound, count in zip(histogram["buckets"], histogram["counts"]):
+                cumulative += count
+                lines.append(f"{name}_bucket{label_text(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{name}_bucket{label_text(labels, [('le', '+Inf')])} {histogram['count']}")
+            lines.append(f"{name}_sum{label_text(labels)} {histogram['sum']}")
+            lines.append(f"{name}_count{label_text(labels)} {histogram['count']}")
+
+        return "\n".join(lines) + "\n"
+
+# Registry used by the search core in this process
+metrics = Metrics()
+
+def start_metrics_server(port=METRICS_PORT, registry=metrics, host=METRICS_HOST):
+    """Serve /metrics on a background thread; returns the server (or None if disabled)"""
+    if not registry.enabled or not port:
+        return None
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip('/') != '/metrics':
+                self.send_error(404)
+                return
+            body = registry.render_prometheus().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
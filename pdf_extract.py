@@ -0,0 +1,79 @@
+# PDF text extraction backends
+#
+# The build only needs the text of each page. Which library produces it is a
+# backend choice: PyPDF2 is the default and always installed; the others are
+# used when their package is present and selected with GMS_PDF_BACKEND or the
+# backend argument. All of them are CPU-only.
+#
+#   pypdf2     PyPDF2 (default)
+#   pypdf      pypdf, the maintained successor of PyPDF2 (better word spacing)
+#   pymupdf    PyMuPDF / fitz (MuPDF in C, by far the fastest)
+#   pdfminer   pdfminer.six (layout analysis, slowest)
+#
+#   GMS_PDF_BACKEND=pymupdf python shards.py build 10.7
+#   python ingest_benchmark.py          # compare the installed backends
+
+import os
+import importlib.util
+
+# Backend used by the build
+PDF_BACKEND = os.environ.get("GMS_PDF_BACKEND", "pypdf2")
+
+DEFAULT_BACKEND = "pypdf2"
+
+def _pypdf2_pages(path):
+    import PyPDF2
+    with open(path, 'rb') as file:
+        reader = PyPDF2.PdfReader(file)
+        return [page.extract_text() for page in reader.pages]
+
+def _pypdf_pages(path):
+    import pypdf
+    with open(path, 'rb') as file:
+        reader = pypdf.PdfReader(file)
+        return [page.extract_text() for page in reader.pages]
+
+def _pymupdf_pages(path):
+    try:
+        import pymupdf
+    except ImportError:
+        import fitz as pymupdf
+    with pymupdf.open(path) as document:
+        return [page.get_text("text") for page in document]
+
+def _pdfminer_pages(path):
+    from pdfminer.high_level import extract_pages
+    from pdfminer.layout import LTTextContainer
+    return ["".join(element.get_text() for element in page if isinstance(element, LTTextContainer))
+            for page in extract_pages(path)]
+
+# Backend name -> (modules that provide it, page extractor)
+BACKENDS = {
+    "pypdf2": (("PyPDF2",), _pypdf2_pages),
+    "pypdf": (("pypdf",), _pypdf_pages),
+    "pymupdf": (("pymupdf", "fitz"), _pymupdf_pages),
+    "pdfminer": (("pdfminer",), _pdfminer_pages),
+}
+
+def backend_available(name):
+    """Check whether a backend is known and its package is installed"""
+    if name not in BACKENDS:
+        return False
+    return any(importlib.util.find_spec(module) is not None for module in BACKENDS[name][0])
+
+def available_backends():
+    """Installed backends, in the order of BACKENDS"""
+    return [name for name in BACKENDS if backend_available(name)]
+
+def resolve_backend(name=None):
+    """The backend to use for a requested name, falling back to the default if it is not installed"""
+    name = name or PDF_BACKEND
+    if backend_available(name):
+        return name
+    print(f"PDF backend '{name}' is not available (installed: {', '.join(available_backends())}); "
+          f"using {DEFAULT_BACKEND}")
+    return DEFAULT_BACKEND
+
+def extract_pages(path, backend=None):
+    """Text of every page of a PDF, one string per page"""
+    return BACKENDS[resolve_backend(backend)][1](path)
@@ -0,0 +1,100 @@
+# Optional query log for sizing and load testing
+#
+# Each search is written as one compact JSON line to a size-rotated file:
+#   {"t": 1747070485.8, "q": "define a pumping well", "f": "pw", "n": 3, "ms": 4.2, "r": ["MODFLOW-GridApproach-12", ...]}
+# where "f" lists the sources searched (p = PDF tutorials, w = wiki). Searches
+# filtered by tutorial family or GMS version also record "families" and
+# "versions", so a replay issues the same filtered query.
+#
+# Logging is off unless GMS_QUERY_LOG is set. Query text is scrubbed of e-mail
+# addresses, URLs, file paths and identifier-length numbers before it is written; with
+# GMS_QUERY_LOG_PRIVACY=hash only a digest and the word count are kept (such
+# records are counted but cannot be replayed).
+
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+from logging.handlers import RotatingFileHandler
+
+# Path of the query log ("" = logging disabled)
+QUERY_LOG_PATH = os.environ.get("GMS_QUERY_LOG", "")
+
+# How query text is stored: "redact" (default), "hash" or "raw"
+QUERY_LOG_PRIVACY = os.environ.get("GMS_QUERY_LOG_PRIVACY", "redact")
+
+# Rotate at 10 MB and keep five old files
+QUERY_LOG_MAX_BYTES = 10 * 1024 * 1024
+QUERY_LOG_BACKUPS = 5
+
+# Patterns replaced before a query is logged. Paths need a drive letter, a
+# leading / or ~, or a file extension, so "and/or" and "ft3/d" are kept. Numbers
+# need the length of a phone, account or ID number (seven or more digits, or a
+# grouped phone number), so versions like 10.8 and years are kept.
+REDACTIONS = [
+    (re.compile(r'[\w.+-]+@[\w-]+\.[\w.-]+'), '<email>'),
+    (re.compile(r'https?://\S+'), '<url>'),
+    (re.compile(r'\b[A-Za-z]:[\\/][^\s\\/]*(?:[\\/][^\s\\/]+)*[\\/]?'
+                r'|(?<![\w./~])~[\w.-]*[\\/][\w.-]*(?:[\\/][\w.-]+)*'
+                r'|(?<![\w./])/[\w.-]+(?:/[\w.-]+)+/?'
+                r'|\b(?:[\w-]+[\\/])*[\w-]*[A-Za-z][\w-]*\.(?:[A-Za-z][A-Za-z0-9]{1,3}|\d[A-Za-z]{2,3})\b(?!\.\w)'), '<path>'),
+    (re.compile(r'(?<![\w.])(?:\+\d{1,3}[\s.-]?)?(?:\(\d{3}\)\s?|\d{3}[\s.-])\d{3}[\s.-]\d{4}(?![\d.]\d|\d)'
+                r'|(?<![\d.])\d{7,}(?!\.?\d)'), '<number>'),
+]
+
+_logger = None
+
+def _get_logger():
+    """Create the rotating file logger on first use"""
+    global _logger
+    if _logger is None:
+        _logger = logging.getLogger("gms.query_log")
+        _logger.setLevel(logging.INFO)
+        _logger.propagate = False
+        handler = RotatingFileHandler(QUERY_LOG_PATH, maxBytes=QUERY_LOG_MAX_BYTES,
+                                      backupCount=QUERY_LOG_BACKUPS, encoding='utf-8')
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        _logger.addHandler(handler)
+    return _logger
+
+def scrub_query(query, privacy=QUERY_LOG_PRIVACY):
+    """Return the query fields to store under the given privacy mode"""
+    if privacy == "raw":
+        return {"q": query}
+    if privacy == "hash":
+        return {"qh": hashlib.sha256(query.encode('utf-8')).hexdigest()[:16], "qw": len(query.split())}
+    for pattern, replacement in REDACTIONS:
+        query = pattern.sub(replacement, query)
+    return {"q": query}
+
+def log_query(query, num_results, search_pdfs, search_wiki, latency_ms, result_ids, families=None, versions=None):
+    """Append one search to the query log (no-op unless GMS_QUERY_LOG is set)"""
+    if not QUERY_LOG_PATH:
+        return
+    record = {"t": round(time.time(), 3), **scrub_query(query),
+              "f": ("p" if search_pdfs else "") + ("w" if search_wiki else ""),
+              "n": int(num_results), "ms": round(latency_ms, 2), "r": list(result_ids)}
+    # Filters are only written when set, to keep unfiltered lines short
+    if families:
+        record["families"] = list(families)
+    if versions:
+        record["versions"] = list(versions)
+    _get_logger().info(json.dumps(record, separators=(',', ':')))
+
+def read_query_log(path=QUERY_LOG_PATH):
+    """Yield logged records oldest first, including the rotated backup files"""
+    paths = [f"{path}.{i}" for i in range(QUERY_LOG_BACKUPS, 0, -1)] + [path]
+    for log_path in paths:
+        if not os.path.exists(log_path):
+            continue
+        with open(log_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
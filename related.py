@@ -0,0 +1,175 @@
+# Precomputed "related sections" graph across the PDF and wiki corpora
+#
+# The PDF and wiki indexes have separate vocabularies, so the build fits one
+# TF-IDF space over both section lists (PDF rows first, then wiki rows). The
+# cosine similarity of every pair is the product X @ X.T; it is computed one
+# block of rows at a time on a thread pool (sparse products and argpartition
+# release the GIL), so memory stays at threads x block x rows dense scores. Each
+# block keeps only its top-k neighbours, at most one per other tutorial or wiki
+# page, so the list points at k different places to read next.
+#
+# The result is two (rows x k) arrays, neighbour ids (int32, -1 = none) and
+# scores (float16), saved as related.npz with the PDF data. Looking up the
+# related sections of a result is then a single row slice.
+#
+#   python related.py      # build for the data that is already processed
+
+import os
+import sys
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from index_versions import resolve_data_dir, derive_version, publish_version
+
+# Neighbours kept per section
+RELATED_K = int(os.environ.get("GMS_RELATED_K", "5"))
+
+# Rows multiplied per block, and blocks computed in parallel
+RELATED_BLOCK = int(os.environ.get("GMS_RELATED_BLOCK", "256"))
+RELATED_THREADS = int(os.environ.get("GMS_RELATED_THREADS", str(os.cpu_count() or 1)))
+
+# Candidates considered per section when picking neighbours from distinct tutorials/pages
+RELATED_CANDIDATES = 4
+
+RELATED_FILE = 'related.npz'
+
+def _group(section, kind):
+    """Sections of the same tutorial or wiki page are not listed as related to each other"""
+    if kind == "pdf":
+        return "pdf:" + section["tutorial"]
+    return "wiki:" + (section.get("parent_title") or section.get("title") or "")
+
+def _block_top_k(matrix, matrix_t, groups, start, stop, k):
+    """Top-k neighbours of rows start..stop, from groups other than their own and one per group"""
+    scores = (matrix[start:stop] @ matrix_t).toarray()
+    scores[groups[start:stop, None] == groups[None, :]] = 0.0
+    width = min(k * RELATED_CANDIDATES, scores.shape[1])
+    candidates = np.argpartition(-scores, width - 1, axis=1)[:, :width]
+    candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+    order = np.argsort(-candidate_scores, axis=1, kind="stable")
+    candidates = np.take_along_axis(candidates, order, axis=1)
+    candidate_scores = np.take_along_axis(candidate_scores, order, axis=1)
+
+    top = np.full((stop - start, k), -1, dtype=np.int32)
+    top_scores = np.zeros((stop - start, k), dtype=np.float16)
+    for i in range(stop - start):
+        seen = set()
+        slot = 0
+        for neighbour, score in zip(candidates[i], candidate_scores[i]):
+            if slot == k or score <= 0.0:
+                break
+            if groups[neighbour] in seen:
+                continue
+            seen.add(groups[neighbour])
+            top[i, slot], top_scores[i, slot] = neighbour, score
+            slot += 1
+    return top, top_scores
+
+class RelatedGraph:
+    """Top-k neighbour lists over the PDF rows followed by the wiki rows"""
+
+    def __init__(self, neighbours, scores, n_pdf, n_wiki):
+        self.neighbours = neighbours
+        self.scores = scores
+        self.n_pdf = int(n_pdf)
+        self.n_wiki = int(n_wiki)
+
+    @classmethod
+    def build(cls, sections, wiki_sections, k=RELATED_K, block=RELATED_BLOCK, threads=RELATED_THREADS):
+        from sklearn.feature_extraction.text import TfidfVectorizer
+
+        texts = [section["content"] for section in sections] + [section["content"] for section in wiki_sections]
+        rows = len(texts)
+        if rows < 2:
+            return cls(np.full((rows, k), -1, dtype=np.int32), np.zeros((rows, k), dtype=np.float16),
+                       len(sections), len(wiki_sections))
+
+        # Same settings as the search indexes; rows come out L2-normalized
+        vectorizer = TfidfVectorizer(stop_words='english', max_df=0.85, min_df=2, dtype=np.float32)
+        matrix = vectorizer.fit_transform(texts).tocsr()
+        matrix_t = matrix.T.tocsr()
+        labels = [_group(section, "pdf") for section in sections] + \
+                 [_group(section, "wiki") for section in wiki_sections]
+        _, groups = np.unique(labels, return_inverse=True)
+
+        neighbours = np.empty((rows, k), dtype=np.int32)
+        scores = np.empty((rows, k), dtype=np.float16)
+        starts = range(0, rows, block)
+        with ThreadPoolExecutor(max_workers=max(1, threads)) as executor:
+            blocks = executor.map(lambda start: _block_top_k(matrix, matrix_t, groups, start,
+                                                             min(start + block, rows), k), starts)
+            for start, (top, top_scores) in zip(starts, blocks):
+                neighbours[start:start + len(top)] = top
+                scores[start:start + len(top)] = top_scores
+        return cls(neighbours, scores, len(sections), len(wiki_sections))
+
+    def related(self, kind, row, limit=None):
+        """(kind, row, score) of the neighbours of one PDF or wiki row, best first"""
+        node = row if kind == "pdf" else self.n_pdf + row
+        related = []
+        for neighbour, score in zip(self.neighbours[node][:limit], self.scores[node][:limit]):
+            if neighbour < 0:
+                break
+            if neighbour < self.n_pdf:
+                related.append(("pdf", int(neighbour), float(score)))
+            else:
+                related.append(("wiki", int(neighbour) - self.n_pdf, float(score)))
+        return related
+
+    def nbytes(self):
+        return self.neighbours.nbytes + self.scores.nbytes
+
+    def save(self, path):
+        np.savez(path, neighbours=self.neighbours, scores=self.scores, n_pdf=self.n_pdf, n_wiki=self.n_wiki)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as state:
+            return cls(state['neighbours'], state['scores'], int(state['n_pdf']), int(state['n_wiki']))
+
+def _load_sections(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def build_related(data_dir, wiki_data_dir):
+    """Build the graph from the saved PDF and wiki sections and save it with the PDF data"""
+    sections = _load_sections(os.path.join(data_dir, 'section_data.json'))
+    wiki_sections = _load_sections(os.path.join(wiki_data_dir, 'wiki_sections.json')) if wiki_data_dir else []
+    graph = RelatedGraph.build(sections, wiki_sections)
+    graph.save(os.path.join(data_dir, RELATED_FILE))
+    return graph
+
+def load_related(data_dir, n_pdf, n_wiki=None):
+    """Load the graph, or None if missing or built for other section lists
+
+    n_wiki=None skips the wiki check, for states that hold the PDF data only.
+    """
+    path = os.path.join(data_dir, RELATED_FILE)
+    if not os.path.exists(path):
+        return None
+    graph = RelatedGraph.load(path)
+    if graph.n_pdf != n_pdf or (n_wiki is not None and graph.n_wiki != n_wiki):
+        print(f"Ignoring {path}: built for {graph.n_pdf} PDF and {graph.n_wiki} wiki sections")
+        return None
+    return graph
+
+def main():
+    # Usage: python related.py [processed_data] [wiki_data]
+    base_dir = sys.argv[1] if len(sys.argv) > 1 else "processed_data"
+    wiki_data_dir = resolve_data_dir(sys.argv[2] if len(sys.argv) > 2 else "wiki_data")
+    # Built into a copy of the published version, which is then published itself
+    data_dir = derive_version(base_dir)
+    start = time.perf_counter()
+    graph = build_related(data_dir, wiki_data_dir)
+    elapsed = time.perf_counter() - start
+    linked = int((graph.neighbours[:, 0] >= 0).sum()) if graph.neighbours.size else 0
+    print(f"{os.path.join(data_dir, RELATED_FILE)}: {graph.n_pdf} PDF + {graph.n_wiki} wiki sections, "
+          f"{linked} with related sections, {graph.nbytes() / 1024:.0f} KB, "
+          f"{elapsed:.1f} s on {RELATED_THREADS} threads")
+    publish_version(base_dir, data_dir)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+# Replay logged queries against the search core for load testing
+#
+# Reads the query log written by query_log.py and issues the queries at a fixed
+# arrival rate from a pool of client threads, either in-process or through
+# SearchWorkerPool. Latency is measured from each query's scheduled start, so
+# time spent queueing behind slow requests counts against the tail. Logged family
+# and version filters are replayed too; a log with version filters is replayed
+# against the version shards in-process, since the worker pool has no shards.
+#
+#   python replay_queries.py queries.log --rate 50 --concurrency 8 --workers 4
+
+import sys
+import time
+import argparse
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from query_log import read_query_log
+from search_core import SearchState, load_search_data, get_response
+from search_workers import SearchWorkerPool
+from shards import ShardedSearch
+
+def load_replay_queries(paths, limit=None):
+    """Replayable (query, num_results, search_pdfs, search_wiki, families, versions) tuples from the logs"""
+    queries = []
+    skipped = 0
+    for path in paths:
+        for record in read_query_log(path):
+            if "q" not in record:
+                # Hashed records keep no query text
+                skipped += 1
+                continue
+            sources = record.get("f", "pw")
+            queries.append((record["q"], record.get("n", 3), "p" in sources, "w" in sources,
+                            record.get("families"), record.get("versions")))
+    if limit:
+        queries = queries[:limit]
+    return queries, skipped
+
+def replay(search, queries, rate=0.0, concurrency=4, repeat=1):
+    """Issue the queries at `rate` per second (0 = as fast as possible) and collect latencies"""
+    schedule = [q for _ in range(repeat) for q in queries]
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+    start = time.perf_counter()
+
+    def issue(i, item):
+        nonlocal errors
+        scheduled = start + i / rate if rate > 0 else time.perf_counter()
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        query, num_results, search_pdfs, search_wiki, families, versions = item
+        # Only the sharded search takes versions
+        filters = {"versions": versions} if versions else {}
+        try:
+            search(query, num_results=num_results, search_pdfs=search_pdfs, search_wiki=search_wiki,
+                   families=families, **filters)
+        except Exception:
+            with lock:
+                errors += 1
+            return
+        elapsed = time.perf_counter() - scheduled
+        with lock:
+            latencies.append(elapsed)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as clients:
+        for i, item in enumerate(schedule):
+            clients.submit(issue, i, item)
+    total = time.perf_counter() - start
+
+    latencies = np.array(latencies) * 1000 if latencies else np.zeros(1)
+    return {
+        "sent": len(schedule),
+        "errors": errors,
+        "seconds": total,
+        "throughput_qps": len(schedule) / total if total > 0 else 0.0,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p90_ms": float(np.percentile(latencies, 90)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "p999_ms": float(np.percentile(latencies, 99.9)),
+        "max_ms": float(latencies.max()),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay logged GMS assistant queries")
+    parser.add_argument("logs", nargs="+", help="query log file(s) written with GMS_QUERY_LOG")
+    parser.add_argument("--rate", type=float, default=0.0, help="target queries per second (0 = unthrottled)")
+    parser.add_argument("--concurrency", type=int, default=4, help="number of client threads")
+    parser.add_argument("--workers", type=int, default=0, help="search worker processes (0 = in-process)")
+    parser.add_argument("--repeat", type=int, default=1, help="replay the log this many times")
+    parser.add_argument("--limit", type=int, default=None, help="only replay the first N queries")
+    args = parser.parse_args()
+
+    queries, skipped = load_replay_queries(args.logs, args.limit)
+    if not queries:
+        print(f"No replayable queries found ({skipped} hashed records skipped)")
+        sys.exit(1)
+
+    pool = None
+    mode = f'{args.workers} workers' if args.workers else 'in-process'
+    if any(versions for *_, versions in queries):
+        if args.workers > 0:
+            print("The log has version filters; replaying against the version shards in-process")
+        pool = ShardedSearch()
+        search = pool.get_response
+        mode = 'version shards'
+    elif args.workers > 0:
+        pool = SearchWorkerPool(args.workers)
+        search = pool.get_response
+    else:
+        state = SearchState()
+        load_search_data(state)
+        search = lambda query, **kwargs: get_response(state, query, **kwargs)
+
+    try:
+        result = replay(search, queries, rate=args.rate, concurrency=args.concurrency, repeat=args.repeat)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    print(f"Replayed {result['sent']} queries ({skipped} hashed records skipped, {result['errors']} errors) "
+          f"in {result['seconds']:.1f}s")
+    print(f"Throughput: {result['throughput_qps']:.1f} queries/s "
+          f"(target {'unthrottled' if args.rate <= 0 else f'{args.rate:.1f}/s'}, "
+          f"{args.concurrency} clients, {mode})")
+    print(f"Latency ms: p50 {result['p50_ms']:.1f}  p90 {result['p90_ms']:.1f}  "
+          f"p99 {result['p99_ms']:.1f}  p99.9 {result['p999_ms']:.1f}  max {result['max_ms']:.1f}")
+
+if __name__ == "__main__":
+    main()
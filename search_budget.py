@@ -0,0 +1,224 @@
+# Per-request time budget for the search core
+#
+# A pasted error log or tutorial paragraph turns into a query vector with
+# hundreds of terms. Scoring it against the CSR matrix touches every posting of
+# every term, and the tutorial fallback scans all texts once per keyword. With a
+# budget (GMS_SEARCH_BUDGET_MS, on by default) a request is bounded instead:
+#   - queries are capped to their MAX_QUERY_TERMS most selective terms (highest
+#     TF-IDF weight in the query: rare terms, and terms the text repeats), and
+#     the pasted text to MAX_QUERY_CHARS characters
+#   - scoring runs term at a time over a term-major copy of the index, rarest
+#     term first. The copy is exported at build time next to the memory-mapped
+#     matrix, so every process maps the same pages. After each term the weight
+#     the remaining terms can still add to any section is bounded by
+#     sum(query weight x largest weight in the term's postings). Once no section
+#     outside the top k can overtake one inside it, and the top k can no longer
+#     reorder, the remaining (common, low-weight) terms are only added to the
+#     top k rows, so the returned scores are exact and shards can merge on them.
+#     Their postings are still marked as matches when facet counts are needed
+#   - when the deadline passes, scoring stops after the current term, the
+#     semantic fusion and the rest of the tutorial fallback are skipped, and
+#     the response is flagged as partial
+# The first term is always scored, so a late request still returns something.
+#
+#   GMS_SEARCH_BUDGET_MS=0 streamlit run app.py      # no budget (full scoring)
+
+import os
+import time
+import numpy as np
+import scipy.sparse as sp
+from compressed_index import CompressedPostings
+from metrics import metrics
+
+# Time allowed per request in milliseconds (0 = no budget, no early termination)
+SEARCH_BUDGET_MS = float(os.environ.get("GMS_SEARCH_BUDGET_MS", "250"))
+
+# Terms kept from a long query, and characters kept from a pasted one
+MAX_QUERY_TERMS = int(os.environ.get("GMS_MAX_QUERY_TERMS", "64"))
+MAX_QUERY_CHARS = int(os.environ.get("GMS_MAX_QUERY_CHARS", "4000"))
+
+class SearchBudget:
+    """Deadline of one request, and whether any stage was cut short by it"""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.deadline = time.perf_counter() + seconds
+        self.partial = False
+        self.cut_stages = []
+
+    def expired(self):
+        return time.perf_counter() >= self.deadline
+
+    def cut(self, stage):
+        """Record that a stage stopped early because the deadline passed"""
+        self.partial = True
+        self.cut_stages.append(stage)
+        metrics.inc("gms_budget_cuts_total", stage=stage)
+
+def start_budget(budget_ms=SEARCH_BUDGET_MS):
+    """Budget for a request starting now, or None when budgets are off"""
+    return SearchBudget(budget_ms / 1000.0) if budget_ms > 0 else None
+
+class TermIndex:
+    """Term-major view of a document matrix with each term's document frequency and largest weight
+
+    terms is a (terms x documents) CSR matrix, whose row t is the posting list of
+    term t, or None when postings (compressed postings) stand in for it.
+    """
+
+    def __init__(self, n_docs, doc_freq, max_weight, terms=None, postings=None):
+        self.n_docs = n_docs
+        self.doc_freq = doc_freq
+        self.max_weight = max_weight
+        self.terms = terms
+        self.postings = postings
+
+    @classmethod
+    def from_matrix(cls, matrix):
+        """Term index built in memory from a loaded document matrix"""
+        n_terms = matrix.shape[1]
+        doc_freq = np.zeros(n_terms, dtype=np.int32)
+        max_weight = np.zeros(n_terms, dtype=np.float32)
+        if isinstance(matrix, CompressedPostings):
+            # Already term-major; posting lists are decoded per query term
+            counts = np.diff(matrix.posting_offsets)
+            weights = matrix.weights.astype(np.float32)
+            if len(matrix.term_ids):
+                largest = np.maximum.reduceat(weights, matrix.posting_offsets[:-1])
+                max_weight[matrix.term_ids] = largest * (matrix.scales if matrix.scales is not None else 1.0)
+            doc_freq[matrix.term_ids] = counts
+            return cls(matrix.shape[0], doc_freq, max_weight, postings=matrix)
+        terms = sp.csr_matrix(sp.csr_matrix(matrix).T)
+        # Sorted doc ids let budgeted_scores look rows up by binary search
+        terms.sort_indices()
+        doc_freq[:] = np.diff(terms.indptr)
+        nonempty = np.flatnonzero(doc_freq)
+        if len(nonempty):
+            max_weight[nonempty] = np.maximum.reduceat(terms.data, terms.indptr[nonempty])
+        return cls(matrix.shape[0], doc_freq, max_weight, terms=terms)
+
+    def postings_of(self, term):
+        """Doc ids and weights of one term"""
+        if self.postings is not None:
+            return self.postings.postings_of(term)
+        start, stop = self.terms.indptr[term], self.terms.indptr[term + 1]
+        return self.terms.indices[start:stop], self.terms.data[start:stop]
+
+def cap_query_terms(query_vector, term_index, max_terms=MAX_QUERY_TERMS):
+    """Keep the max_terms highest-weighted terms of a query row, renormalized; returns the row and the terms dropped"""
+    query_vector = sp.csr_matrix(query_vector)
+    if query_vector.nnz <= max_terms:
+        return query_vector, 0
+    terms, weights = query_vector.indices, query_vector.data
+    # The weight is tf x idf, so this prefers rare terms; on pasted tutorial text it
+    # keeps more of the full ranking than keeping the rarest terms outright
+    keep = np.argsort(-weights, kind="stable")[:max_terms]
+    weights = weights[keep] / np.linalg.norm(weights[keep])
+    capped = sp.csr_matrix((weights, terms[keep], [0, len(keep)]), shape=query_vector.shape)
+    return capped, query_vector.nnz - max_terms
+
+def _settled(scores, top_k, remaining):
+    """Whether adding at most `remaining` to any score can no longer change the top k or its order"""
+    if remaining <= 0.0:
+        return True
+    if len(scores) <= top_k:
+        return False
+    top = np.partition(scores, len(scores) - top_k - 1)[-(top_k + 1):]
+    top.sort()
+    # Every gap in the top k + 1, including the one to the first section outside it, exceeds the bound
+    return top[-1] > 0.0 and np.diff(top).min() > remaining
+
+def _top_rows(ranked, top_k, mask=None):
+    """Rows of the top_k scores (among the rows in mask)"""
+    if mask is not None:
+        ranked = np.where(mask, ranked, 0.0)
+    if len(ranked) <= top_k:
+        return np.arange(len(ranked))
+    return np.argpartition(ranked, len(ranked) - top_k)[-top_k:]
+
+def _finish_rows(scores, rows, terms, weights, term_index):
+    """Add the weight of unscored terms to the given rows only, so their scores are exact"""
+    rows = np.sort(rows)
+    for term, weight in zip(terms, weights):
+        doc_ids, doc_weights = term_index.postings_of(term)
+        if not len(doc_ids):
+            continue
+        # Posting lists are sorted by doc id, so each row is one binary search
+        positions = np.minimum(np.searchsorted(doc_ids, rows), len(doc_ids) - 1)
+        found = doc_ids[positions] == rows
+        scores[rows[found]] += weight * doc_weights[positions[found]]
+
+def budgeted_scores(query_vector, term_index, top_k, budget=None, boost=None, mask=None, stage="score",
+                    count_matches=False):
+    """Term-at-a-time scores of one query row, rarest term first
+
+    Scoring stops once the top_k (among the rows in mask, after boost) is settled,
+    or, with a budget, when its deadline passes. The terms not scored then are
+    added to the top_k rows alone, so the scores of the results are the full
+    ones (multiplied by boost like the full scores would be) and can be compared
+    with scores from other shards. Returns the scores and the rows matching any
+    query term. The matches are None when they are the rows scored above 0: when
+    every term was scored, when count_matches is off, or when the deadline cut
+    the scoring (the request is partial then).
+    """
+    query_vector = sp.csr_matrix(query_vector)
+    terms, weights = query_vector.indices, query_vector.data
+    order = np.argsort(term_index.doc_freq[terms], kind="stable")
+    terms, weights = terms[order], weights[order]
+    # What the terms after each one can still add to any section
+    largest_boost = float(boost.max()) if boost is not None and len(boost) else 1.0
+    bounds = weights * term_index.max_weight[terms] * largest_boost
+    remaining = np.concatenate((np.cumsum(bounds[::-1])[::-1][1:], [0.0]))
+
+    scores = np.zeros(term_index.n_docs, dtype=np.float64)
+    best = 0.0
+    scored = len(terms)
+    settled = False
+    for position, (term, weight) in enumerate(zip(terms, weights)):
+        if position > 0 and budget is not None and budget.expired():
+            budget.cut(stage)
+            scored = position
+            break
+        doc_ids, doc_weights = term_index.postings_of(term)
+        if not len(doc_ids):
+            continue
+        # Doc ids are unique within a posting list, so fancy-index add is exact
+        scores[doc_ids] += weight * doc_weights
+        best = max(best, scores[doc_ids].max() * largest_boost)
+        # k gaps larger than the bound need a top score above k times the bound; the
+        # full check (a partition over all rows) only runs once that is possible
+        if remaining[position] > 0.0 and best > top_k * remaining[position]:
+            ranked = scores if boost is None else scores * boost
+            if _settled(ranked if mask is None else np.where(mask, ranked, 0.0), top_k, remaining[position]):
+                scored = position + 1
+                settled = scored < len(terms)
+                if settled:
+                    metrics.inc("gms_early_terminations_total", stage=stage)
+                break
+
+    matches = None
+    if scored < len(terms):
+        if settled and count_matches:
+            # The skipped terms can't change the top k, but their rows still match
+            matches = scores > 0.0
+            for term in terms[scored:]:
+                matches[term_index.postings_of(term)[0]] = True
+        ranked = scores if boost is None else scores * boost
+        _finish_rows(scores, _top_rows(ranked, top_k, mask), terms[scored:], weights[scored:], term_index)
+    return (scores if boost is None else scores * boost), matches
+
+def select_keywords(keywords, vectorizer, term_index, max_terms=MAX_QUERY_TERMS):
+    """Distinct fallback keywords, capped to the max_terms rarest in the index"""
+    keywords = list(dict.fromkeys(keywords))
+    if len(keywords) <= max_terms or term_index is None:
+        return keywords[:max_terms]
+    if hasattr(vectorizer, "vocabulary_"):
+        columns = [vectorizer.vocabulary_.get(keyword, -1) for keyword in keywords]
+    elif hasattr(vectorizer, "bucket_of"):
+        columns = vectorizer.bucket_of(keywords)
+    else:
+        return keywords[:max_terms]
+    # Words the index does not know (stop words, pruned terms) sort last
+    doc_freq = [term_index.doc_freq[column] if column >= 0 else term_index.n_docs for column in columns]
+    order = np.argsort(doc_freq, kind="stable")[:max_terms]
+    return [keywords[i] for i in sorted(order)]
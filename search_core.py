@@ -0,0 +1,776 @@
+# Search core shared by the Streamlit app and the search worker processes
+#
+# Everything here works on a plain "state" object holding the loaded indexes.
+# The app passes st.session_state; worker processes pass a SearchState loaded
+# with memory-mapped matrices so that N workers share one copy in the page cache.
+
+import os
+import pickle
+import numpy as np
+import scipy.sparse as sp
+from hashing_index import index_mode, load_hashed_index
+from semantic_index import (load_embedding_model, semantic_index_exists, SemanticIndex,
+                            embed_texts, fuse_rankings)
+from metrics import metrics, COUNT_BUCKETS
+from autocomplete import AutocompleteIndex, AUTOCOMPLETE_FILE
+from spelling import SpellingIndex, SPELLING_FILE
+from section_store import (SECTION_STORE, WIKI_STORE, TUTORIAL_STORE, load_column_store,
+                           tutorial_rows, keyword_counts)
+from facets import FACET_NAMES, FacetIndex, facets_path, family_of, load_facets, section_labels
+from index_versions import resolve_data_dir
+from related import load_related
+from link_rank import load_link_rank
+from compressed_index import (COMPRESSED_INDEX, CompressedPostings, compressed_index_exists,
+                              load_compressed_index)
+from search_budget import (SEARCH_BUDGET_MS, MAX_QUERY_CHARS, TermIndex, start_budget, cap_query_terms,
+                           budgeted_scores, select_keywords)
+
+# Data directories
+DATA_DIR = "processed_data"
+PDFS_DIR = "pdfs"
+WIKI_DATA_DIR = "wiki_data"
+
+# GMS version of the unsharded corpus in PDFS_DIR / DATA_DIR
+DEFAULT_VERSION = "10.8"
+
+# Related sections listed under each result
+RELATED_SHOWN = 3
+
+# Attributes of a loaded search state and their empty values
+STATE_DEFAULTS = {
+    "tutorial_data": list,
+    "section_data": list,
+    "tfidf_vectorizer": lambda: None,
+    "tfidf_matrix": lambda: None,
+    "term_index": lambda: None,
+    "loading_timestamp": lambda: None,
+    "data_dir": lambda: None,
+    "wiki_data_dir": lambda: None,
+    "wiki_sections": list,
+    "wiki_vectorizer": lambda: None,
+    "wiki_tfidf_matrix": lambda: None,
+    "wiki_term_index": lambda: None,
+    "embedding_model": lambda: None,
+    "semantic_index": lambda: None,
+    "wiki_semantic_index": lambda: None,
+    "autocomplete": lambda: None,
+    "spelling": lambda: None,
+    "facets": lambda: None,
+    "wiki_facets": lambda: None,
+    "wiki_link_boost": lambda: None,
+    "related": lambda: None,
+}
+
+class SearchState:
+    """Loaded indexes for use outside Streamlit (same attributes as st.session_state)"""
+
+    def __init__(self):
+        for name, default in STATE_DEFAULTS.items():
+            setattr(self, name, default())
+
+# Function to save a CSR matrix as separate .npy arrays for memory mapping
+def export_mmap_matrix(matrix, directory, name):
+    """Write the CSR arrays of a matrix to <name>_{data,indices,indptr,shape}.npy"""
+    matrix = sp.csr_matrix(matrix)
+    parts = {
+        "data": matrix.data,
+        "indices": matrix.indices.astype(np.int32),
+        "indptr": matrix.indptr.astype(np.int64),
+        "shape": np.array(matrix.shape, dtype=np.int64)
+    }
+    for part, array in parts.items():
+        # Write then rename, so workers that still map the old file keep a valid copy
+        path = os.path.join(directory, f'{name}_{part}.npy')
+        with open(path + '.tmp', 'wb') as f:
+            np.save(f, array)
+        os.replace(path + '.tmp', path)
+
+# Function to load a CSR matrix from memory-mapped .npy arrays
+def load_mmap_matrix(directory, name):
+    """Open a matrix written by export_mmap_matrix without copying it into memory"""
+    arrays = {part: np.load(os.path.join(directory, f'{name}_{part}.npy'), mmap_mode='r')
+              for part in ("data", "indices", "indptr")}
+    shape = tuple(np.load(os.path.join(directory, f'{name}_shape.npy')))
+    matrix = sp.csr_matrix(shape, dtype=arrays["data"].dtype)
+    # Assign the arrays directly; the constructor would copy read-only memmaps
+    matrix.data, matrix.indices, matrix.indptr = arrays["data"], arrays["indices"], arrays["indptr"]
+    return matrix
+
+def mmap_matrix_exists(directory, name):
+    """Check whether a memory-mappable copy of the matrix has been exported"""
+    return os.path.exists(os.path.join(directory, f'{name}_shape.npy'))
+
+# Function to load a vectorizer and its document matrix
+def load_index_files(directory, prefix, use_mmap=False):
+    """Load the vectorizer and TF-IDF matrix for one corpus
+
+    With GMS_COMPRESSED_INDEX=1 the matrix is replaced by its compressed postings
+    when they have been built.
+    """
+    if index_mode(directory, prefix) == "hashing":
+        # The hashing index stands in for the vectorizer (same transform() API)
+        vectorizer, matrix = load_hashed_index(directory, prefix)
+    else:
+        # Load vectorizer
+        with open(os.path.join(directory, f'{prefix}vectorizer.pkl' if prefix else 'tfidf_vectorizer.pkl'), 'rb') as f:
+            vectorizer = pickle.load(f)
+        matrix = None
+    
+    matrix_name = f'{prefix}tfidf_matrix'
+    if COMPRESSED_INDEX and compressed_index_exists(directory, prefix):
+        matrix = load_compressed_index(directory, prefix)
+    elif use_mmap and mmap_matrix_exists(directory, matrix_name):
+        matrix = load_mmap_matrix(directory, matrix_name)
+    elif matrix is None:
+        # Load TF-IDF matrix
+        with open(os.path.join(directory, f'{matrix_name}.pkl'), 'rb') as f:
+            matrix = pickle.load(f)
+    
+    return vectorizer, matrix
+
+# Function to load preprocessed data
+def load_search_data(state, use_mmap=False, data_dir=DATA_DIR, wiki_data_dir=WIKI_DATA_DIR):
+    """Load the preprocessed PDF data, plus wiki and semantic data when available
+
+    A version shard passes its own data_dir and wiki_data_dir=None (the wiki is
+    searched as a separate shard). Directories with published versions are
+    resolved to the current version; state.data_dir records which was loaded.
+    """
+    data_dir = resolve_data_dir(data_dir)
+    state.data_dir = data_dir
+    
+    # Tutorial and section records are kept as columnar stores derived from the JSON files
+    state.tutorial_data = load_column_store(os.path.join(data_dir, 'tutorial_data.json'), data_dir,
+                                            TUTORIAL_STORE, tutorial_rows)
+    state.section_data = load_column_store(os.path.join(data_dir, 'section_data.json'), data_dir,
+                                           SECTION_STORE)
+    
+    state.tfidf_vectorizer, state.tfidf_matrix = load_index_files(data_dir, '', use_mmap)
+    state.term_index = load_term_index(state.tfidf_matrix, data_dir, 'tfidf_matrix')
+    state.facets = load_section_facets(state.section_data, os.path.join(data_dir, 'section_data.json'), data_dir)
+    
+    # Load timestamp
+    with open(os.path.join(data_dir, 'processed_timestamp.txt'), 'r') as f:
+        state.loading_timestamp = float(f.read().strip())
+    
+    # Semantic search is optional and only used when both model and index are present
+    load_semantic_data(state, data_dir, wiki_data_dir)
+    
+    # Typeahead suggestions are optional too
+    if os.path.exists(os.path.join(data_dir, AUTOCOMPLETE_FILE)):
+        state.autocomplete = AutocompleteIndex.load(data_dir)
+    if os.path.exists(os.path.join(data_dir, SPELLING_FILE)):
+        state.spelling = SpellingIndex.load(data_dir)
+    
+    # Try to load wiki data if it exists
+    if wiki_data_dir is not None:
+        try:
+            load_wiki_data(state, use_mmap, wiki_data_dir)
+        except Exception as e:
+            print(f"Wiki data not loaded: {e}")
+    
+    # Related-sections graph; its wiki rows are only checked when the wiki is loaded here
+    state.related = load_related(data_dir, len(state.section_data),
+                                 len(state.wiki_sections) if wiki_data_dir is not None else None)
+    
+    return True
+
+# Function to export memory-mappable copies of the loaded matrices
+def export_search_matrices(state):
+    """Write the loaded PDF and wiki matrices, and their term-major copies, as .npy arrays for the worker processes"""
+    # Compressed postings are small and loaded by each worker directly
+    if state.tfidf_matrix is not None and not isinstance(state.tfidf_matrix, CompressedPostings):
+        export_mmap_matrix(state.tfidf_matrix, state.data_dir, 'tfidf_matrix')
+        export_term_index(state.tfidf_matrix, state.data_dir, 'tfidf_matrix')
+    if state.wiki_tfidf_matrix is not None and not isinstance(state.wiki_tfidf_matrix, CompressedPostings):
+        export_mmap_matrix(state.wiki_tfidf_matrix, state.wiki_data_dir, 'wiki_tfidf_matrix')
+        export_term_index(state.wiki_tfidf_matrix, state.wiki_data_dir, 'wiki_tfidf_matrix')
+
+# Function to export the term-major copy of a matrix used by budgeted searches
+def export_term_index(matrix, directory, name):
+    """Write a matrix's term index as <name>_terms_*.npy arrays (the transpose, plus doc_freq and max_weight)"""
+    term_index = TermIndex.from_matrix(matrix)
+    export_mmap_matrix(term_index.terms, directory, f'{name}_terms')
+    for part in ("doc_freq", "max_weight"):
+        path = os.path.join(directory, f'{name}_terms_{part}.npy')
+        with open(path + '.tmp', 'wb') as f:
+            np.save(f, getattr(term_index, part))
+        os.replace(path + '.tmp', path)
+
+# Function to load the optional semantic search model and indexes
+def load_semantic_data(state, data_dir=DATA_DIR, wiki_data_dir=WIKI_DATA_DIR):
+    """Load the local embedding model and any embedding indexes that have been built"""
+    pdf_index = data_dir is not None and semantic_index_exists(data_dir)
+    wiki_index = wiki_data_dir is not None and semantic_index_exists(wiki_data_dir, 'wiki_')
+    if not (pdf_index or wiki_index):
+        return False
+    
+    if state.embedding_model is None:
+        state.embedding_model = load_embedding_model()
+    if state.embedding_model is None:
+        return False
+    
+    if pdf_index:
+        state.semantic_index = SemanticIndex(data_dir)
+    if wiki_index:
+        state.wiki_semantic_index = SemanticIndex(wiki_data_dir, 'wiki_')
+    
+    return True
+
+# Function to prepare the term-major index used by budgeted searches
+def load_term_index(matrix, directory, name):
+    """Term-major view of a loaded matrix, or None when searches have no time budget
+
+    The copy exported when the version was published is memory-mapped, so the
+    processes share it. Data without one (compressed postings, or an unpublished
+    directory) gets a term index built in memory.
+    """
+    if matrix is None or SEARCH_BUDGET_MS <= 0:
+        return None
+    terms_name = f'{name}_terms'
+    if not isinstance(matrix, CompressedPostings) and mmap_matrix_exists(directory, terms_name):
+        terms = load_mmap_matrix(directory, terms_name)
+        # An export left from another matrix would score the wrong postings
+        if terms.shape == matrix.shape[::-1] and terms.nnz == matrix.nnz:
+            return TermIndex(matrix.shape[0],
+                             np.load(os.path.join(directory, f'{terms_name}_doc_freq.npy'), mmap_mode='r'),
+                             np.load(os.path.join(directory, f'{terms_name}_max_weight.npy'), mmap_mode='r'),
+                             terms=terms)
+    return TermIndex.from_matrix(matrix)
+
+# Function to load wiki data
+def load_wiki_data(state, use_mmap=False, wiki_data_dir=WIKI_DATA_DIR):
+    """Load wiki data for searching"""
+    wiki_data_dir = resolve_data_dir(wiki_data_dir)
+    state.wiki_data_dir = wiki_data_dir
+    
+    # Check if wiki data exists
+    if not os.path.exists(wiki_data_dir):
+        return False
+    
+    # Load wiki sections
+    state.wiki_sections = load_column_store(os.path.join(wiki_data_dir, 'wiki_sections.json'), wiki_data_dir,
+                                            WIKI_STORE)
+    
+    state.wiki_vectorizer, state.wiki_tfidf_matrix = load_index_files(wiki_data_dir, 'wiki_', use_mmap)
+    state.wiki_term_index = load_term_index(state.wiki_tfidf_matrix, wiki_data_dir, 'wiki_tfidf_matrix')
+    state.wiki_facets = load_section_facets(state.wiki_sections, os.path.join(wiki_data_dir, 'wiki_sections.json'),
+                                            wiki_data_dir, 'wiki_')
+    state.wiki_link_boost = load_link_rank(wiki_data_dir, len(state.wiki_sections))
+    
+    return True
+
+# Function to swap a loaded state to newly published index versions
+def refresh_search_state(state, use_mmap=False):
+    """Load the current versions if they differ from the loaded ones; call between requests
+
+    The new indexes are loaded into a separate state and then swapped in
+    attribute by attribute, so the old ones are released as soon as the swap is
+    done and a failed load leaves the loaded indexes in place.
+    """
+    if (resolve_data_dir(DATA_DIR) == state.data_dir and
+            resolve_data_dir(WIKI_DATA_DIR) == state.wiki_data_dir):
+        return False
+    
+    fresh = SearchState()
+    # The embedding model does not change with the data
+    fresh.embedding_model = state.embedding_model
+    try:
+        with metrics.span("index_swap"):
+            load_search_data(fresh, use_mmap)
+    except Exception as e:
+        print(f"Keeping the loaded index, the new version did not load: {e}")
+        return False
+    for name in STATE_DEFAULTS:
+        setattr(state, name, getattr(fresh, name))
+    metrics.inc("gms_index_swaps_total")
+    return True
+
+# Function to load the tutorial-family bitsets of an index
+def load_section_facets(sections, json_path, directory, prefix=''):
+    """Load the family bitsets saved by the build, recomputing them in memory if they are older than the sections"""
+    path = facets_path(directory, prefix)
+    if os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(json_path):
+        facets = load_facets(directory, len(sections), prefix)
+        if facets is not None:
+            return facets
+    # Servers never write into a data directory; the build saves the bitsets
+    return FacetIndex.from_labels([section_labels(section) for section in sections])
+
+# Function to get the row mask of a family filter
+def _family_mask(facets, families):
+    return facets.mask(families) if facets is not None else None
+
+# Function to check whether there is time left to embed the query
+def _semantic_in_budget(budget):
+    """False (and the request marked partial) once the deadline has passed"""
+    if budget is not None and budget.expired():
+        budget.cut("semantic")
+        return False
+    return True
+
+# Function to apply a family filter to a score array
+def apply_facets(facets, scores, families=None, facet_counts=None, matches=None):
+    """Add the per-family match counts, then zero the scores of rows outside the selected families
+
+    matches are the rows that match the query when they are not just the rows
+    scored above 0 (a search that stopped scoring early).
+    """
+    if facets is None:
+        return scores, None
+    if facet_counts is not None:
+        for name, count in facets.counts(scores > 0.0 if matches is None else matches).items():
+            facet_counts[name] = facet_counts.get(name, 0) + count
+    mask = facets.mask(families)
+    if mask is not None:
+        scores = np.where(mask, scores, 0.0)
+    return scores, mask
+
+# Function to score a query against a document matrix
+def cosine_scores(query_vector, matrix):
+    """Cosine similarity of one query with every row of an L2-normalized matrix
+
+    Document rows and query vectors are already L2-normalized by the vectorizers,
+    so this is a sparse dot product. Unlike sklearn's cosine_similarity it does not
+    renormalize (and so copy) the whole document matrix on every query.
+    """
+    if isinstance(matrix, CompressedPostings):
+        return matrix.score(query_vector)
+    return np.asarray((matrix @ query_vector.T).todense()).ravel()
+
+# Function to score a query, within the request's time budget when it has one
+def score_query(query_vector, matrix, term_index, top_k, budget=None, boost=None, mask=None, stage="score",
+                count_matches=False):
+    """Scores of one query row and its matching rows (None = the rows scored above 0)
+
+    Budgeted requests score term at a time and may stop early; count_matches
+    asks for the full set of matching rows even then, for the facet counts.
+    """
+    if budget is None or term_index is None:
+        scores = cosine_scores(query_vector, matrix)
+        return (scores if boost is None else scores * boost), None
+    query_vector, dropped = cap_query_terms(query_vector, term_index)
+    if dropped:
+        metrics.inc("gms_query_terms_dropped_total", dropped, stage=stage)
+    return budgeted_scores(query_vector, term_index, top_k, budget, boost, mask, stage, count_matches)
+
+# Function to fuse lexical scores with the semantic index ranking
+def fuse_semantic_results(state, query, similarity_scores, semantic_index, sections, top_n, result_type,
+                          mask=None):
+    """Combine the TF-IDF ranking with the embedding ranking using reciprocal rank fusion"""
+    lexical_indices = [idx for idx in similarity_scores.argsort()[:-top_n*2-1:-1] if similarity_scores[idx] > 0.0]
+    
+    query_vector = embed_texts(state.embedding_model, [query])[0]
+    if mask is None:
+        semantic_indices, _ = semantic_index.search(query_vector, top_n=top_n*2)
+    else:
+        # Over-fetch, then keep the hits inside the selected families
+        semantic_indices, _ = semantic_index.search(query_vector, top_n=top_n*8)
+        semantic_indices = [idx for idx in semantic_indices if mask[idx]][:top_n*2]
+    
+    return [{
+        "section": sections[idx],
+        "score": score,
+        "type": result_type,
+        "row": int(idx)
+    } for idx, score in fuse_rankings(lexical_indices, semantic_indices, top_n=top_n)]
+
+# Function to search for relevant content
+def search_content(state, query, top_n=5, families=None, facet_counts=None, budget=None):
+    """Search for relevant content using the TF-IDF matrix
+
+    families limits the results to those tutorial families; facet_counts, if
+    given, is a dict that receives the number of matching sections per family.
+    budget (a SearchBudget) bounds the time spent and records when it cut the search short.
+    """
+    # Proper check for vectorizer and matrix existence
+    if (state.tfidf_vectorizer is None) or (state.tfidf_matrix is None):
+        return []
+    
+    try:
+        with metrics.span("search_pdf"):
+            return _search_pdf(state, query, top_n, families, facet_counts, budget)
+    except Exception as e:
+        # Errors are counted by the span; report them instead of failing silently
+        print(f"Error searching PDFs: {e}")
+        return []
+
+def _search_pdf(state, query, top_n, families=None, facet_counts=None, budget=None):
+    # Transform the query using the vectorizer
+    query_vector = state.tfidf_vectorizer.transform([query])
+    
+    # Calculate similarity scores (the fused ranking reads twice as many lexical hits)
+    top_k = top_n * 2 if state.semantic_index is not None else top_n
+    similarity_scores, matches = score_query(query_vector, state.tfidf_matrix, state.term_index, top_k, budget,
+                                             mask=_family_mask(state.facets, families), stage="search_pdf",
+                                             count_matches=facet_counts is not None and state.facets is not None)
+    
+    # Filter by family before the top-k, so a narrow filter still fills the page
+    similarity_scores, mask = apply_facets(state.facets, similarity_scores, families, facet_counts, matches)
+    
+    if state.semantic_index is not None and _semantic_in_budget(budget):
+        return fuse_semantic_results(state, query, similarity_scores, state.semantic_index,
+                                     state.section_data, top_n, "pdf", mask)
+    
+    # Get the top N most relevant sections
+    top_indices = similarity_scores.argsort()[:-top_n-1:-1]
+    
+    results = []
+    for idx in top_indices:
+        if similarity_scores[idx] > 0.0:  # Only include relevant results
+            results.append({
+                "section": state.section_data[idx],
+                "score": float(similarity_scores[idx]),
+                "type": "pdf",
+                "row": int(idx)
+            })
+    
+    return results
+
+# Function to search wiki content
+def search_wiki_content(state, query, top_n=5, families=None, facet_counts=None, budget=None):
+    """Search for relevant content in the wiki using TF-IDF (same filter arguments as search_content)"""
+    # Check if wiki data is loaded
+    if (state.wiki_vectorizer is None) or (state.wiki_tfidf_matrix is None):
+        return []
+    
+    try:
+        with metrics.span("search_wiki"):
+            return _search_wiki(state, query, top_n, families, facet_counts, budget)
+    except Exception as e:
+        # Handle any errors during search
+        print(f"Error searching wiki: {e}")
+        return []
+
+def _search_wiki(state, query, top_n, families=None, facet_counts=None, budget=None):
+    # Transform the query using the wiki vectorizer
+    query_vector = state.wiki_vectorizer.transform([query])
+    
+    # Calculate similarity scores, times the precomputed link-graph authority of each
+    # section's page (a multiplier, so non-matches stay at 0)
+    top_k = top_n * 2 if state.wiki_semantic_index is not None else top_n
+    similarity_scores, matches = score_query(query_vector, state.wiki_tfidf_matrix, state.wiki_term_index, top_k,
+                                             budget, boost=state.wiki_link_boost,
+                                             mask=_family_mask(state.wiki_facets, families), stage="search_wiki",
+                                             count_matches=facet_counts is not None and state.wiki_facets is not None)
+    similarity_scores, mask = apply_facets(state.wiki_facets, similarity_scores, families, facet_counts, matches)
+    
+    if state.wiki_semantic_index is not None and _semantic_in_budget(budget):
+        return fuse_semantic_results(state, query, similarity_scores, state.wiki_semantic_index,
+                                     state.wiki_sections, top_n, "wiki", mask)
+    
+    # Get the top N most relevant sections
+    top_indices = similarity_scores.argsort()[:-top_n-1:-1]
+    
+    results = []
+    for idx in top_indices:
+        if similarity_scores[idx] > 0.0:  # Only include relevant results
+            results.append({
+                "section": state.wiki_sections[idx],
+                "score": float(similarity_scores[idx]),
+                "type": "wiki",
+                "row": int(idx)
+            })
+    
+    return results
+
+# Function to extract keywords from query
+def extract_keywords(query):
+    """Extract important keywords from the query"""
+    # Remove common words and stop words
+    stop_words = {'the', 'a', 'an', 'and', 'or', 'but', 'is', 'are', 'was', 'were', 
+                'in', 'on', 'at', 'to', 'for', 'with', 'by', 'about', 'like', 
+                'from', 'of', 'how', 'what', 'when', 'where', 'why', 'who', 'which'}
+    
+    words = query.lower().split()
+    keywords = [word for word in words if word not in stop_words and len(word) > 2]
+    
+    return keywords
+
+# Function to suggest relevant tutorials based on keywords
+def suggest_tutorials(state, keywords, num_results=3, families=None, budget=None):
+    """Suggest tutorials that might be relevant to the keywords"""
+    with metrics.span("suggest_tutorials"):
+        return _suggest_tutorials(state, keywords, num_results, families, budget)
+
+def _suggest_tutorials(state, keywords, num_results, families=None, budget=None):
+    tutorial_scores = {}
+    if not len(state.tutorial_data):
+        return []
+    if budget is not None:
+        # Each keyword scans every tutorial text, so long inputs keep their rarest words only
+        keywords = select_keywords(keywords, state.tfidf_vectorizer, state.term_index)
+    tutorial_names = state.tutorial_data.column("name")
+    if families:
+        tutorial_names = [name if family_of(name) in families else None for name in tutorial_names]
+    
+    for position, keyword in enumerate(keywords):
+        if position > 0 and budget is not None and budget.expired():
+            budget.cut("suggest_tutorials")
+            break
+        
+        # Count keyword occurrences in each tutorial's (pre-lowercased) text
+        for tutorial_name, count in zip(tutorial_names, keyword_counts(state.tutorial_data, keyword)):
+            if count > 0 and tutorial_name is not None:
+                if tutorial_name in tutorial_scores:
+                    tutorial_scores[tutorial_name] += count
+                else:
+                    tutorial_scores[tutorial_name] = count
+    
+    # Sort tutorials by relevance score
+    sorted_tutorials = sorted(tutorial_scores.items(), key=lambda x: x[1], reverse=True)
+    
+    return [name for name, score in sorted_tutorials[:num_results]]
+
+
+# Function to count the results a response would show
+def shown_results(pdf_results, wiki_results, num_results):
+    return len(pdf_results[:num_results]) + len(wiki_results[:num_results])
+
+# Function to pick between the query as typed and its spelling correction
+def choose_spelling(query, corrected_query, results, search_corrected, num_results):
+    """The query to show results for, its results and the correction to offer instead (if any)
+
+    The query is searched as typed. Only when it finds fewer results than are
+    shown is the corrected query searched (search_corrected), and its results
+    are kept if there are more of them. Otherwise the correction is offered
+    as "did you mean".
+    """
+    if corrected_query is None:
+        return query, results, None
+    if shown_results(*results[:2], num_results) < num_results:
+        corrected_results = search_corrected(corrected_query)
+        if shown_results(*corrected_results[:2], num_results) > shown_results(*results[:2], num_results):
+            metrics.inc("gms_spelling_corrections_total")
+            return corrected_query, corrected_results, None
+    metrics.inc("gms_spelling_suggestions_total")
+    return query, results, corrected_query
+
+# Function to run a search and format the response
+def run_search(state, query, num_results=3, search_pdfs=True, search_wiki=True, families=None):
+    """Search, format the response and return it with the ids of the results shown"""
+    with metrics.request(num_results=num_results, pdfs=search_pdfs, wiki=search_wiki):
+        # The deadline covers the whole request; pasted text is truncated before it is tokenized
+        budget = start_budget()
+        if budget is not None:
+            query = query[:MAX_QUERY_CHARS]
+        
+        # Look up corrections for words that are not in the index vocabulary
+        corrected_query = None
+        if state.spelling is not None:
+            with metrics.span("spelling"):
+                corrected_query, corrections = state.spelling.correct_query(query)
+            if not corrections:
+                corrected_query = None
+        
+        # Search for relevant content in PDFs and wiki based on filters
+        def search_sources(text):
+            facet_counts = {}
+            pdf_results = (search_content(state, text, max(5, num_results), families, facet_counts, budget)
+                           if search_pdfs else [])
+            wiki_results = (search_wiki_content(state, text, max(5, num_results), families, facet_counts, budget)
+                            if search_wiki else [])
+            return pdf_results, wiki_results, facet_counts
+        
+        search_query, (pdf_results, wiki_results, facet_counts), did_you_mean = choose_spelling(
+            query, corrected_query, search_sources(query), search_sources, num_results)
+        suggested_tutorials = []
+        if search_pdfs:
+            metrics.observe("gms_results", len(pdf_results[:num_results]), COUNT_BUCKETS, source="pdf")
+        if search_wiki:
+            metrics.observe("gms_results", len(wiki_results[:num_results]), COUNT_BUCKETS, source="wiki")
+        
+        # Check if we have any results from either source
+        if not pdf_results and not wiki_results:
+            # No direct matches, suggest tutorials based on keywords
+            if search_pdfs:
+                suggested_tutorials = suggest_tutorials(state, extract_keywords(search_query), num_results, families,
+                                                        budget)
+            metrics.inc("gms_fallbacks_total", kind="suggest_tutorials" if suggested_tutorials else "no_results")
+        
+        # Precomputed neighbours of the results shown
+        attach_related(state.related, pdf_results[:num_results] + wiki_results[:num_results],
+                       state.section_data, state.wiki_sections)
+        
+        partial = budget is not None and budget.partial
+        if partial:
+            metrics.inc("gms_partial_results_total")
+        
+        with metrics.span("format_response"):
+            response = format_response(search_query, pdf_results, wiki_results, suggested_tutorials,
+                                       num_results, search_pdfs, search_wiki, original_query=query,
+                                       facet_counts=facet_counts, partial=partial, did_you_mean=did_you_mean)
+    
+    result = {
+        "response": response,
+        "result_ids": ([r["section"]["id"] for r in pdf_results[:num_results]] +
+                       [r["section"]["id"] for r in wiki_results[:num_results]] +
+                       suggested_tutorials),
+        "partial": partial
+    }
+    return result
+
+# Function to look up the related sections of search results
+def attach_related(graph, results, sections, wiki_sections, limit=RELATED_SHOWN, version=None):
+    """Add a "related" list to each result from the precomputed graph (a row lookup per result)
+
+    version labels the related PDF sections when the graph belongs to a version shard.
+    """
+    if graph is None:
+        return
+    for result in results:
+        if "row" not in result:
+            continue
+        related = []
+        for kind, row, score in graph.related(result["type"], result["row"], limit):
+            pool = sections if kind == "pdf" else wiki_sections
+            if row < len(pool):
+                entry = {"section": pool[row], "type": kind, "score": score}
+                if version is not None and kind == "pdf":
+                    entry["version"] = version
+                related.append(entry)
+        result["related"] = related
+
+# Function to format the related sections of one result
+def _related_line(result):
+    """One markdown line linking a result's related sections (empty if it has none)"""
+    links = []
+    for entry in result.get("related", []):
+        section = entry["section"]
+        if entry["type"] == "pdf":
+            url = f"{pdf_base_url(entry.get('version', DEFAULT_VERSION))}{section['tutorial']}.pdf"
+            links.append(f"[{section['tutorial']}]({url})")
+        else:
+            title = section.get("title", "Wiki Section")
+            parent_title = section.get("parent_title", "")
+            if parent_title and parent_title != title:
+                title = f"{parent_title} - {title}"
+            links.append(f"[{title}]({section['url']})")
+    return "*Related:* " + " · ".join(links) + "\n\n" if links else ""
+
+# Function to format the near-duplicate sources of one result
+def _duplicates_line(result):
+    """One markdown line linking the other tutorials or wiki pages with the same text (empty if none)"""
+    section = result["section"]
+    own = section.get("tutorial") or section.get("parent_title") or section.get("title")
+    links = {}
+    if result["type"] == "pdf":
+        base_url = pdf_base_url(result.get("version", DEFAULT_VERSION))
+        for label in section.get("duplicate_labels") or []:
+            if label != own:
+                links.setdefault(label, f"[{label}]({base_url}{label}.pdf)")
+    else:
+        for label, url in zip(section.get("duplicate_labels") or [], section.get("duplicate_urls") or []):
+            if label != own:
+                links.setdefault(label, f"[{label}]({url})")
+    return "*Also in:* " + " · ".join(links.values()) + "\n\n" if links else ""
+
+# Function to get the download location of a version's tutorial PDFs
+def pdf_base_url(version=DEFAULT_VERSION):
+    """S3 base URL holding the tutorial PDFs of one GMS version"""
+    return f"https://s3.amazonaws.com/gmstutorials-{version}.aquaveo.com/"
+
+# Function to generate a response
+def get_response(state, query, num_results=3, search_pdfs=True, search_wiki=True, families=None):
+    """Generate a response based on the user query with PDF links and wiki links"""
+    return run_search(state, query, num_results, search_pdfs, search_wiki, families)["response"]
+
+# Function to format the search results as markdown
+def format_response(query, pdf_results, wiki_results, suggested_tutorials, num_results=3,
+                    search_pdfs=True, search_wiki=True, original_query=None,
+                    suggestion_version=DEFAULT_VERSION, facet_counts=None, partial=False, did_you_mean=None):
+    """Format search results (or the fallback suggestions) as the markdown response
+
+    PDF results from a version shard carry a "version" key that selects the
+    download location; the version is shown when results span several versions.
+    facet_counts (family -> matching sections) adds a line of counts under the heading.
+    partial notes that the time budget cut the search short. did_you_mean is a
+    spelling correction that was not searched, offered to the user instead.
+    """
+    # Say so when misspelled words were replaced before searching, or offer the correction
+    note = ""
+    if original_query is not None and original_query != query:
+        note = f"*Searched for '{query}' instead of '{original_query}'.*\n\n"
+    elif did_you_mean:
+        note = f"*Did you mean: {did_you_mean}?*\n\n"
+    if partial:
+        note += "*The search ran out of time, so these results may be incomplete.*\n\n"
+    
+    # Label results with their version only when more than one is shown
+    show_versions = len({result.get("version", DEFAULT_VERSION) for result in pdf_results[:num_results]}) > 1
+    
+    # Check if we have any results from either source
+    if not pdf_results and not wiki_results:
+        if suggested_tutorials:
+            response = "I couldn't find specific information about that, but these tutorials might be helpful:\n\n"
+            for tutorial in suggested_tutorials:
+                # Create a PDF link
+                pdf_url = f"{pdf_base_url(suggestion_version)}{tutorial}.pdf"
+                response += f"{tutorial} - [View PDF]({pdf_url})\n\n"
+        else:
+            sources = []
+            if search_pdfs:
+                sources.append("tutorials")
+            if search_wiki:
+                sources.append("wiki pages")
+            
+            source_text = " or ".join(sources)
+            response = f"I'm sorry, I couldn't find any relevant information in the available {source_text}. Could you try rephrasing your question?"
+    else:
+        # Format the search results in categories
+        response = f"Here's what I found for '{query}':\n\n"
+        
+        # Matching sections per tutorial family, before any family filter
+        if facet_counts:
+            counts = [f"{name} ({facet_counts[name]})" for name in FACET_NAMES if facet_counts.get(name)]
+            if counts:
+                response += "**Matches by family:** " + " · ".join(counts) + "\n\n"
+        
+        # PDF RESULTS SECTION
+        if pdf_results:
+            response += "## 📚 Tutorial PDFs\n\n"
+            
+            # Show only up to the requested number of results
+            for i, result in enumerate(pdf_results[:num_results]):
+                section = result["section"]
+                content = section["content"]
+                tutorial_name = section["tutorial"]
+                version = result.get("version", DEFAULT_VERSION)
+                
+                # Create a PDF link
+                pdf_url = f"{pdf_base_url(version)}{tutorial_name}.pdf"
+                
+                # Truncate content if too long
+                if len(content) > 300:
+                    content = content[:300] + "..."
+                
+                label = f"{tutorial_name} (GMS {version})" if show_versions else tutorial_name
+                response += (f"**{label}** - [View PDF]({pdf_url})\n\n{content}\n\n"
+                             f"{_duplicates_line(result)}{_related_line(result)}---\n\n")
+        
+        # WIKI RESULTS SECTION
+        if wiki_results:
+            response += "## 🌐 GMS Wiki Documentation\n\n"
+            
+            # Show only up to the requested number of results
+            for i, result in enumerate(wiki_results[:num_results]):
+                section = result["section"]
+                title = section.get("title", "Wiki Section")
+                content = section["content"]
+                url = section["url"]
+                parent_title = section.get("parent_title", "")
+                
+                # Format the wiki section title
+                display_title = title
+                if parent_title and parent_title != title:
+                    display_title = f"{parent_title} - {title}"
+                
+                # Truncate content if too long
+                if len(content) > 300:
+                    content = content[:300] + "..."
+                
+                response += (f"**{display_title}** - [View Wiki Page]({url})\n\n{content}\n\n"
+                             f"{_duplicates_line(result)}{_related_line(result)}---\n\n")
+    
+    return note + response
+
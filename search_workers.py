@@ -0,0 +1,76 @@
+# Multi-worker deployment mode for the search core
+#
+# Streamlit runs the app in a single Python process, so CPU-heavy scoring in
+# get_response() is serialized by the GIL. With GMS_SEARCH_WORKERS=N the app
+# hands each search to a pool of N worker processes instead. The TF-IDF
+# matrices are exported as .npy arrays when a version is published and
+# memory-mapped read-only by every worker, so the operating system keeps a
+# single copy in the page cache. Data without the exports (a directory that was
+# never published) is loaded into each worker's memory instead.
+#
+# When a new index version is published, each worker swaps to it before its
+# next request, so the pool keeps serving while the workers move over one by one.
+#
+#   GMS_SEARCH_WORKERS=4 streamlit run app.py
+
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from search_core import SearchState, load_search_data, refresh_search_state, run_search
+from metrics import metrics
+
+# Number of search worker processes (0 = search inside the Streamlit process)
+SEARCH_WORKERS = int(os.environ.get("GMS_SEARCH_WORKERS", "0"))
+
+# Search state of the current worker process
+_worker_state = None
+
+def _init_worker():
+    """Load the indexes in a worker process, memory-mapping the matrices"""
+    global _worker_state
+    _worker_state = SearchState()
+    load_search_data(_worker_state, use_mmap=True)
+
+def _worker_run_search(query, num_results, search_pdfs, search_wiki, families=None):
+    # Between requests: move to a newly published index version
+    refresh_search_state(_worker_state, use_mmap=True)
+    result = run_search(_worker_state, query, num_results=num_results,
+                        search_pdfs=search_pdfs, search_wiki=search_wiki, families=families)
+    # Ship this request's metrics back so the front end can expose them
+    return result, metrics.snapshot(reset=True) if metrics.enabled else None
+
+def _worker_ready():
+    return _worker_state is not None and _worker_state.tfidf_matrix is not None
+
+class SearchWorkerPool:
+    """A pool of search worker processes sharing memory-mapped indexes"""
+
+    def __init__(self, n_workers):
+        self.n_workers = max(1, n_workers)
+
+        # "spawn" keeps the workers free of the parent's Streamlit state and threads
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.n_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker
+        )
+        self.warm_up()
+
+    def warm_up(self):
+        """Start every worker and wait until each has loaded its indexes"""
+        futures = [self.executor.submit(_worker_ready) for _ in range(self.n_workers * 2)]
+        return all(future.result() for future in futures)
+
+    def run_search(self, query, num_results=3, search_pdfs=True, search_wiki=True, families=None):
+        """Run run_search() in one of the worker processes"""
+        result, worker_metrics = self.executor.submit(_worker_run_search, query, num_results,
+                                                      search_pdfs, search_wiki, families).result()
+        metrics.merge(worker_metrics)
+        return result
+
+    def get_response(self, query, num_results=3, search_pdfs=True, search_wiki=True, families=None):
+        """Run get_response() in one of the worker processes"""
+        return self.run_search(query, num_results, search_pdfs, search_wiki, families)["response"]
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
@@ -0,0 +1,204 @@
+# Columnar storage for the section and tutorial metadata
+#
+# section_data.json and wiki_sections.json load as one dict per section, each
+# repeating its keys, and tutorial_data.json keeps the full text of every
+# tutorial in memory. A ColumnStore holds the same records column by column:
+#   - text columns (content, ids, urls) are offsets into one contiguous UTF-8
+#     buffer that is memory-mapped from disk, so it lives in the page cache
+#   - repetitive strings (tutorial, title, type) are interned to int32 codes
+#   - integers are a numpy array
+# Indexing a store returns a plain dict for that one record, so code that does
+# sections[idx]["content"] works unchanged. The JSON files stay the build
+# output; the store files next to them are derived from them when a version is
+# published. Servers never write into a data directory: when a store is stale or
+# missing, the records are held in memory from the JSON instead.
+
+import os
+import json
+import tempfile
+from collections.abc import Sequence
+import numpy as np
+
+# Files derived from each JSON file
+SECTION_STORE = 'section_store'
+WIKI_STORE = 'wiki_store'
+TUTORIAL_STORE = 'tutorial_store'
+
+# A string column is interned when it has at most this share of distinct values
+LABEL_MAX_DISTINCT = 0.5
+
+# Separator for list columns (e.g. the ids a near-duplicate section replaced)
+LIST_SEPARATOR = '\n'
+
+def _column_kind(values):
+    """Storage kind for the present values of one column"""
+    if all(isinstance(v, int) and not isinstance(v, bool) for v in values):
+        return "int"
+    if any(isinstance(v, list) for v in values):
+        return "list"
+    if len(set(values)) <= max(1, len(values) * LABEL_MAX_DISTINCT):
+        return "label"
+    return "text"
+
+def _write_atomic(path, write):
+    # A unique temporary name, so processes building the same store never write one file
+    handle, temp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.',
+                                         prefix=os.path.basename(path) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(handle, 'wb') as f:
+            write(f)
+        # mkstemp creates the file private to its owner; the store is read by every server
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+def encode_columns(rows):
+    """Column arrays and the UTF-8 text buffer for a list of rows (dicts)"""
+    keys = list(dict.fromkeys(key for row in rows for key in row))
+    arrays = {}
+    schema = []
+    chunks = []
+    position = 0
+    for key in keys:
+        present = np.array([key in row for row in rows], dtype=bool)
+        values = [row[key] for row in rows if key in row]
+        kind = _column_kind(values)
+        schema.append([key, kind])
+        if not present.all():
+            arrays[f'{key}.present'] = present
+
+        if kind == "int":
+            column = np.zeros(len(rows), dtype=np.int64)
+            column[present] = values
+            arrays[f'{key}.values'] = column.astype(np.int32) if np.abs(column).max(initial=0) < 2 ** 31 else column
+        elif kind == "label":
+            labels = sorted(set(values))
+            code_of = {label: code for code, label in enumerate(labels)}
+            codes = np.full(len(rows), -1, dtype=np.int32)
+            codes[present] = [code_of[v] for v in values]
+            arrays[f'{key}.labels'] = np.array(labels, dtype=str)
+            arrays[f'{key}.codes'] = codes
+        else:
+            encoded = [(LIST_SEPARATOR.join(row[key]) if kind == "list" else str(row[key])).encode('utf-8')
+                       if key in row else b'' for row in rows]
+            lengths = np.fromiter((len(e) for e in encoded), dtype=np.int64, count=len(encoded))
+            arrays[f'{key}.offsets'] = position + np.concatenate(([0], np.cumsum(lengths)))
+            position += int(lengths.sum())
+            chunks.extend(encoded)
+
+    arrays['schema'] = np.array(json.dumps(schema))
+    arrays['rows'] = np.array(len(rows))
+    return arrays, b''.join(chunks)
+
+def build_column_store(rows, directory, name):
+    """Write rows (dicts) as <name>_columns.npz plus the <name>_text.bin buffer"""
+    arrays, text = encode_columns(rows)
+    _write_atomic(os.path.join(directory, f'{name}_text.bin'), lambda f: f.write(text))
+    _write_atomic(os.path.join(directory, f'{name}_columns.npz'), lambda f: np.savez(f, **arrays))
+
+class ColumnStore(Sequence):
+    """Read-only columnar records; store[i] gives record i as a dict"""
+
+    def __init__(self, arrays, buffer):
+        self.schema = json.loads(str(arrays['schema']))
+        self._rows = int(arrays['rows'])
+        self._arrays = {key: array for key, array in arrays.items() if key not in ('schema', 'rows')}
+        # Labels as Python strings, so lookups don't build numpy scalars
+        self._labels = {key[:-len('.labels')]: array.tolist()
+                        for key, array in self._arrays.items() if key.endswith('.labels')}
+        self._buffer = buffer
+
+    @classmethod
+    def open(cls, directory, name):
+        """Store written by build_column_store, with the text buffer memory-mapped"""
+        with np.load(os.path.join(directory, f'{name}_columns.npz'), allow_pickle=False) as arrays:
+            columns = {key: arrays[key] for key in arrays.files}
+        buffer_path = os.path.join(directory, f'{name}_text.bin')
+        buffer = (np.memmap(buffer_path, dtype=np.uint8, mode='r') if os.path.getsize(buffer_path)
+                  else np.zeros(0, dtype=np.uint8))
+        return cls(columns, buffer)
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Store held in memory, for data directories the store files cannot be written to"""
+        arrays, text = encode_columns(rows)
+        return cls(arrays, np.frombuffer(text, dtype=np.uint8))
+
+    def __len__(self):
+        return self._rows
+
+    def has(self, i, key):
+        present = self._arrays.get(f'{key}.present')
+        return present is None or bool(present[i])
+
+    def raw(self, i, key):
+        """UTF-8 bytes of a text or list column"""
+        offsets = self._arrays[f'{key}.offsets']
+        return self._buffer[offsets[i]:offsets[i + 1]].tobytes()
+
+    def value(self, i, key, kind):
+        if kind == "int":
+            return int(self._arrays[f'{key}.values'][i])
+        if kind == "label":
+            return self._labels[key][self._arrays[f'{key}.codes'][i]]
+        text = self.raw(i, key).decode('utf-8')
+        if kind == "list":
+            return text.split(LIST_SEPARATOR) if text else []
+        return text
+
+    def column(self, key):
+        """All values of one column as a list (None where a record lacks the key)"""
+        kind = dict(self.schema)[key]
+        return [self.value(i, key, kind) if self.has(i, key) else None for i in range(self._rows)]
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self._rows))]
+        if i < 0:
+            i += self._rows
+        if not 0 <= i < self._rows:
+            raise IndexError(i)
+        return {key: self.value(i, key, kind) for key, kind in self.schema if self.has(i, key)}
+
+    def nbytes(self):
+        """Resident size of the column arrays (the text buffer is memory-mapped)"""
+        return sum(array.nbytes for array in self._arrays.values())
+
+def _store_is_stale(json_path, directory, name):
+    store_path = os.path.join(directory, f'{name}_columns.npz')
+    return not os.path.exists(store_path) or os.path.getmtime(store_path) < os.path.getmtime(json_path)
+
+def tutorial_rows(tutorial_data):
+    """Tutorial records kept for suggest_tutorials: name, filename, pages and lowercased text"""
+    return [{"name": name, "filename": data.get("filename", f"{name}.pdf"), "pages": data.get("pages", 0),
+             "lowercase_text": data.get("text", "").lower()} for name, data in tutorial_data.items()]
+
+def load_column_store(json_path, directory, name, to_rows=None):
+    """Open the store derived from a JSON file, or hold the JSON records in memory if it is missing or older"""
+    if not _store_is_stale(json_path, directory, name):
+        return ColumnStore.open(directory, name)
+    # Stores are only written when a version is published (build_data_stores)
+    print(f"No up-to-date {name} in {directory}; keeping {os.path.basename(json_path)} in memory")
+    with open(json_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    return ColumnStore.from_rows(to_rows(data) if to_rows else data)
+
+def build_data_stores(directory):
+    """Build the stores of every JSON file in a data directory (run before a version is published)"""
+    for filename, name, to_rows in (('tutorial_data.json', TUTORIAL_STORE, tutorial_rows),
+                                    ('section_data.json', SECTION_STORE, None),
+                                    ('wiki_sections.json', WIKI_STORE, None)):
+        json_path = os.path.join(directory, filename)
+        if not os.path.exists(json_path):
+            continue
+        with open(json_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        build_column_store(to_rows(data) if to_rows else data, directory, name)
+
+def keyword_counts(tutorials, keyword):
+    """Occurrences of a keyword in each tutorial's text (case-insensitive)"""
+    needle = keyword.lower().encode('utf-8')
+    return [tutorials.raw(i, "lowercase_text").count(needle) for i in range(len(tutorials))]
@@ -0,0 +1,189 @@
+# Optional dense-retrieval backend for the tutorial and wiki search
+#
+# Section embeddings are computed offline at build time with a small CPU-only
+# sentence-transformers model, quantized to int8 (or float16) and saved as a
+# .npy file that is memory-mapped at query time. An IVF (inverted file) index
+# over k-means centroids keeps each query to a few candidate lists. Results are
+# fused with the lexical TF-IDF ranking using reciprocal rank fusion.
+#
+# Nothing here needs a GPU or the network once the model files are local:
+#   python semantic_index.py            # build embeddings for processed_data and wiki_data
+
+import os
+import sys
+import json
+import numpy as np
+from index_versions import resolve_data_dir, derive_version, publish_version
+
+# Local directory holding the embedding model (e.g. a copy of all-MiniLM-L6-v2)
+SEMANTIC_MODEL_DIR = os.environ.get("GMS_EMBEDDING_MODEL", os.path.join("models", "all-MiniLM-L6-v2"))
+
+# Storage type for the embedding matrix: "int8" or "float16"
+SEMANTIC_DTYPE = "int8"
+
+# Number of IVF lists probed per query
+SEMANTIC_NPROBE = 8
+
+# Reciprocal rank fusion constant (the usual value from the RRF paper)
+RRF_K = 60
+
+INT8_SCALE = 127.0
+
+def load_embedding_model(model_dir=SEMANTIC_MODEL_DIR):
+    """Load the local embedding model on CPU, or return None if it is not available"""
+    if not os.path.isdir(model_dir):
+        return None
+
+    # Never reach out to the model hub; the model must already be on disk
+    os.environ.setdefault("HF_HUB_OFFLINE", "1")
+    os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+
+    try:
+        from sentence_transformers import SentenceTransformer
+    except ImportError:
+        print("sentence-transformers is not installed; semantic search disabled")
+        return None
+
+    try:
+        return SentenceTransformer(model_dir, device="cpu")
+    except Exception as e:
+        print(f"Could not load embedding model from {model_dir}: {e}")
+        return None
+
+def embed_texts(model, texts, batch_size=64):
+    """Embed texts as L2-normalized float32 vectors"""
+    vectors = model.encode(texts, batch_size=batch_size, convert_to_numpy=True,
+                           normalize_embeddings=True, show_progress_bar=False)
+    return vectors.astype(np.float32)
+
+def quantize(vectors, dtype=SEMANTIC_DTYPE):
+    """Quantize normalized vectors for storage"""
+    if dtype == "int8":
+        return np.clip(np.round(vectors * INT8_SCALE), -127, 127).astype(np.int8)
+    return vectors.astype(np.float16)
+
+def train_ivf(vectors, n_lists=None, iterations=10, seed=0):
+    """Spherical k-means over the vectors; returns centroids and each vector's list"""
+    n = len(vectors)
+    if n_lists is None:
+        n_lists = max(1, min(256, int(np.sqrt(n))))
+
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(n, size=n_lists, replace=False)].copy()
+
+    for _ in range(iterations):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        for c in range(n_lists):
+            members = vectors[assignment == c]
+            if len(members):
+                centroid = members.sum(axis=0)
+                centroids[c] = centroid / max(np.linalg.norm(centroid), 1e-12)
+
+    assignment = np.argmax(vectors @ centroids.T, axis=1)
+    return centroids.astype(np.float32), assignment
+
+def build_semantic_index(model, texts, directory, prefix=''):
+    """Embed texts and save the quantized vectors and IVF lists to the directory"""
+    vectors = embed_texts(model, texts)
+    centroids, assignment = train_ivf(vectors)
+
+    # Inverted lists: document ids grouped by centroid, with offsets into the array
+    order = np.argsort(assignment, kind="stable").astype(np.int32)
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(assignment, minlength=len(centroids)))]).astype(np.int64)
+
+    np.save(os.path.join(directory, f'{prefix}embeddings.npy'), quantize(vectors))
+    np.savez(os.path.join(directory, f'{prefix}ivf.npz'), centroids=centroids, order=order, offsets=offsets)
+    return len(texts)
+
+def append_semantic_index(model, texts, directory, prefix=''):
+    """Embed new texts and append them to a saved index, assigning them to its existing IVF lists"""
+    vectors = embed_texts(model, texts)
+    embeddings_path = os.path.join(directory, f'{prefix}embeddings.npy')
+    stored = np.load(embeddings_path)
+    with np.load(os.path.join(directory, f'{prefix}ivf.npz'), allow_pickle=False) as ivf:
+        centroids, order, offsets = ivf['centroids'], ivf['order'], ivf['offsets']
+
+    # Recover each stored vector's list from the offsets, then add the new ones to their nearest centroid
+    assignment = np.empty(len(stored), dtype=np.int64)
+    assignment[order] = np.repeat(np.arange(len(centroids)), np.diff(offsets))
+    assignment = np.concatenate([assignment, np.argmax(vectors @ centroids.T, axis=1)])
+    order = np.argsort(assignment, kind="stable").astype(np.int32)
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(assignment, minlength=len(centroids)))]).astype(np.int64)
+
+    np.save(embeddings_path, np.concatenate([stored, quantize(vectors, stored.dtype.name)]))
+    np.savez(os.path.join(directory, f'{prefix}ivf.npz'), centroids=centroids, order=order, offsets=offsets)
+    return len(texts)
+
+def remove_semantic_index(directory, prefix=''):
+    """Delete the embeddings and IVF lists of a directory"""
+    for name in (f'{prefix}embeddings.npy', f'{prefix}ivf.npz'):
+        path = os.path.join(directory, name)
+        if os.path.exists(path):
+            os.remove(path)
+
+def embedding_rows(directory, prefix=''):
+    """Number of embedded sections saved in the directory (None without a semantic index)"""
+    if not semantic_index_exists(directory, prefix):
+        return None
+    return np.load(os.path.join(directory, f'{prefix}embeddings.npy'), mmap_mode='r').shape[0]
+
+def semantic_index_exists(directory, prefix=''):
+    """Check whether embeddings and IVF lists have been built in the directory"""
+    return (os.path.exists(os.path.join(directory, f'{prefix}embeddings.npy')) and
+            os.path.exists(os.path.join(directory, f'{prefix}ivf.npz')))
+
+class SemanticIndex:
+    """Memory-mapped quantized embeddings searched through IVF lists"""
+
+    def __init__(self, directory, prefix=''):
+        self.embeddings = np.load(os.path.join(directory, f'{prefix}embeddings.npy'), mmap_mode='r')
+        with np.load(os.path.join(directory, f'{prefix}ivf.npz'), allow_pickle=False) as ivf:
+            self.centroids = ivf['centroids']
+            self.order = ivf['order']
+            self.offsets = ivf['offsets']
+        self.scale = INT8_SCALE if self.embeddings.dtype == np.int8 else 1.0
+
+    def search(self, query_vector, top_n=5, nprobe=SEMANTIC_NPROBE):
+        """Return (indices, scores) of the approximate nearest documents"""
+        probe = np.argsort(self.centroids @ query_vector)[::-1][:nprobe]
+        candidates = np.concatenate([self.order[self.offsets[c]:self.offsets[c + 1]] for c in probe])
+        if len(candidates) == 0:
+            return np.array([], dtype=np.int32), np.array([], dtype=np.float32)
+
+        # Fancy indexing on the memmap only pages in the candidate rows
+        candidates = np.sort(candidates)
+        scores = (self.embeddings[candidates].astype(np.float32) @ query_vector) / self.scale
+        top = np.argsort(scores)[::-1][:top_n]
+        return candidates[top], scores[top]
+
+def fuse_rankings(lexical, semantic, top_n=5, k=RRF_K):
+    """Reciprocal rank fusion of two ranked lists of document indices"""
+    fused = {}
+    for ranking in (lexical, semantic):
+        for rank, idx in enumerate(ranking):
+            fused[int(idx)] = fused.get(int(idx), 0.0) + 1.0 / (k + rank + 1)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)[:top_n]
+
+def main():
+    # Build embeddings for the already processed PDF and wiki sections
+    model = load_embedding_model()
+    if model is None:
+        print(f"No embedding model found in {SEMANTIC_MODEL_DIR}")
+        sys.exit(1)
+
+    targets = [("processed_data", "section_data.json", "", "pdf"), ("wiki_data", "wiki_sections.json", "wiki_", "wiki")]
+    for base_dir, filename, prefix, kind in targets:
+        path = os.path.join(resolve_data_dir(base_dir), filename)
+        if not os.path.exists(path):
+            print(f"Skipping {path} (not found)")
+            continue
+        with open(path, 'r', encoding='utf-8') as f:
+            sections = json.load(f)
+        # Built into a copy of the published version, which is then published itself
+        version_dir = derive_version(base_dir)
+        count = build_semantic_index(model, [section['content'] for section in sections], version_dir, prefix)
+        print(f"Embedded {count} sections from {path}")
+        publish_version(base_dir, version_dir, kind)
+
+if __name__ == "__main__":
+    main()
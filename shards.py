@@ -0,0 +1,281 @@
+# Version-sharded search
+#
+# Every supported GMS version is a shard with its own PDFs, processed data and
+# index, so a version is built, loaded and swapped without touching the others:
+#
+#   10.8 (DEFAULT_VERSION)   pdfs/            processed_data/
+#   10.7                     pdfs/10.7/       processed_data/shards/10.7/
+#   ...
+#
+# The wiki is a separate shard of its own. A query fans out to the selected
+# shards on a thread pool (scoring is numpy/scipy work that releases the GIL),
+# and the per-shard top-k lists are merged by score into one global top-k.
+#
+#   python shards.py build 10.7     # process pdfs/10.7/ into its shard
+#   python shards.py list
+
+import os
+import sys
+import time
+import heapq
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from search_core import (DATA_DIR, PDFS_DIR, WIKI_DATA_DIR, DEFAULT_VERSION, SearchState,
+                         load_search_data, load_wiki_data, search_content, search_wiki_content,
+                         suggest_tutorials, extract_keywords, format_response, attach_related,
+                         choose_spelling)
+from metrics import metrics, COUNT_BUCKETS
+from search_budget import MAX_QUERY_CHARS, start_budget
+from index_versions import resolve_data_dir
+
+# Versions with published tutorial PDFs, newest first
+GMS_VERSIONS = ("10.8", "10.7", "10.6", "10.5", "10.4")
+
+# Processed data of the non-default versions
+SHARDS_DIR = os.path.join(DATA_DIR, "shards")
+
+# Threads used to search shards in parallel
+SHARD_THREADS = int(os.environ.get("GMS_SHARD_THREADS", "4"))
+
+def shard_dirs(version):
+    """PDF and processed data directories of one version shard"""
+    if version == DEFAULT_VERSION:
+        return PDFS_DIR, DATA_DIR
+    return os.path.join(PDFS_DIR, version), os.path.join(SHARDS_DIR, version)
+
+def shard_timestamp(data_dir):
+    """Build time of the published data of a directory (None if it has not been built)"""
+    try:
+        with open(os.path.join(resolve_data_dir(data_dir), 'processed_timestamp.txt'), 'r') as f:
+            return float(f.read().strip())
+    except (OSError, ValueError):
+        return None
+
+def available_versions():
+    """Versions whose shard has been built, newest first"""
+    return [version for version in GMS_VERSIONS if shard_timestamp(shard_dirs(version)[1]) is not None]
+
+def load_shard(version, use_mmap=False):
+    """Load one version shard (PDF data only)"""
+    state = SearchState()
+    load_search_data(state, use_mmap, data_dir=shard_dirs(version)[1], wiki_data_dir=None)
+    return state
+
+def load_wiki_shard(use_mmap=False):
+    """Load the wiki shard (None if the wiki has not been processed)"""
+    state = SearchState()
+    try:
+        if not load_wiki_data(state, use_mmap):
+            return None
+    except Exception as e:
+        print(f"Wiki data not loaded: {e}")
+        return None
+    state.loading_timestamp = os.path.getmtime(os.path.join(state.wiki_data_dir, 'wiki_sections.json'))
+    return state
+
+def _attach_shard_related(shard, version, results, wiki):
+    """Related sections from a shard's graph; its wiki rows are used only if they match the loaded wiki"""
+    graph = shard.related
+    wiki_sections = wiki.wiki_sections if wiki is not None else []
+    if graph is not None and graph.n_wiki != len(wiki_sections):
+        wiki_sections = []
+    attach_related(graph, results, shard.section_data, wiki_sections, version=version)
+
+def _add_counts(total, counts):
+    if total is not None:
+        for name, count in counts.items():
+            total[name] = total.get(name, 0) + count
+
+class ShardedSearch:
+    """Loaded version shards plus the wiki shard, searched in parallel"""
+
+    def __init__(self, versions=None, use_mmap=False, threads=SHARD_THREADS):
+        self.use_mmap = use_mmap
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, threads), thread_name_prefix="shard")
+        self.shards = {}
+        for version in versions or available_versions():
+            try:
+                self.shards[version] = load_shard(version, use_mmap)
+            except Exception as e:
+                print(f"Shard {version} not loaded: {e}")
+        self.wiki = load_wiki_shard(use_mmap)
+
+    @property
+    def versions(self):
+        """Loaded versions, newest first"""
+        return [version for version in GMS_VERSIONS if version in self.shards]
+
+    def reload_shard(self, version):
+        """Load a rebuilt shard and swap it in; searches in flight keep the old one"""
+        state = load_shard(version, self.use_mmap)
+        with self._lock:
+            # Replace the dict rather than mutating it, so readers see one consistent set
+            shards = dict(self.shards)
+            shards[version] = state
+            self.shards = shards
+        return state
+
+    def refresh(self):
+        """Reload every shard whose published version has changed since it was loaded"""
+        reloaded = []
+        for version in available_versions():
+            state = self.shards.get(version)
+            if state is None or resolve_data_dir(shard_dirs(version)[1]) != state.data_dir:
+                try:
+                    self.reload_shard(version)
+                    reloaded.append(version)
+                except Exception as e:
+                    print(f"Shard {version} not reloaded: {e}")
+        wiki_dir = resolve_data_dir(WIKI_DATA_DIR)
+        if os.path.exists(os.path.join(wiki_dir, 'wiki_sections.json')) and (self.wiki is None or wiki_dir != self.wiki.wiki_data_dir):
+            self.wiki = load_wiki_shard(self.use_mmap)
+            reloaded.append("wiki")
+        return reloaded
+
+    def search(self, query, versions=None, top_n=5, search_pdfs=True, search_wiki=True,
+               families=None, facet_counts=None, budget=None):
+        """Fan the query out to the shards; returns the merged PDF and wiki top-n lists
+
+        All shards share one budget, since they run in parallel for the same request.
+        """
+        shards, wiki = self.shards, self.wiki
+        selected = [version for version in (versions or self.versions) if version in shards]
+
+        # Each shard fills its own facet counts; they are summed below. The pool threads
+        # record their spans in this request's trace, tagged with the shard
+        futures = []
+        if search_pdfs:
+            futures = [(version, counts, self._executor.submit(metrics.traced(search_content, shard=version),
+                                                               shards[version], query, top_n, families, counts,
+                                                               budget))
+                       for version, counts in ((version, {}) for version in selected)]
+        wiki_future = None
+        wiki_counts = {}
+        if search_wiki and wiki is not None:
+            wiki_future = self._executor.submit(metrics.traced(search_wiki_content, shard="wiki"), wiki, query,
+                                                top_n, families, wiki_counts, budget)
+
+        # Global top-n over the per-shard top-n lists
+        pdf_results = []
+        for version, counts, future in futures:
+            pdf_results.extend({**result, "version": version} for result in future.result())
+            _add_counts(facet_counts, counts)
+        pdf_results = heapq.nlargest(top_n, pdf_results, key=lambda result: result["score"])
+        wiki_results = wiki_future.result() if wiki_future is not None else []
+        _add_counts(facet_counts, wiki_counts)
+        return pdf_results, wiki_results
+
+    def run_search(self, query, num_results=3, search_pdfs=True, search_wiki=True, versions=None, families=None):
+        """Search the selected versions, format the response and return it with the result ids"""
+        shards, wiki = self.shards, self.wiki
+        selected = tuple(version for version in (versions or self.versions) if version in shards)
+
+        with metrics.request(num_results=num_results, pdfs=search_pdfs, wiki=search_wiki, shards=len(selected)):
+            # The deadline covers the whole request; pasted text is truncated before it is tokenized
+            budget = start_budget()
+            if budget is not None:
+                query = query[:MAX_QUERY_CHARS]
+            
+            # Spelling uses the vocabulary of the newest selected version
+            corrected_query = None
+            spelling = next((shards[v].spelling for v in selected if shards[v].spelling is not None), None)
+            if spelling is not None:
+                with metrics.span("spelling"):
+                    corrected_query, corrections = spelling.correct_query(query)
+                if not corrections:
+                    corrected_query = None
+
+            def search_shards(text):
+                facet_counts = {}
+                with metrics.span("fan_out"):
+                    pdf_results, wiki_results = self.search(text, selected, max(5, num_results),
+                                                            search_pdfs, search_wiki, families, facet_counts, budget)
+                return pdf_results, wiki_results, facet_counts
+
+            # The query is searched as typed; its correction only when that finds too little
+            search_query, (pdf_results, wiki_results, facet_counts), did_you_mean = choose_spelling(
+                query, corrected_query, search_shards(query), search_shards, num_results)
+            if search_pdfs:
+                metrics.observe("gms_results", len(pdf_results[:num_results]), COUNT_BUCKETS, source="pdf")
+            if search_wiki:
+                metrics.observe("gms_results", len(wiki_results[:num_results]), COUNT_BUCKETS, source="wiki")
+
+            # Precomputed neighbours of the results shown (wiki results use the newest selected version)
+            for result in pdf_results[:num_results]:
+                _attach_shard_related(shards[result["version"]], result["version"], [result], wiki)
+            if selected:
+                _attach_shard_related(shards[selected[0]], selected[0], wiki_results[:num_results], wiki)
+            
+            # No direct matches: suggest tutorials from the newest version that has any
+            suggested_tutorials = []
+            suggestion_version = selected[0] if selected else DEFAULT_VERSION
+            if not pdf_results and not wiki_results:
+                if search_pdfs:
+                    keywords = extract_keywords(search_query)
+                    for version in selected:
+                        suggested_tutorials = suggest_tutorials(shards[version], keywords, num_results, families,
+                                                                budget)
+                        if suggested_tutorials:
+                            suggestion_version = version
+                            break
+                metrics.inc("gms_fallbacks_total", kind="suggest_tutorials" if suggested_tutorials else "no_results")
+
+            partial = budget is not None and budget.partial
+            if partial:
+                metrics.inc("gms_partial_results_total")
+
+            with metrics.span("format_response"):
+                response = format_response(search_query, pdf_results, wiki_results, suggested_tutorials,
+                                           num_results, search_pdfs, search_wiki, original_query=query,
+                                           suggestion_version=suggestion_version, facet_counts=facet_counts,
+                                           partial=partial, did_you_mean=did_you_mean)
+
+        result = {
+            "response": response,
+            # Section ids repeat across versions, so they are qualified with the version
+            "result_ids": ([f"{r['version']}:{r['section']['id']}" for r in pdf_results[:num_results]] +
+                           [r["section"]["id"] for r in wiki_results[:num_results]] +
+                           [f"{suggestion_version}:{name}" for name in suggested_tutorials]),
+            "partial": partial
+        }
+        return result
+
+    def get_response(self, query, num_results=3, search_pdfs=True, search_wiki=True, versions=None, families=None):
+        """Same as search_core.get_response, over the selected versions"""
+        return self.run_search(query, num_results, search_pdfs, search_wiki, versions, families)["response"]
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+# Function to build one version shard from its PDFs
+def build_shard(version):
+    """Process pdfs/<version>/ into the version's shard directory"""
+    # The PDF build is imported here so search never needs it
+    from build import preprocess_pdfs
+    pdfs_dir, data_dir = shard_dirs(version)
+    start = time.time()
+    if not preprocess_pdfs(pdfs_dir, data_dir):
+        print(f"No PDFs found in {pdfs_dir}")
+        return False
+    print(f"Built shard {version} in {data_dir} ({time.time() - start:.1f} s)")
+    return True
+
+def main():
+    if len(sys.argv) >= 3 and sys.argv[1] == "build":
+        for version in sys.argv[2:]:
+            if version not in GMS_VERSIONS:
+                print(f"Unknown GMS version {version}; expected one of {', '.join(GMS_VERSIONS)}")
+                continue
+            build_shard(version)
+    elif len(sys.argv) == 2 and sys.argv[1] == "list":
+        for version in GMS_VERSIONS:
+            pdfs_dir, data_dir = shard_dirs(version)
+            timestamp = shard_timestamp(data_dir)
+            built = time.strftime('%Y-%m-%d %H:%M', time.localtime(timestamp)) if timestamp else "not built"
+            print(f"{version}: {data_dir} ({built})")
+    else:
+        print("Usage: python shards.py build <version> [<version> ...] | list")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+# Typo-tolerant query correction with a symmetric-delete (SymSpell-style) index
+#
+# At build time every index term is expanded to all strings reachable by
+# deleting up to SPELLING_MAX_DISTANCE characters from its first
+# SPELLING_PREFIX_LENGTH characters, and each delete maps back to the terms that
+# produced it. At query time the same deletes are generated for an unknown word
+# and looked up in that table, so finding candidates costs a few dictionary
+# lookups instead of a scan of the vocabulary. Candidates are then verified with
+# the real edit distance and the most frequent closest term wins. A candidate
+# must be SPELLING_MIN_RATIO times as frequent as the word itself, so rare
+# corpus words are left alone and unknown words only map to common terms.
+#
+# The search core treats a correction as a suggestion: the query is searched as
+# typed, and the corrected query is only searched when that finds too little.
+
+import os
+import re
+import json
+from itertools import combinations
+from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+from autocomplete import load_corpus_sections, term_document_frequencies
+
+SPELLING_FILE = 'spelling_index.json'
+
+SPELLING_MAX_DISTANCE = 2
+
+# Only the start of long terms is expanded, which keeps the table small
+SPELLING_PREFIX_LENGTH = 7
+
+# Words shorter than this are never corrected
+SPELLING_MIN_WORD = 4
+
+# Words shorter than this get one edit at most ("crashes" is two edits from "cases")
+SPELLING_LONG_WORD = 8
+
+# A correction must be in this many times as many sections as the word (an unknown word counts as one)
+SPELLING_MIN_RATIO = int(os.environ.get("GMS_SPELLING_MIN_RATIO", "10"))
+
+# Corrections remembered per process
+SPELLING_CACHE_SIZE = 10000
+
+TOKEN_PATTERN = re.compile(r'\b\w\w+\b')
+
+def _deletes(word, max_distance=SPELLING_MAX_DISTANCE, prefix_length=SPELLING_PREFIX_LENGTH):
+    """All strings made by deleting up to max_distance characters from the word's prefix"""
+    word = word[:prefix_length]
+    results = {word}
+    for distance in range(1, min(max_distance, len(word) - 1) + 1):
+        for positions in combinations(range(len(word)), distance):
+            results.add("".join(c for i, c in enumerate(word) if i not in positions))
+    return results
+
+def edit_distance(a, b, max_distance=SPELLING_MAX_DISTANCE):
+    """Optimal string alignment distance, or max_distance + 1 once it is exceeded"""
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    
+    # A typo usually leaves only a few characters to compare once the shared start and end are removed
+    start = 0
+    while start < len(a) and start < len(b) and a[start] == b[start]:
+        start += 1
+    end = 0
+    while end < len(a) - start and end < len(b) - start and a[-1 - end] == b[-1 - end]:
+        end += 1
+    a, b = a[start:len(a) - end], b[start:len(b) - end]
+    if not a or not b:
+        return len(a) + len(b)
+    
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+def build_spelling_index(data_dir="processed_data", wiki_data_dir="wiki_data"):
+    """Build the delete table from the index vocabulary of both corpora and save it"""
+    sections, wiki_sections = load_corpus_sections(data_dir, wiki_data_dir)
+    frequencies = term_document_frequencies([section["content"] for section in sections + wiki_sections])
+
+    terms = sorted(term for term in frequencies if not term.isdigit())
+    deletes = {}
+    for term_id, term in enumerate(terms):
+        for delete in _deletes(term):
+            deletes.setdefault(delete, []).append(term_id)
+
+    index = {
+        "max_distance": SPELLING_MAX_DISTANCE,
+        "prefix_length": SPELLING_PREFIX_LENGTH,
+        "terms": terms,
+        "counts": [frequencies[term] for term in terms],
+        "deletes": deletes,
+    }
+    with open(os.path.join(data_dir, SPELLING_FILE), 'w', encoding='utf-8') as f:
+        json.dump(index, f, separators=(',', ':'))
+    return len(terms), len(deletes)
+
+class SpellingIndex:
+    """Symmetric-delete lookup table loaded from spelling_index.json"""
+
+    def __init__(self, index):
+        self.max_distance = index["max_distance"]
+        self.prefix_length = index["prefix_length"]
+        self.terms = index["terms"]
+        self.counts = index["counts"]
+        self.term_ids = {term: i for i, term in enumerate(self.terms)}
+        self.deletes = index["deletes"]
+        self._corrections = {}
+
+    @classmethod
+    def load(cls, data_dir="processed_data"):
+        with open(os.path.join(data_dir, SPELLING_FILE), 'r', encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def correct_word(self, word):
+        """The closest, most frequent index term for an unknown word (None if known or no match)"""
+        word = word.lower()
+        if word in self.term_ids or word in ENGLISH_STOP_WORDS or len(word) < SPELLING_MIN_WORD or word.isdigit():
+            return None
+        if word in self._corrections:
+            return self._corrections[word]
+
+        candidates = set()
+        for delete in _deletes(word, self.max_distance, self.prefix_length):
+            candidates.update(self.deletes.get(delete, ()))
+
+        # Most frequent candidates first, so a later candidate only wins by being strictly closer
+        correction = None
+        max_distance = self.max_distance if len(word) >= SPELLING_LONG_WORD else min(1, self.max_distance)
+        frequent = [term_id for term_id in candidates if self.counts[term_id] >= SPELLING_MIN_RATIO]
+        for term_id in sorted(frequent, key=lambda term_id: -self.counts[term_id]):
+            distance = edit_distance(word, self.terms[term_id], max_distance)
+            if distance <= max_distance:
+                correction = self.terms[term_id]
+                max_distance = distance - 1
+                # The word is not a term, so nothing can be closer than one edit
+                if max_distance < 1:
+                    break
+        
+        if len(self._corrections) < SPELLING_CACHE_SIZE:
+            self._corrections[word] = correction
+        return correction
+
+    def correct_query(self, query):
+        """Replace unknown words in the query; returns the corrected query and the replacements
+
+        The caller decides whether to search the corrected query or only offer it.
+        """
+        corrections = {}
+        for token in TOKEN_PATTERN.findall(query):
+            correction = self.correct_word(token)
+            if correction:
+                corrections[token] = correction
+        if not corrections:
+            return query, {}
+        corrected = TOKEN_PATTERN.sub(lambda m: corrections.get(m.group(0), m.group(0)), query)
+        return corrected, corrections
@@ -0,0 +1,42 @@
+import json
+import os
+
+from autocomplete import AutocompleteIndex, build_autocomplete_index
+
+
+def _built(tmp_path):
+    data_dir, wiki_dir = tmp_path / "processed_data", tmp_path / "wiki_data"
+    data_dir.mkdir()
+    wiki_dir.mkdir()
+    sections = [{"tutorial": "MODFLOW-ConceptualModelApproach1", "content": "create the modflow grid from the coverage"},
+                {"tutorial": "MODFLOW-ConceptualModelApproach1", "content": "modflow wells and the grid frame"},
+                {"tutorial": "MODPATH", "content": "modpath particles need a modflow solution"}]
+    wiki_sections = [{"title": "Grid Frame", "parent_title": "GMS:Grid Frame", "content": "the grid frame sizes the grid"}]
+    (data_dir / "section_data.json").write_text(json.dumps(sections))
+    (wiki_dir / "wiki_sections.json").write_text(json.dumps(wiki_sections))
+    build_autocomplete_index(str(data_dir), str(wiki_dir))
+    return AutocompleteIndex.load(str(data_dir))
+
+
+def test_prefixes_complete_to_the_most_frequent_entries(tmp_path):
+    index = _built(tmp_path)
+    assert index.lookup("mod")[:2] == ["modflow", "MODFLOW-ConceptualModelApproach1"]
+    # "modpath" is in one section only, under the min_df of the index terms
+    assert index.lookup("modp") == ["MODPATH"]
+    assert index.lookup("m") == []
+    assert index.lookup("xyz") == []
+
+
+def test_titles_match_from_any_word(tmp_path):
+    index = _built(tmp_path)
+    assert "Grid Frame" in index.lookup("fra")
+    assert "MODFLOW-ConceptualModelApproach1" in index.lookup("conceptual mo")
+
+
+def test_the_last_word_is_completed_after_the_words_before_it(tmp_path):
+    assert "create modflow" in _built(tmp_path).suggest("create modf")
+
+
+def test_the_index_is_written_into_the_data_directory_given(tmp_path):
+    _built(tmp_path)
+    assert os.listdir(tmp_path / "wiki_data") == ["wiki_sections.json"]
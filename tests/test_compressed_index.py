@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+import scipy.sparse as sp
+from sklearn.preprocessing import normalize
+
+from compressed_index import CompressedPostings, varbyte_decode, varbyte_encode
+
+
+@pytest.mark.parametrize("values", [[], [0], [127], [128], [0, 1, 127, 128, 16383, 16384, 2 ** 31 - 1, 2 ** 40]])
+def test_varbyte_round_trip(values):
+    encoded = varbyte_encode(values)
+    assert encoded.dtype == np.uint8
+    assert varbyte_decode(encoded).tolist() == values
+
+
+def test_varbyte_uses_seven_bits_per_byte():
+    assert len(varbyte_encode([127])) == 1
+    assert len(varbyte_encode([128])) == 2
+    # The high bit marks the last byte of each value
+    assert varbyte_encode([1, 300]).tolist() == [0x81, 0x2C, 0x82]
+
+
+def _matrix(seed=0, shape=(200, 60)):
+    matrix = sp.random(*shape, density=0.1, random_state=seed, format="csr")
+    matrix.data += 0.01
+    return normalize(matrix)
+
+
+@pytest.mark.parametrize("weights, tolerance", [("float16", 2e-3), ("uint8", 1e-2)])
+def test_compressed_scores_match_the_matrix(weights, tolerance):
+    matrix = _matrix()
+    postings = CompressedPostings.from_matrix(matrix, weights)
+    for term in range(0, 60, 7):
+        doc_ids, term_weights = postings.postings_of(term)
+        column = matrix[:, term].toarray().ravel()
+        assert doc_ids.tolist() == np.flatnonzero(column).tolist()
+        assert np.allclose(term_weights, column[doc_ids], atol=tolerance)
+    query = sp.csr_matrix(np.random.default_rng(1).random((1, 60)) * (np.arange(60) % 5 == 0))
+    exact = (matrix @ query.T).toarray().ravel()
+    assert np.abs(postings.score(query) - exact).max() < tolerance * 3
+
+
+def test_save_and_load(tmp_path):
+    postings = CompressedPostings.from_matrix(_matrix(2))
+    postings.save(str(tmp_path / "compressed_index.npz"))
+    loaded = CompressedPostings.load(str(tmp_path / "compressed_index.npz"))
+    assert loaded.shape == postings.shape
+    for term in (0, 13, 59):
+        assert [part.tolist() for part in loaded.postings_of(term)] == [part.tolist() for part in postings.postings_of(term)]
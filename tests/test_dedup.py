@@ -0,0 +1,59 @@
+import copy
+
+from dedup import collapse_near_duplicates, find_duplicate_groups, minhash_signatures, strip_page_furniture
+
+WORDS = ("select the grid frame command then drag the boundary of the conceptual model across the "
+         "map view until the coverage fits the extents of the imported background image").split()
+
+
+def _text(start, length=24):
+    return " ".join(WORDS[(start + i) % len(WORDS)] for i in range(length))
+
+
+def test_identical_texts_have_identical_signatures():
+    signatures = minhash_signatures([_text(0), _text(0), _text(7)])
+    assert (signatures[0] == signatures[1]).all()
+    assert not (signatures[0] == signatures[2]).all()
+
+
+def test_near_duplicates_are_grouped_behind_the_longest_text():
+    texts = [_text(0), _text(0) + " again", "an unrelated paragraph about solver settings and output"]
+    assert find_duplicate_groups(texts) == [[1, 0]]
+
+
+def test_chains_of_similar_texts_are_not_merged():
+    # Each text shares most shingles with the next one, but the ends of the chain share few
+    texts = [" ".join(f"word{i}" for i in range(start, start + 20)) for start in range(6)]
+    signatures = minhash_signatures(texts)
+    for group in find_duplicate_groups(texts, threshold=0.7):
+        for member in group[1:]:
+            assert (signatures[member] == signatures[group[0]]).mean() >= 0.7
+
+
+def test_collapse_returns_new_records():
+    sections = [
+        {"id": 0, "content": _text(0), "tutorial": "Grid Frame"},
+        {"id": 1, "content": _text(0) + " again", "tutorial": "Conceptual Model"},
+        {"id": 2, "content": "an unrelated paragraph about solver settings", "tutorial": "Solver"},
+    ]
+    original = copy.deepcopy(sections)
+    collapsed = collapse_near_duplicates(sections)
+    assert sections == original
+    assert [section["id"] for section in collapsed] == [1, 2]
+    assert collapsed[0]["duplicates"] == [0]
+    assert collapsed[0]["duplicate_labels"] == ["Grid Frame"]
+    assert "duplicates" not in sections[1]
+
+
+def test_tutorial_footer_is_only_cut_at_page_edges():
+    pages = []
+    for n in (1, 2, 3):
+        body = [f"Step {n}.{step}" for step in range(1, 4)] + ["For more detail see the GMS 10.8 Tutorial"]
+        body += [f"Step {n}.{step}" for step in range(4, 7)]
+        pages.append("\n".join(body + [f"Page {n} of 3", "GMS 10.8 Tutorial"]))
+    cleaned, removed = strip_page_furniture(pages)
+    for n, page in enumerate(cleaned, 1):
+        assert "For more detail see the GMS 10.8 Tutorial" in page
+        assert "Page" not in page
+        assert page.splitlines()[-1] == f"Step {n}.6"
+    assert removed == 6
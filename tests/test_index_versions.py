@@ -0,0 +1,106 @@
+import json
+import os
+import pickle
+
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+import index_versions
+from facets import build_facets
+from index_versions import new_version_dir, publish_version, resolve_data_dir, validate_version, write_manifest
+
+TOPICS = ["grid frame", "conceptual model", "boreholes", "stratigraphy", "particle tracking", "seawat",
+          "mesh generation", "transient calibration"]
+
+
+def _build(base_dir, sections=None):
+    """Unpublished PDF version with a few sections, as preprocess_pdfs writes it"""
+    version_dir = new_version_dir(base_dir)
+    if sections is None:
+        sections = [{"id": i, "tutorial": f"{topic.title()} Tutorial", "title": topic.title(), "page": 1,
+                     "content": f"This tutorial covers {topic} step {i} in GMS with the {topic} tools."}
+                    for i, topic in enumerate(TOPICS)]
+    tutorials = {section["tutorial"]: {"sections": [section["id"]]} for section in sections}
+    with open(os.path.join(version_dir, "tutorial_data.json"), "w") as f:
+        json.dump(tutorials, f)
+    with open(os.path.join(version_dir, "section_data.json"), "w") as f:
+        json.dump(sections, f)
+    build_facets(sections, version_dir)
+    vectorizer = TfidfVectorizer(stop_words="english")
+    matrix = vectorizer.fit_transform([section["content"] for section in sections])
+    with open(os.path.join(version_dir, "tfidf_vectorizer.pkl"), "wb") as f:
+        pickle.dump(vectorizer, f)
+    with open(os.path.join(version_dir, "tfidf_matrix.pkl"), "wb") as f:
+        pickle.dump(matrix, f)
+    with open(os.path.join(version_dir, "processed_timestamp.txt"), "w") as f:
+        f.write("0")
+    return version_dir
+
+
+def test_version_ids_are_unique_within_one_second(tmp_path, monkeypatch):
+    monkeypatch.setattr(index_versions.time, "strftime", lambda pattern: "20260101-000000")
+    paths = {new_version_dir(str(tmp_path)) for _ in range(3)}
+    assert len(paths) == 3 and all(os.path.isdir(path) for path in paths)
+
+
+def test_publish_points_readers_at_the_new_version(tmp_path):
+    base_dir = str(tmp_path)
+    assert resolve_data_dir(base_dir) == base_dir
+    first = _build(base_dir)
+    assert publish_version(base_dir, first)
+    assert resolve_data_dir(base_dir) == first
+    second = _build(base_dir)
+    assert resolve_data_dir(base_dir) == first
+    assert publish_version(base_dir, second)
+    assert resolve_data_dir(base_dir) == second
+
+
+def test_validation_rejects_a_changed_file(tmp_path):
+    version_dir = _build(str(tmp_path))
+    write_manifest(version_dir, "pdf")
+    assert validate_version(version_dir)[1] == []
+    with open(os.path.join(version_dir, "processed_timestamp.txt"), "w") as f:
+        f.write("1")
+    assert validate_version(version_dir)[1] == ["processed_timestamp.txt does not match its checksum"]
+
+
+def test_a_version_that_fails_validation_is_not_published(tmp_path):
+    base_dir = str(tmp_path)
+    published = _build(base_dir)
+    assert publish_version(base_dir, published)
+    broken = _build(base_dir)
+    # The matrix no longer has a row per section
+    with open(os.path.join(broken, "section_data.json"), "w") as f:
+        json.dump([{"id": 0, "tutorial": "Grid Frame Tutorial", "title": "Grid", "page": 1, "content": "grid"}], f)
+    assert not publish_version(base_dir, broken)
+    assert os.path.isdir(broken + ".failed")
+    assert resolve_data_dir(base_dir) == published
+
+
+def test_loading_never_writes_into_the_data_directory(tmp_path):
+    from search_core import SearchState, load_search_data
+
+    base_dir = str(tmp_path)
+    version_dir = _build(base_dir)
+    assert publish_version(base_dir, version_dir)
+    # Stores and exports missing or older than the JSON are replaced in memory, not on disk
+    for name in os.listdir(version_dir):
+        if "_store_" in name or "_matrix_" in name:
+            os.remove(os.path.join(version_dir, name))
+    os.utime(os.path.join(version_dir, "section_data.json"))
+    files = {name: os.path.getmtime(os.path.join(version_dir, name)) for name in os.listdir(version_dir)}
+    state = SearchState()
+    load_search_data(state, use_mmap=True, data_dir=base_dir, wiki_data_dir=None)
+    assert files == {name: os.path.getmtime(os.path.join(version_dir, name)) for name in os.listdir(version_dir)}
+    assert len(state.section_data) == len(TOPICS) == state.facets.n_docs
+    assert state.section_data[3]["content"].startswith("This tutorial covers stratigraphy")
+
+
+def test_validation_checks_the_embedding_rows(tmp_path):
+    version_dir = _build(str(tmp_path))
+    np.save(os.path.join(version_dir, "embeddings.npy"), np.zeros((len(TOPICS) - 1, 4), dtype=np.int8))
+    np.savez(os.path.join(version_dir, "ivf.npz"), centroids=np.zeros((1, 4), dtype=np.float32),
+             order=np.arange(len(TOPICS) - 1, dtype=np.int32), offsets=np.array([0, len(TOPICS) - 1]))
+    write_manifest(version_dir, "pdf")
+    problems = validate_version(version_dir)[1]
+    assert len(problems) == 1 and "embedding rows 7" in problems[0]
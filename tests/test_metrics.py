@@ -0,0 +1,35 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import Metrics, start_metrics_server
+
+
+def test_spans_in_pool_threads_join_the_request_trace(tmp_path):
+    log = tmp_path / "metrics.jsonl"
+    registry = Metrics(enabled=True, log_path=str(log))
+
+    def shard_search():
+        with registry.span("search_pdf"):
+            return 1
+
+    with ThreadPoolExecutor(max_workers=2) as executor, registry.request():
+        futures = [executor.submit(registry.traced(shard_search, shard=version)) for version in ("10.8", "10.7")]
+        assert [future.result() for future in futures] == [1, 1]
+    spans = json.loads(log.read_text())["spans"]
+    assert sorted((span["stage"], span["shard"]) for span in spans) == [("search_pdf", "10.7"), ("search_pdf", "10.8")]
+
+
+def test_traced_outside_a_request_is_the_function_itself():
+    registry = Metrics(enabled=True)
+    assert registry.traced(len) is len
+
+
+def test_endpoint_listens_on_loopback_by_default():
+    server = start_metrics_server(port=0, registry=Metrics(enabled=True))
+    assert server is None  # port 0 means no endpoint
+    server = start_metrics_server(port=19108, registry=Metrics(enabled=True))
+    try:
+        assert server.server_address[0] == "127.0.0.1"
+    finally:
+        server.shutdown()
+        server.server_close()
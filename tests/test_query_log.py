@@ -0,0 +1,33 @@
+import pytest
+
+from query_log import scrub_query
+
+
+@pytest.mark.parametrize("query, logged", [
+    ("send results to jane.doe@example.com", "send results to <email>"),
+    ("error at https://www.xmswiki.com/wiki/GMS:MODFLOW?x=1 page", "error at <url> page"),
+    (r"cannot open C:\Users\jane\models\site.gpr", "cannot open <path>"),
+    ("file /home/jane/gms/run.log missing", "file <path> missing"),
+    ("import ~/data/wells.csv", "import <path>"),
+    ("open wells.shp in gms", "open <path> in gms"),
+    ("license 12345678 expired", "license <number> expired"),
+    ("call (555) 123-4567 for help", "call <number> for help"),
+])
+def test_personal_details_are_redacted(query, logged):
+    assert scrub_query(query, "redact") == {"q": logged}
+
+
+@pytest.mark.parametrize("query", [
+    "GMS 10.8 transient calibration",
+    "recharge in ft3/d and/or m3/d",
+    "MODFLOW 2005 stress periods",
+    "pumping rate 1500 gpm",
+])
+def test_search_terms_are_kept(query):
+    assert scrub_query(query, "redact") == {"q": query}
+
+
+def test_hash_mode_keeps_no_text():
+    record = scrub_query("open C:/models/site.gpr", "hash")
+    assert set(record) == {"qh", "qw"} and record["qw"] == 2
+    assert record == scrub_query("open C:/models/site.gpr", "hash")
@@ -0,0 +1,103 @@
+import numpy as np
+import scipy.sparse as sp
+import pytest
+
+import search_budget
+from search_budget import TermIndex, SearchBudget, budgeted_scores, cap_query_terms
+
+
+def _corpus(n_docs=400, n_terms=300, seed=0):
+    rng = np.random.default_rng(seed)
+    matrix = sp.random(n_docs, n_terms, density=0.05, random_state=rng, format="csr")
+    # Rows L2-normalized like the vectorizer output
+    norms = np.sqrt(matrix.multiply(matrix).sum(axis=1)).A.ravel()
+    matrix = sp.diags(1.0 / np.where(norms > 0, norms, 1.0)) @ matrix
+    return sp.csr_matrix(matrix), rng
+
+
+def _query(rng, n_terms, size):
+    terms = np.sort(rng.choice(n_terms, size=size, replace=False))
+    weights = rng.random(size)
+    weights /= np.linalg.norm(weights)
+    return sp.csr_matrix((weights, terms, [0, size]), shape=(1, n_terms))
+
+
+def _skewed_query(rng, index, size):
+    """Query whose rarest term carries most of the weight, so the top k settles early"""
+    query = _query(rng, len(index.doc_freq), size)
+    weights = query.data * 0.05
+    weights[np.argmin(index.doc_freq[query.indices])] = 1.0
+    query.data = weights / np.linalg.norm(weights)
+    return query
+
+
+def _always_settled(calls):
+    def settled(scores, top_k, remaining):
+        calls.append(remaining)
+        return True
+    return settled
+
+
+def _full(matrix, query, boost=None):
+    scores = np.asarray((matrix @ query.T).todense()).ravel()
+    return scores if boost is None else scores * boost
+
+
+def test_unbudgeted_terms_match_full_scoring():
+    matrix, rng = _corpus()
+    index = TermIndex.from_matrix(matrix)
+    for _ in range(20):
+        query = _query(rng, matrix.shape[1], 12)
+        scores, matches = budgeted_scores(query, index, top_k=5, budget=SearchBudget(10.0))
+        top = np.argsort(-_full(matrix, query))[:5]
+        assert np.argsort(-scores)[:5].tolist() == top.tolist()
+        assert np.allclose(scores[top], _full(matrix, query)[top])
+
+
+@pytest.mark.parametrize("boost", [None, "random"])
+def test_early_termination_returns_exact_top_scores(monkeypatch, boost):
+    matrix, rng = _corpus(seed=1)
+    index = TermIndex.from_matrix(matrix)
+    boost = 1.0 + rng.random(matrix.shape[0]) if boost == "random" else None
+    # Stop at the first term that reaches the check, whether or not the top k is settled
+    calls = []
+    monkeypatch.setattr(search_budget, "_settled", _always_settled(calls))
+    for _ in range(20):
+        query = _skewed_query(rng, index, 20)
+        scores, _ = budgeted_scores(query, index, top_k=5, boost=boost)
+        returned = np.argsort(-scores)[:5]
+        assert np.allclose(scores[returned], _full(matrix, query, boost)[returned])
+    assert calls
+
+
+def test_deadline_marks_partial_and_keeps_first_term():
+    matrix, rng = _corpus(seed=2)
+    index = TermIndex.from_matrix(matrix)
+    budget = SearchBudget(0.0)
+    query = _query(rng, matrix.shape[1], 10)
+    scores, _ = budgeted_scores(query, index, top_k=5, budget=budget)
+    assert budget.partial
+    assert scores.max() > 0.0
+
+
+def test_early_termination_still_counts_every_match(monkeypatch):
+    matrix, rng = _corpus(seed=3)
+    index = TermIndex.from_matrix(matrix)
+    calls = []
+    monkeypatch.setattr(search_budget, "_settled", _always_settled(calls))
+    query = _skewed_query(rng, index, 20)
+    _, matches = budgeted_scores(query, index, top_k=5, count_matches=True)
+    expected = _full(matrix, query) > 0.0
+    assert calls and matches is not None
+    assert (matches == expected).all()
+
+
+def test_cap_query_terms_keeps_heaviest_terms():
+    matrix, rng = _corpus()
+    index = TermIndex.from_matrix(matrix)
+    query = _query(rng, matrix.shape[1], 30)
+    capped, dropped = cap_query_terms(query, index, max_terms=10)
+    assert dropped == 20
+    assert capped.nnz == 10
+    assert set(capped.indices) == set(query.indices[np.argsort(-query.data)[:10]])
+    assert np.isclose(np.linalg.norm(capped.data), 1.0)
@@ -0,0 +1,33 @@
+import zlib
+
+import numpy as np
+
+from semantic_index import SemanticIndex, append_semantic_index, build_semantic_index, embedding_rows
+
+
+class HashModel:
+    """Stand-in for the sentence-transformers model: one fixed random unit vector per text"""
+
+    def encode(self, texts, **kwargs):
+        vectors = np.array([np.random.default_rng(zlib.crc32(text.encode())).normal(size=16) for text in texts])
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def test_appended_sections_are_searchable(tmp_path):
+    model, directory = HashModel(), str(tmp_path)
+    texts = [f"section {i}" for i in range(40)]
+    build_semantic_index(model, texts, directory)
+    new_texts = [f"new section {i}" for i in range(5)]
+    assert append_semantic_index(model, new_texts, directory) == 5
+    assert embedding_rows(directory) == 45
+
+    index = SemanticIndex(directory)
+    assert sorted(index.order) == list(range(45))
+    assert index.offsets[-1] == 45
+    for row, text in enumerate(new_texts, start=40):
+        ids, _ = index.search(model.encode([text])[0], top_n=1, nprobe=len(index.centroids))
+        assert ids[0] == row
+
+
+def test_embedding_rows_without_an_index(tmp_path):
+    assert embedding_rows(str(tmp_path)) is None
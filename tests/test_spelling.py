@@ -0,0 +1,73 @@
+import pytest
+
+from spelling import SpellingIndex, SPELLING_MIN_RATIO, _deletes, edit_distance
+from search_core import choose_spelling
+
+
+def _index(counts):
+    """Spelling index over a {term: section count} vocabulary, as build_spelling_index saves it"""
+    terms = sorted(counts)
+    deletes = {}
+    for term_id, term in enumerate(terms):
+        for delete in _deletes(term):
+            deletes.setdefault(delete, []).append(term_id)
+    return SpellingIndex({"max_distance": 2, "prefix_length": 7, "terms": terms,
+                          "counts": [counts[term] for term in terms], "deletes": deletes})
+
+
+VOCABULARY = {"modflow": 500, "stratigraphy": 80, "boundary": 300, "cases": 200, "started": 150,
+              "arcs": 60, "model": 900, "grid": 700, "gms": 2000, "seawat": 3}
+
+
+@pytest.mark.parametrize("a, b, distance", [
+    ("modflow", "modflow", 0), ("modfow", "modflow", 1), ("modle", "model", 1),
+    ("stratigrapy", "stratigraphy", 1), ("crashes", "cases", 2), ("abc", "xyzxyz", 3),
+])
+def test_edit_distance(a, b, distance):
+    assert edit_distance(a, b) == distance
+
+
+def test_misspelled_terms_are_corrected():
+    index = _index(VOCABULARY)
+    assert index.correct_word("MODFOW") == "modflow"
+    assert index.correct_word("stratigrapy") == "stratigraphy"
+    assert index.correct_word("modle") == "model"
+    assert index.correct_query("stratigrapy bounday") == ("stratigraphy boundary",
+                                                         {"stratigrapy": "stratigraphy", "bounday": "boundary"})
+
+
+def test_real_words_are_not_rewritten():
+    index = _index(VOCABULARY)
+    # Two edits away on short words, or already index terms
+    assert index.correct_word("crashes") is None
+    assert index.correct_word("startup") is None
+    assert index.correct_word("arcgis") is None
+    assert index.correct_word("model") is None
+    assert index.correct_query("GMS crashes on startup") == ("GMS crashes on startup", {})
+
+
+def test_rare_terms_are_not_suggested():
+    assert VOCABULARY["seawat"] < SPELLING_MIN_RATIO
+    assert _index(VOCABULARY).correct_word("seawatt") is None
+
+
+def _results(count):
+    return [{"score": 1.0}] * count, [], {}
+
+
+def test_correction_is_only_offered_when_the_query_finds_enough():
+    searched = []
+    query, results, did_you_mean = choose_spelling("modfow grid", "modflow grid", _results(3),
+                                                   lambda text: searched.append(text) or _results(5), 3)
+    assert (query, did_you_mean, searched) == ("modfow grid", "modflow grid", [])
+    assert len(results[0]) == 3
+
+
+def test_correction_is_searched_when_the_query_finds_too_little():
+    query, results, did_you_mean = choose_spelling("modfow", "modflow", _results(0), lambda text: _results(2), 3)
+    assert (query, did_you_mean, len(results[0])) == ("modflow", None, 2)
+
+
+def test_correction_that_finds_no_more_is_only_offered():
+    query, results, did_you_mean = choose_spelling("modfow", "modflow", _results(1), lambda text: _results(1), 3)
+    assert (query, did_you_mean) == ("modfow", "modflow")
@@ -2,17 +2,49 @@ import requests
 from bs4 import BeautifulSoup
 import re
 import os
+import sys
+import gzip
 import json
 import time
+import queue
 import pickle
+import hashlib
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 from urllib.parse import urljoin
+from hashing_index import INDEX_MODE, build_hashed_index, save_hashed_index
+from semantic_index import load_embedding_model, build_semantic_index
+from autocomplete import build_autocomplete_index
+from spelling import build_spelling_index
+from compressed_index import COMPRESSED_INDEX, save_compressed_index
+from facets import build_facets
+from related import build_related
+from link_rank import build_link_rank
+from index_versions import new_version_dir, derive_version, publish_version, resolve_data_dir
+from dedup import drop_covered_page_records, collapse_near_duplicates, shrink_report, print_shrink_report
 
 # Constants
 WIKI_BASE_URL = "https://www.xmswiki.com"
 WIKI_STARTING_URL = "https://www.xmswiki.com/wiki/GMS:GMS_User_Manual_10.8"
 WIKI_DATA_DIR = "wiki_data"  # This was missing from your original script
+DATA_DIR = "processed_data"  # Processed PDF data; holds the suggestions and spelling table of both corpora
 MAX_PAGES = 1000  # Limit to prevent excessive crawling
 
+# Raw HTML of every fetched page, for re-parsing without the network
+RAW_HTML_DIR = os.path.join(WIKI_DATA_DIR, "raw_html")
+
+# Parsed pages, appended one JSON line at a time while the crawl runs
+PAGES_STREAM = os.path.join(WIKI_DATA_DIR, "wiki_pages.jsonl")
+
+# Fetcher threads, parser processes and the size of the queue between them
+FETCH_THREADS = int(os.environ.get("GMS_CRAWL_FETCHERS", "4"))
+PARSE_WORKERS = int(os.environ.get("GMS_CRAWL_PARSERS", str(os.cpu_count() or 1)))
+QUEUE_SIZE = int(os.environ.get("GMS_CRAWL_QUEUE", "32"))
+
+# Seconds between request starts, across all fetchers; be polite to the server
+CRAWL_DELAY = float(os.environ.get("GMS_CRAWL_DELAY", "1.0"))
+
 def setup_directories():
     """Create necessary directories"""
     if not os.path.exists(WIKI_DATA_DIR):
@@ -107,58 +139,245 @@ def extract_wiki_content(html, url):
     
     return page_data
 
+# Fetch/parse pipeline:
+#
+#   fetcher threads --(bounded queue of cached pages)--> parser processes --> wiki_pages.jsonl
+#
+# Fetchers only do network I/O: they download a page, write the raw HTML to the
+# cache and queue its path. The queue is bounded, and no more than
+# 2 x PARSE_WORKERS pages are handed to the parser pool at once, so when parsing
+# falls behind the fetchers block on the queue instead of piling up HTML in memory.
+# The parser processes run extract_wiki_content on the cached file, and every page
+# is appended to wiki_pages.jsonl as soon as it is parsed. The links it contains
+# feed the fetchers. With --reparse the cached HTML is parsed again without any
+# network access, as fast as the parser processes allow.
+
+class StageStats:
+    """Items, busy time and time blocked on the next stage for one pipeline stage"""
+
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.bytes = 0
+        self.busy = 0.0
+        self.blocked = 0.0
+        self.lock = threading.Lock()
+
+    def add(self, busy=0.0, blocked=0.0, nbytes=0, items=1):
+        with self.lock:
+            self.items += items
+            self.bytes += nbytes
+            self.busy += busy
+            self.blocked += blocked
+
+    def line(self, elapsed):
+        return (f"{self.name:>6}: {self.items:>5} pages {self.items / max(elapsed, 1e-9):>7.1f}/s  "
+                f"busy {self.busy:>7.1f} s  blocked {self.blocked:>6.1f} s  {self.bytes / 1e6:>7.1f} MB")
+
+def raw_html_path(url):
+    """Cache file of a page's raw HTML"""
+    return os.path.join(RAW_HTML_DIR, hashlib.sha1(url.encode('utf-8')).hexdigest()[:20] + '.html.gz')
+
+def _write_raw_html(url, html):
+    # The URL is kept on the first line so the cache can be re-parsed on its own
+    path = raw_html_path(url)
+    with gzip.open(path + '.tmp', 'wt', encoding='utf-8') as f:
+        f.write(url + '\n')
+        f.write(html)
+    os.replace(path + '.tmp', path)
+    return path
+
+def _parse_raw_html(path):
+    """Runs in a parser process: extract the page stored in a cache file"""
+    start = time.perf_counter()
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        url = f.readline().rstrip('\n')
+        html = f.read()
+    page_data = extract_wiki_content(html, url)
+    return url, page_data, time.perf_counter() - start
+
+class _RateLimiter:
+    """Spaces out request starts across all fetcher threads"""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.next_start = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_start)
+            self.next_start = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+def _fetcher(urls, pages, limiter, stats):
+    """Fetcher thread: download pages, cache their HTML and queue the cache files"""
+    while True:
+        url = urls.get()
+        if url is None:
+            return
+        path = None
+        nbytes = 0
+        start = time.perf_counter()
+        try:
+            limiter.wait()
+            start = time.perf_counter()
+            html = get_wiki_page(url)
+            nbytes = len(html or '')
+            path = _write_raw_html(url, html) if html else None
+        except Exception as e:
+            print(f"Error fetching {url}: {e}")
+        finally:
+            fetched = time.perf_counter()
+            # Every URL taken is answered, (url, None) on failure, or the crawl waits for it forever.
+            # Blocks while the queue is full: the backpressure from the parsers
+            pages.put((url, path))
+            stats.add(busy=fetched - start, blocked=time.perf_counter() - fetched, nbytes=nbytes)
+
+def _open_parser_pool():
+    # "spawn" keeps the parsers free of the fetcher threads
+    return ProcessPoolExecutor(max_workers=PARSE_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+
+def _report(stages, elapsed, workers):
+    print(f"Pipeline stages after {elapsed:.1f} s ({workers}):")
+    for stage in stages:
+        print("  " + stage.line(elapsed))
+
+def _finish_pages(pages, order):
+    """Save the parsed pages in the order their URLs were found, and process them"""
+    wiki_data = sorted(pages, key=lambda page: order[page['url']])
+    save_wiki_data(wiki_data)
+    print(f"Extracted {len(wiki_data)} pages.")
+    process_wiki_data()
+
 def crawl_wiki():
     """Crawl the GMS wiki starting from the user manual page"""
     setup_directories()
+    os.makedirs(RAW_HTML_DIR, exist_ok=True)
+    
+    fetch_stats, parse_stats, store_stats = StageStats("fetch"), StageStats("parse"), StageStats("store")
+    urls = queue.Queue()
+    pages = queue.Queue(maxsize=QUEUE_SIZE)
+    limiter = _RateLimiter(CRAWL_DELAY)
+    fetchers = [threading.Thread(target=_fetcher, args=(urls, pages, limiter, fetch_stats), daemon=True)
+                for _ in range(FETCH_THREADS)]
     
-    # Initialize the crawler
-    pages_to_visit = [WIKI_STARTING_URL]
-    visited_pages = set()
+    # URLs in the order they were found; each one is pending until it is parsed or has failed
+    order = {WIKI_STARTING_URL: 0}
+    urls.put(WIKI_STARTING_URL)
+    pending = 1
+    in_flight = set()
+    parsing = {}
     wiki_data = []
-    page_count = 0
+    queue_peak = 0
+    reported = 0
+    start = time.perf_counter()
     
-    while pages_to_visit and page_count < MAX_PAGES:
-        # Get the next URL to visit
-        current_url = pages_to_visit.pop(0)
-        
-        # Skip if already visited
-        if current_url in visited_pages:
-            continue
+    with _open_parser_pool() as executor, open(PAGES_STREAM, 'w', encoding='utf-8') as stream:
+        for fetcher in fetchers:
+            fetcher.start()
         
-        # Mark as visited
-        visited_pages.add(current_url)
-        
-        print(f"Crawling page {page_count + 1}: {current_url}")
-        
-        # Fetch and parse the page
-        html = get_wiki_page(current_url)
-        if not html:
-            continue
-        
-        # Extract content
-        page_data = extract_wiki_content(html, current_url)
-        if page_data:
-            wiki_data.append(page_data)
-            page_count += 1
+        while pending:
+            # Hand fetched pages to the parsers, up to the in-flight limit
+            while len(in_flight) < 2 * PARSE_WORKERS:
+                queue_peak = max(queue_peak, pages.qsize())
+                try:
+                    url, path = pages.get(block=not in_flight, timeout=0.05)
+                except queue.Empty:
+                    break
+                if path is None:
+                    pending -= 1
+                    continue
+                future = executor.submit(_parse_raw_html, path)
+                parsing[future] = url
+                in_flight.add(future)
+            if not in_flight:
+                continue
             
-            # Add new links to visit
-            for link in page_data['links']:
-                if link not in visited_pages and link not in pages_to_visit:
-                    pages_to_visit.append(link)
-        
-        # Be polite to the server
-        time.sleep(1)
+            done, in_flight = wait(in_flight, timeout=0.05, return_when=FIRST_COMPLETED)
+            for future in done:
+                url = parsing.pop(future)
+                pending -= 1
+                try:
+                    url, page_data, seconds = future.result()
+                except Exception as e:
+                    # A page that breaks its parser is skipped like a failed download
+                    print(f"Error parsing {url}: {e}")
+                    continue
+                parse_stats.add(busy=seconds)
+                if not page_data:
+                    continue
+                
+                # Stream the page to disk, then queue the links not seen yet
+                stored = time.perf_counter()
+                stream.write(json.dumps(page_data) + '\n')
+                stream.flush()
+                wiki_data.append(page_data)
+                store_stats.add(busy=time.perf_counter() - stored)
+                print(f"Parsed page {len(wiki_data)}: {url}")
+                for link in page_data['links']:
+                    if link not in order and len(order) < MAX_PAGES:
+                        order[link] = len(order)
+                        urls.put(link)
+                        pending += 1
+            
+            if len(wiki_data) >= reported + 100:
+                reported = len(wiki_data)
+                _report((fetch_stats, parse_stats, store_stats), time.perf_counter() - start,
+                        f"{FETCH_THREADS} fetchers, {PARSE_WORKERS} parsers, queue peak {queue_peak}/{QUEUE_SIZE}")
         
-        # Periodically save the data
-        if page_count % 20 == 0:
-            save_wiki_data(wiki_data)
+        for _ in fetchers:
+            urls.put(None)
     
-    # Final save
-    save_wiki_data(wiki_data)
-    print(f"Crawling complete. Processed {page_count} pages.")
+    _report((fetch_stats, parse_stats, store_stats), time.perf_counter() - start,
+                        f"{FETCH_THREADS} fetchers, {PARSE_WORKERS} parsers, queue peak {queue_peak}/{QUEUE_SIZE}")
+    _finish_pages(wiki_data, order)
+
+def reparse_raw_html():
+    """Re-extract every page in the raw-HTML cache without network access, and process them"""
+    if not os.path.isdir(RAW_HTML_DIR):
+        print(f"No raw HTML cache in {RAW_HTML_DIR}; run the crawler first")
+        return
+    paths = sorted(os.path.join(RAW_HTML_DIR, name) for name in os.listdir(RAW_HTML_DIR) if name.endswith('.html.gz'))
     
-    # Process the data for search
-    process_wiki_data()
+    # Keep the page order of the last crawl where there is one
+    order = {}
+    try:
+        with open(os.path.join(WIKI_DATA_DIR, 'wiki_data.json'), 'r', encoding='utf-8') as f:
+            order = {page['url']: position for position, page in enumerate(json.load(f))}
+    except (FileNotFoundError, json.JSONDecodeError):
+        pass
+    
+    parse_stats, store_stats = StageStats("parse"), StageStats("store")
+    wiki_data = []
+    failed = 0
+    start = time.perf_counter()
+    with _open_parser_pool() as executor, open(PAGES_STREAM, 'w', encoding='utf-8') as stream:
+        futures = [(path, executor.submit(_parse_raw_html, path)) for path in paths]
+        for path, future in futures:
+            try:
+                url, page_data, seconds = future.result()
+            except Exception as e:
+                # A corrupt cache file or a page that breaks its parser is skipped
+                print(f"Error parsing {path}: {e}")
+                failed += 1
+                continue
+            parse_stats.add(busy=seconds)
+            if not page_data:
+                continue
+            stored = time.perf_counter()
+            stream.write(json.dumps(page_data) + '\n')
+            wiki_data.append(page_data)
+            store_stats.add(busy=time.perf_counter() - stored)
+    _report((parse_stats, store_stats), time.perf_counter() - start, f"{PARSE_WORKERS} parsers, no network")
+    if failed:
+        print(f"Skipped {failed} of {len(paths)} cached pages that could not be parsed")
+    
+    for page in wiki_data:
+        order.setdefault(page['url'], len(order))
+    _finish_pages(wiki_data, order)
 
 def save_wiki_data(wiki_data):
     """Save the crawled wiki data to a JSON file"""
@@ -201,32 +420,83 @@ def process_wiki_data():
                     'type': 'section'
                 })
     
+    # Drop page records repeated by their own sections, then collapse near-duplicate sections
+    sections_before = wiki_sections
+    wiki_sections = collapse_near_duplicates(drop_covered_page_records(wiki_sections))
+    report = shrink_report(sections_before, wiki_sections)
+    print_shrink_report("Wiki sections", report)
+    
+    # Write into a new version; servers keep reading the published one meanwhile
+    wiki_dir = new_version_dir(WIKI_DATA_DIR)
+    with open(os.path.join(wiki_dir, 'dedup_report.json'), 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    
     # Save the processed sections
-    with open(os.path.join(WIKI_DATA_DIR, 'wiki_sections.json'), 'w', encoding='utf-8') as f:
+    with open(os.path.join(wiki_dir, 'wiki_sections.json'), 'w', encoding='utf-8') as f:
         json.dump(wiki_sections, f, indent=2)
     
-    # Create search index
-    from sklearn.feature_extraction.text import TfidfVectorizer
+    # Tutorial-family bitsets for the family filter
+    build_facets(wiki_sections, wiki_dir, 'wiki_')
+    
+    # Page authority from the links between the crawled pages
+    build_link_rank(wiki_data, wiki_sections, wiki_dir)
     
     # Extract section texts
     section_texts = [section['content'] for section in wiki_sections]
     
-    # Create TF-IDF vectorizer
-    vectorizer = TfidfVectorizer(stop_words='english', max_df=0.85, min_df=2)
-    tfidf_matrix = vectorizer.fit_transform(section_texts)
+    # Build the dense embedding index if a local model is available
+    model = load_embedding_model()
+    if model is not None:
+        build_semantic_index(model, section_texts, wiki_dir, 'wiki_')
+    
+    if INDEX_MODE == "hashing":
+        # Hashed term counts plus document frequencies, no fitted vocabulary
+        index, counts = build_hashed_index(section_texts)
+        save_hashed_index(index, counts, wiki_dir, 'wiki_')
+        tfidf_matrix = index.weight(counts)
+    else:
+        # Create search index
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        
+        # Create TF-IDF vectorizer
+        vectorizer = TfidfVectorizer(stop_words='english', max_df=0.85, min_df=2)
+        tfidf_matrix = vectorizer.fit_transform(section_texts)
+        
+        # Save the vectorizer and matrix
+        with open(os.path.join(wiki_dir, 'wiki_vectorizer.pkl'), 'wb') as f:
+            pickle.dump(vectorizer, f)
+        
+        with open(os.path.join(wiki_dir, 'wiki_tfidf_matrix.pkl'), 'wb') as f:
+            pickle.dump(tfidf_matrix, f)
     
-    # Save the vectorizer and matrix
-    with open(os.path.join(WIKI_DATA_DIR, 'wiki_vectorizer.pkl'), 'wb') as f:
-        pickle.dump(vectorizer, f)
+    # Compressed postings for GMS_COMPRESSED_INDEX=1
+    if COMPRESSED_INDEX:
+        save_compressed_index(tfidf_matrix, wiki_dir, 'wiki_')
     
-    with open(os.path.join(WIKI_DATA_DIR, 'wiki_tfidf_matrix.pkl'), 'wb') as f:
-        pickle.dump(tfidf_matrix, f)
+    if not publish_version(WIKI_DATA_DIR, wiki_dir, 'wiki'):
+        return
+    print(f"Processed {len(wiki_sections)} wiki sections for search"
+          f"{' (hashing index)' if INDEX_MODE == 'hashing' else ''}.")
     
-    print(f"Processed {len(wiki_sections)} wiki sections for search.")
+    # The typeahead suggestions, spelling table and related sections cover both corpora
+    # and live with the PDF data, so they are refreshed in a new version of it
+    if os.path.exists(os.path.join(resolve_data_dir(DATA_DIR), 'section_data.json')):
+        data_dir = derive_version(DATA_DIR)
+        build_autocomplete_index(data_dir, resolve_data_dir(WIKI_DATA_DIR))
+        build_spelling_index(data_dir, resolve_data_dir(WIKI_DATA_DIR))
+        build_related(data_dir, resolve_data_dir(WIKI_DATA_DIR))
+        with open(os.path.join(data_dir, 'processed_timestamp.txt'), 'w') as f:
+            f.write(str(time.time()))
+        publish_version(DATA_DIR, data_dir)
 
 def main():
-    print("Starting GMS Wiki Crawler")
-    crawl_wiki()
+    # Usage: python wiki_crawler.py [--reparse]
+    if '--reparse' in sys.argv[1:]:
+        print("Re-parsing the cached GMS Wiki pages")
+        reparse_raw_html()
+    else:
+        print("Starting GMS Wiki Crawler")
+        crawl_wiki()
     print("Finished crawling and processing GMS Wiki")
 
 if __name__ == "__main__":